@@ -0,0 +1,92 @@
+# scripts/benchmark_card_overlay.py
+#
+# Render-fps comparison of the card overlay: the old graph (looped PNG,
+# per-frame scale=1000:-1, overlay disabled after the intro with enable=)
+# against the current one from src/video_creation.py (card pre-scaled once,
+# card input limited to the first sentence, overlay eof_action=pass).
+#
+# Uses a synthetic 1080x1920 background and a synthetic card, encodes with
+# the same x264 settings as burn_and_mux and discards the output, so only
+# the filter graph differs between runs.
+#
+#   python -m scripts.benchmark_card_overlay                 # 3-minute story
+#   python -m scripts.benchmark_card_overlay --seconds 60 --intro 4 --runs 3
+
+import argparse
+import os
+import statistics
+import tempfile
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw
+from src.ffmpeg_runner import run_ffmpeg
+from src.video_creation import _prescaled_card, _card_input, _card_overlay
+
+load_dotenv()
+
+FPS = 30
+
+
+def make_card(path: str) -> str:
+    """1080-wide RGBA card, the size svg_to_card_png produces."""
+    card = Image.new("RGBA", (1080, 613), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(card)
+    draw.rectangle([40, 40, 1040, 140], fill=(255, 69, 0, 255))
+    draw.text((60, 200), "Benchmark card", fill=(0, 0, 0, 255))
+    card.save(path, "PNG")
+    return path
+
+
+def background_args(seconds: float) -> list[str]:
+    return ["-f", "lavfi", "-i", f"testsrc2=size=1080x1920:rate={FPS}:duration={seconds}"]
+
+
+def old_cmd(card: str, seconds: float, intro: float) -> list[str]:
+    graph = (
+        "[1:v]scale=1000:-1[card];"
+        f"[0:v][card]overlay=40:(H-h)/2:enable='lte(t,{intro})'[outv]"
+    )
+    return [
+        "ffmpeg", "-y", "-loglevel", "error",
+        *background_args(seconds),
+        "-loop", "1", "-i", card,
+        "-filter_complex", graph, "-map", "[outv]", "-t", str(seconds),
+        "-c:v", "libx264", "-preset", "ultrafast", "-f", "null", "-",
+    ]
+
+
+def new_cmd(card: str, seconds: float, intro: float) -> list[str]:
+    return [
+        "ffmpeg", "-y", "-loglevel", "error",
+        *background_args(seconds),
+        *_card_input(_prescaled_card(card), intro, FPS),
+        "-filter_complex", _card_overlay("0:v", "1:v", "outv"),
+        "-map", "[outv]", "-t", str(seconds),
+        "-c:v", "libx264", "-preset", "ultrafast", "-f", "null", "-",
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare render fps of the old and current card overlay graphs.")
+    ap.add_argument("--seconds", type=float, default=180.0, help="story length")
+    ap.add_argument("--intro", type=float, default=6.0, help="first-sentence duration")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        card = make_card(os.path.join(tmp, "card.png"))
+        results = {}
+        for name, build in (("old", old_cmd), ("new", new_cmd)):
+            walls = []
+            for i in range(args.runs):
+                stats = run_ffmpeg(build(card, args.seconds, args.intro), f"{name}{i}",
+                                   expected_s=args.seconds, on_progress=lambda ev: None)
+                walls.append(stats["wall_s"])
+            wall = statistics.median(walls)
+            results[name] = wall
+            print(f"{name}: median {wall:.2f}s wall, {args.seconds * FPS / wall:.1f} fps")
+
+    print(f"speedup: {results['old'] / results['new']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
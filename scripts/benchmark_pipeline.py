@@ -0,0 +1,200 @@
+# scripts/benchmark_pipeline.py
+#
+# Offline end-to-end benchmark. Drives every stage in src.main.STAGES with the
+# local service backends in src/local_services.py (synthetic Reddit listing,
+# rule-based LLM, synthetic-tone TTS, directory-backed Drive/YouTube) and
+# reports wall time, CPU time (own + ffmpeg children) and peak RSS per stage
+# as JSON.
+#
+#   python -m scripts.benchmark_pipeline --sizes small medium huge --out bench.json
+#
+# Each size runs in a fresh interpreter so peak RSS figures don't leak across
+# runs. Card rasterization and all ffmpeg work run for real, so FFmpeg and
+# Playwright's Chromium must be installed.
+
+import argparse
+import contextlib
+import dataclasses
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "BENCH_JSON "
+
+
+def _reset_peak_rss() -> None:
+    # Linux lets us reset VmHWM so each stage reports its own high-water mark
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS; either way it never resets
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _cpu(ru) -> float:
+    return ru.ru_utime + ru.ru_stime
+
+
+def measure_stage(fn, job) -> dict:
+    _reset_peak_rss()
+    self0 = resource.getrusage(resource.RUSAGE_SELF)
+    kids0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    fn(job)
+    wall = time.perf_counter() - t0
+    self1 = resource.getrusage(resource.RUSAGE_SELF)
+    kids1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "wall_s":               round(wall, 4),
+        "cpu_s":                round(_cpu(self1) - _cpu(self0), 4),
+        "cpu_children_s":       round(_cpu(kids1) - _cpu(kids0), 4),
+        "peak_rss_mb":          round(_peak_rss_mb(), 1),
+        # largest child (ffmpeg/Chromium) seen so far in this process
+        "children_peak_rss_mb": round(kids1.ru_maxrss / 1024, 1),
+    }
+
+
+def use_local_backends(size: str, workdir: str) -> None:
+    """
+    Point every external service at its local backend, with scratch
+    directories under workdir.
+    """
+    import src.config as config
+
+    bench_settings = dataclasses.replace(
+        config.settings,
+        reddit_backend="local",
+        drive_backend="local",
+        youtube_backend="local",
+        llm_backend="local",
+        tts_provider="local",
+        local_reddit_posts="",
+        local_post_size=size,
+        local_drive_dir=os.path.join(workdir, "drive"),
+        local_upload_dir=os.path.join(workdir, "youtube_uploads"),
+        subreddits=["bench"],
+        used_posts_file=os.path.join(workdir, f"used_posts_{size}.json"),
+        workspace_dir=os.path.join(workdir, "workspaces"),
+        upload_to_drive=True,
+        upload_to_youtube=True,
+    )
+    if os.path.exists(bench_settings.used_posts_file):
+        os.remove(bench_settings.used_posts_file)
+    for name, mod in list(sys.modules.items()):
+        if name.startswith("src") and getattr(mod, "settings", None) is config.settings:
+            mod.settings = bench_settings
+    config.settings = bench_settings
+
+
+def run_child(size: str, workdir: str) -> None:
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    use_local_backends(size, workdir)
+    from src.main import Job, STAGES
+
+    job, stages = Job(), {}
+    t0 = time.perf_counter()
+    # pipeline chatter goes to stderr so stdout only carries the result
+    with contextlib.redirect_stdout(sys.stderr):
+        for name, fn in STAGES:
+            stages[name] = measure_stage(fn, job)
+    result = {
+        "size":       size,
+        "sentences":  len(job.sentences),
+        "tts_requests": len(job.chunks),
+        "words":      len(job.all_words),
+        "audio_s":    round(sum(ms for _, ms in job.wav_infos) / 1000, 2),
+        "total_wall_s": round(time.perf_counter() - t0, 4),
+        "stages":     stages,
+    }
+    print(MARKER + json.dumps(result))
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summarize(runs: list[dict]) -> dict:
+    """Median of every per-stage metric across repeats."""
+    out = {}
+    for stage in runs[0]["stages"]:
+        out[stage] = {
+            k: round(statistics.median(r["stages"][stage][k] for r in runs), 4)
+            for k in runs[0]["stages"][stage]
+        }
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", nargs="+", default=["small", "medium", "huge"])
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--workdir", default=os.path.join(ROOT, ".bench"))
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    if args.child:
+        run_child(args.child, args.workdir)
+        return 0
+
+    report = {
+        "commit":   _git_commit(),
+        "python":   platform.python_version(),
+        "platform": platform.platform(),
+        "cpus":     os.cpu_count(),
+        "created":  time.time(),
+        "results":  {},
+    }
+    for size in args.sizes:
+        runs = []
+        for i in range(args.repeat):
+            print(f"[~] Benchmarking {size} post (run {i + 1}/{args.repeat})…", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, "-m", "scripts.benchmark_pipeline", "--child", size, "--workdir", args.workdir],
+                cwd=ROOT, stdout=subprocess.PIPE, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"[!] {size} run failed with exit code {proc.returncode}", file=sys.stderr)
+                return proc.returncode
+            line = next(l for l in reversed(proc.stdout.splitlines()) if l.startswith(MARKER))
+            runs.append(json.loads(line[len(MARKER):]))
+        report["results"][size] = {"runs": runs, "median": _summarize(runs)}
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[+] Benchmark report → {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
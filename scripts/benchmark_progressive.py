@@ -0,0 +1,97 @@
+# scripts/benchmark_progressive.py
+#
+# Time to a finished encode when the background clip is not cached yet:
+# download the whole clip, then encode (the old order), against encoding
+# from a ProgressiveClip while it downloads (src/progressive.py). The clip
+# is served by scripts/fake_range_server.py with a per-connection rate
+# limit; the encode reads the first --seconds of it, like burn_and_mux.
+#
+# Without --clip a synthetic 1080x1920 clip is generated, written without
+# +faststart so the moov atom sits at the end as in most camera/game
+# recordings.
+#
+#   python -m scripts.benchmark_progressive
+#   python -m scripts.benchmark_progressive --clip bg.mp4 --rate-mbps 20 --seconds 45
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import requests
+from dotenv import load_dotenv
+from scripts.fake_range_server import RangeHandler, serve
+from src.ffmpeg_runner import run_ffmpeg
+from src.progressive import ProgressiveClip
+from src.ranged_download import RangedDownload
+
+load_dotenv()
+
+
+def make_clip(path: str, seconds: int) -> str:
+    run_ffmpeg([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1080x1920:rate=30:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", "30", "-b:v", "6M",
+        path,
+    ], "make_clip", expected_s=seconds)
+    return path
+
+
+def encode(src: str, out: str, seconds: float) -> None:
+    run_ffmpeg([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-stream_loop", "-1", "-i", src,
+        "-t", str(seconds),
+        "-vf", "scale=540:960", "-c:v", "libx264", "-preset", "ultrafast",
+        out,
+    ], "encode", expected_s=seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare download-then-encode with progressive encoding.")
+    parser.add_argument("--clip", help="clip to serve (default: a generated 120 s clip)")
+    parser.add_argument("--seconds", type=float, default=10, help="seconds of the clip the encode uses")
+    parser.add_argument("--rate-mbps", type=float, default=20, help="per-connection throughput of the stand-in")
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.clip or make_clip(os.path.join(tmp, "source.mp4"), 120)
+        with open(clip, "rb") as f:
+            payload = f.read()
+        md5 = hashlib.md5(payload).hexdigest()
+        RangeHandler.rate = int(args.rate_mbps * 1e6 / 8)
+        server = serve(payload)
+        url = f"http://127.0.0.1:{server.server_address[1]}/files/clip"
+        out = os.path.join(tmp, "out.mp4")
+
+        def download(name: str) -> RangedDownload:
+            return RangedDownload(requests.Session(), url, os.path.join(tmp, name), len(payload), md5,
+                                  part_size=args.part_mb * 1024 * 1024, workers=args.workers)
+
+        print(f"Clip: {len(payload) / 1e6:.1f} MB, encode uses {args.seconds:g}s, "
+              f"{args.rate_mbps:g} Mbit/s per connection, {args.workers} connections")
+
+        RangeHandler.requested_bytes = 0
+        t0 = time.perf_counter()
+        full = download("full.mp4").run()
+        t_dl = time.perf_counter() - t0
+        encode(full, out, args.seconds)
+        t_full = time.perf_counter() - t0
+        print(f"  download, then encode: {t_full:6.2f}s (download {t_dl:.2f}s, "
+              f"{RangeHandler.requested_bytes / 1e6:.1f} MB transferred)")
+
+        RangeHandler.requested_bytes = 0
+        t0 = time.perf_counter()
+        with ProgressiveClip(download("progressive.mp4")) as pclip:
+            encode(pclip.url, out, args.seconds)
+        t_prog = time.perf_counter() - t0
+        print(f"  progressive:           {t_prog:6.2f}s ({RangeHandler.requested_bytes / 1e6:.1f} MB transferred)")
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
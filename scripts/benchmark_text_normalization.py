@@ -0,0 +1,84 @@
+# scripts/benchmark_text_normalization.py
+#
+# Times src.text_processing.normalize_text (one compiled alternation, one
+# scan) against the previous implementation (one re.sub per abbreviation,
+# then one pass per markdown rule, then emoji removal) over a corpus of long
+# synthetic posts, and reports how many outputs differ.
+#
+#   python -m scripts.benchmark_text_normalization
+#   python -m scripts.benchmark_text_normalization --posts 200 --size huge --repeat 5
+
+import argparse
+import html
+import re
+import statistics
+import time
+from dotenv import load_dotenv
+from src.text_processing import ABBREVIATIONS, normalize_text, remove_emojis
+from src.local_services import make_post
+
+load_dotenv()
+
+# ---- previous implementation, kept verbatim for comparison ----
+
+_LEGACY_ABBREVIATIONS = {rf"\b{re.escape(k)}\b": v for k, v in ABBREVIATIONS.items()}
+
+
+def legacy_translate_phrases(text: str) -> str:
+    for pat, full in _LEGACY_ABBREVIATIONS.items():
+        text = re.sub(pat, full, text, flags=re.IGNORECASE)
+    return text
+
+
+def legacy_clean_markdown(text: str) -> str:
+    text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
+    text = re.sub(r'(\*{1,3}|_{1,3})(.*?)\1', r'\2', text)
+    text = re.sub(r'(?m)^>\s*', '', text)
+    text = html.unescape(text).strip()
+    return remove_emojis(text)
+
+
+def legacy_normalize(text: str) -> str:
+    return legacy_clean_markdown(legacy_translate_phrases(text)).strip()
+
+
+def corpus(n: int, size: str) -> list[str]:
+    posts = [make_post(size, seed) for seed in range(n)]
+    return [p.title + "\n\n" + p.selftext for p in posts]
+
+
+def time_it(fn, texts: list[str], repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        runs.append(time.perf_counter() - t0)
+    return statistics.median(runs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time normalize_text against the previous implementation.")
+    ap.add_argument("--posts", type=int, default=100)
+    ap.add_argument("--size", default="huge", choices=["small", "medium", "huge"])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    texts = corpus(args.posts, args.size)
+    chars = sum(map(len, texts))
+    normalize_text(texts[0])  # compile outside the timed loop
+
+    old = time_it(legacy_normalize, texts, args.repeat)
+    new = time_it(normalize_text, texts, args.repeat)
+    differ = sum(legacy_normalize(t) != normalize_text(t) for t in texts)
+
+    print(f"corpus: {len(texts)} posts, {chars / 1e6:.2f} M chars")
+    print(f"legacy: {old * 1000:8.1f} ms  ({chars / old / 1e6:.1f} M chars/s)")
+    print(f"engine: {new * 1000:8.1f} ms  ({chars / new / 1e6:.1f} M chars/s)")
+    print(f"speedup: {old / new:.2f}x, outputs differing: {differ}/{len(texts)}")
+
+
+if __name__ == "__main__":
+    main()
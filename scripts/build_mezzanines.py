@@ -0,0 +1,32 @@
+# scripts/build_mezzanines.py
+#
+# One-time preprocessing of the background library: download every clip in
+# DRIVE_BACKGROUNDS_FOLDER_ID into the local cache and transcode each one
+# into its 1080x1920 mezzanine (see src/mezzanine.py). Re-running only
+# builds what is missing or stale.
+#
+#   python -m scripts.build_mezzanines            # whole Drive folder
+#   python -m scripts.build_mezzanines clip.mp4   # specific local files
+
+import sys
+from dotenv import load_dotenv
+from src.mezzanine import find_mezzanine, build_mezzanine
+
+load_dotenv()
+
+def main(paths: list[str]):
+    if not paths:
+        from src.asset_manager import list_background_files, download_background
+        files = list_background_files()
+        print(f"Found {len(files)} clips in the backgrounds folder")
+        paths = [download_background(f) for f in files]
+
+    for src in paths:
+        mezz = find_mezzanine(src)
+        if mezz:
+            print(f" • {src}: up to date ({mezz})")
+        else:
+            print(f" • {src}: built {build_mezzanine(src)}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+# scripts/check_import_time.py
+#
+# Cold-start import budget for the CLI. Runs `python -X importtime -c
+# "import src.main"` in a fresh interpreter and fails (exit 1) if the total
+# import time exceeds the budget or if any provider-only heavy module was
+# pulled in at import time.
+#
+#   python scripts/check_import_time.py [--budget-ms 1500] [--runs 3]
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only loaded once a provider or upload target is actually resolved
+FORBIDDEN = (
+    "torch",
+    "whisper",
+    "elevenlabs",
+    "playwright",
+    "googleapiclient",
+    "google.genai",
+    "vosk",
+    "edge_tts",
+)
+
+
+def measure(target: str) -> tuple[float, set[str]]:
+    """
+    Return (cumulative import time of `target` in ms, set of imported modules).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{proc.stderr[-2000:]}")
+
+    total_us, modules = 0, set()
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.add(name)
+        if name == target:
+            total_us = int(cumulative)
+    return total_us / 1000.0, modules
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--target", default="src.main")
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    timings, modules = [], set()
+    for _ in range(args.runs):
+        ms, mods = measure(args.target)
+        timings.append(ms)
+        modules |= mods
+    best = min(timings)
+
+    heavy = sorted(m for m in modules if any(m == f or m.startswith(f + ".") for f in FORBIDDEN))
+    print(f"[*] import {args.target}: best {best:.0f} ms of {args.runs} (budget {args.budget_ms:.0f} ms)")
+
+    ok = True
+    if heavy:
+        print(f"[!] Heavy provider modules imported at startup: {', '.join(heavy)}")
+        ok = False
+    if best > args.budget_ms:
+        print(f"[!] Import time {best:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        ok = False
+    print("[+] Import budget OK" if ok else "[!] Import budget FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
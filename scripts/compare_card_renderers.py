@@ -0,0 +1,97 @@
+# scripts/compare_card_renderers.py
+#
+# Renders the same cards with both renderers, the Chromium path
+# (generate_svg + svg_to_card_png) and the Pillow path (src/card_renderer.py),
+# and reports time per card and how far apart the PNGs are: mean absolute
+# difference per channel (0-255) and the share of pixels that differ by more
+# than --threshold. Both PNGs and an amplified diff image for each card are
+# written to --out for a visual check.
+#
+#   python -m scripts.compare_card_renderers
+#   python -m scripts.compare_card_renderers --runs 5 --out .bench/cards
+
+import argparse
+import os
+import statistics
+import time
+from dotenv import load_dotenv
+from PIL import Image, ImageChops
+from src.config import settings
+from src.card_renderer import render_card
+from src.thumbnail_card_generator import generate_svg
+from src.svg_raster import svg_to_card_png
+
+load_dotenv()
+
+TITLES = [
+    ("short", "TIFU by microwaving a fork", False),
+    ("wrapped", "AITA for telling my sister that her wedding plans were ridiculous and then skipping it entirely?", True),
+    ("grown", "My landlord kept entering my apartment without notice, so I installed a camera and what I found "
+              "changed how I think about renting forever, and also my neighbours", False),
+]
+
+CARD_ARGS = dict(crop_x=13, crop_y=0, crop_w=1444, crop_h=820, target_w=1080, corner_radius=50)
+
+
+def playwright_card(title: str, verified: bool, out_png: str, svg_path: str) -> None:
+    generate_svg(
+        template_svg    = settings.thumbnail_template_svg,
+        output_svg      = svg_path,
+        subreddit       = "",
+        title           = title,
+        verified        = verified,
+        font_path       = settings.thumbnail_font_path,
+        sub_font_size   = settings.thumbnail_sub_font_size,
+        title_font_size = settings.thumbnail_title_font_size,
+        padding_px      = settings.thumbnail_padding,
+    )
+    svg_to_card_png(svg_path=svg_path, out_png=out_png, **CARD_ARGS)
+
+
+def pillow_card(title: str, verified: bool, out_png: str) -> None:
+    render_card(title, out_png, verified=verified, **CARD_ARGS)
+
+
+def timed(fn, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def compare(a_png: str, b_png: str, diff_png: str, threshold: int) -> tuple[float, float]:
+    with Image.open(a_png) as a, Image.open(b_png) as b:
+        a, b = a.convert("RGBA"), b.convert("RGBA")
+        if a.size != b.size:
+            raise SystemExit(f"size mismatch: {a_png} {a.size} vs {b_png} {b.size}")
+        diff = ImageChops.difference(a, b)
+    data = diff.getdata()
+    total = sum(sum(px) for px in data)
+    over = sum(1 for px in data if max(px) > threshold)
+    diff.convert("RGB").point(lambda v: min(255, v * 4)).save(diff_png)
+    return total / (len(data) * 4), over / len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Chromium and Pillow card renderers.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threshold", type=int, default=32, help="per-channel difference counted as a changed pixel")
+    parser.add_argument("--out", default=".bench/cards")
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+
+    print(f"{'card':8} {'chromium':>10} {'pillow':>10} {'mean diff':>10} {'changed':>9}")
+    for name, title, verified in TITLES:
+        pw_png = os.path.join(args.out, f"{name}.playwright.png")
+        pil_png = os.path.join(args.out, f"{name}.pillow.png")
+        svg = os.path.join(args.out, f"{name}.svg")
+        pw_s = timed(lambda: playwright_card(title, verified, pw_png, svg), args.runs)
+        pil_s = timed(lambda: pillow_card(title, verified, pil_png), args.runs)
+        mean, changed = compare(pw_png, pil_png, os.path.join(args.out, f"{name}.diff.png"), args.threshold)
+        print(f"{name:8} {pw_s * 1000:8.0f}ms {pil_s * 1000:8.1f}ms {mean:10.2f} {changed:9.2%}")
+
+
+if __name__ == "__main__":
+    main()
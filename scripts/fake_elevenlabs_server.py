@@ -0,0 +1,159 @@
+# scripts/fake_elevenlabs_server.py
+#
+# Local stand-in for ElevenLabs' /v1/text-to-speech/{voice}/with-timestamps
+# endpoint. It answers with a tone whose length follows the text and canned,
+# evenly spaced character alignments, takes a fixed latency per request, and
+# returns 429 "too_many_concurrent_requests" above a concurrency limit like
+# the real API. Audio is raw PCM for output_format=pcm_<rate>, MP3 otherwise.
+# Run it directly to exercise src.tts_elevenlabs end to end:
+#
+#   python -m scripts.fake_elevenlabs_server
+#
+# or keep it running and point the pipeline at it with
+# ELEVENLABS_BASE_URL=http://127.0.0.1:<port>
+
+import base64
+import dataclasses
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src import tts_elevenlabs
+from src.ffmpeg_runner import run_ffmpeg
+from src.text_processing import normalize_text, split_sentences, plan_chunks
+from src.local_services import make_post, write_tone
+
+MS_PER_CHAR = 60
+
+
+def _tone(duration_ms: int, output_format: str) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        wav, mp3 = os.path.join(tmp, "t.wav"), os.path.join(tmp, "t.mp3")
+        if output_format.startswith("pcm_"):
+            write_tone(wav, duration_ms, 330, rate=int(output_format.split("_")[1]))
+            with wave.open(wav, "rb") as w:
+                return w.readframes(w.getnframes())
+        write_tone(wav, duration_ms, 330, rate=44100)
+        run_ffmpeg(["ffmpeg", "-y", "-loglevel", "error", "-i", wav, mp3], "fake_tts_mp3",
+                   expected_s=duration_ms / 1000, on_progress=lambda ev: None)
+        with open(mp3, "rb") as f:
+            return f.read()
+
+
+def _alignment(text: str) -> dict:
+    step = MS_PER_CHAR / 1000
+    return {
+        "characters": list(text),
+        "character_start_times_seconds": [i * step for i in range(len(text))],
+        "character_end_times_seconds": [(i + 1) * step for i in range(len(text))],
+    }
+
+
+class ElevenLabsHandler(BaseHTTPRequestHandler):
+    max_concurrent = 2
+    latency_s = 0.3
+    in_flight = 0
+    served = 0
+    rejected = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+        url = urlparse(self.path)
+        output_format = parse_qs(url.query).get("output_format", ["mp3_44100_128"])[0]
+        if not url.path.endswith("/with-timestamps"):
+            return self._reply(404, {"detail": "not found"})
+
+        cls = type(self)
+        with cls.lock:
+            if cls.in_flight >= cls.max_concurrent:
+                cls.rejected += 1
+                busy = True
+            else:
+                cls.in_flight += 1
+                busy = False
+        if busy:
+            return self._reply(429, {"detail": {"status": "too_many_concurrent_requests"}})
+
+        try:
+            time.sleep(cls.latency_s)
+            text = req.get("text", "")
+            audio = _tone(max(200, len(text) * MS_PER_CHAR), output_format)
+            align = _alignment(text)
+            self._reply(200, {
+                "audio_base64": base64.b64encode(audio).decode("ascii"),
+                "alignment": align,
+                "normalized_alignment": align,
+            })
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+                cls.served += 1
+
+
+def serve(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), ElevenLabsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run(base_url: str, concurrency: int, output_format: str, chunks, out_dir: str):
+    tts_elevenlabs.settings = dataclasses.replace(
+        tts_elevenlabs.settings,
+        elevenlabs_base_url=base_url,
+        elevenlabs_api_key="fake",
+        elevenlabs_concurrency=concurrency,
+        elevenlabs_output_format=output_format,
+    )
+    tts_elevenlabs._client = None
+    t0 = time.perf_counter()
+    wav_infos, words = tts_elevenlabs.synthesize_with_elevenlabs(chunks, out_dir=out_dir)
+    return wav_infos, words, time.perf_counter() - t0
+
+
+def main():
+    server = serve()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    post = make_post("medium")
+    sentences = split_sentences(normalize_text(post.title + "\n\n" + post.selftext))
+    chunks = plan_chunks(sentences)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mp3_infos, _, serial = _run(base_url, 1, "mp3_44100_128", chunks, os.path.join(tmp, "serial"))
+        wav_infos, words, parallel = _run(base_url, 4, "pcm_24000", chunks, os.path.join(tmp, "parallel"))
+
+    print(f"[*] {len(sentences)} sentences in {len(chunks)} chunks")
+    print(f"[*] serial mp3 {serial:.2f}s, pcm at concurrency 4 against a limit of "
+          f"{ElevenLabsHandler.max_concurrent}: {parallel:.2f}s ({ElevenLabsHandler.rejected} x 429)")
+
+    # PCM durations come from the sample count; MP3 adds encoder padding
+    for (_, pcm_ms), (_, mp3_ms) in zip(wav_infos, mp3_infos):
+        assert abs(pcm_ms - mp3_ms) < 100, "PCM and MP3 durations disagree"
+
+    assert len(wav_infos) == len(chunks), "one wav per chunk"
+    assert [w["word"] for w in words] == [t for c in chunks for t in c.text.split()], "words out of order"
+    assert {w["sid"] for w in words} == set(range(len(sentences))), "sentence ids lost"
+    assert all(a["sid"] <= b["sid"] for a, b in zip(words, words[1:])), "sentence ids not monotonic"
+    assert all(a["start"] <= b["start"] for a, b in zip(words, words[1:])), "offsets not cumulative"
+    print("[+] ElevenLabs stand-in check passed")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# scripts/fake_range_server.py
+#
+# Local stand-in for Drive's `files/<id>?alt=media` endpoint with HTTP Range
+# support. Run it directly to exercise src.ranged_download end to end: a
+# first download "crashes" part way through, a fresh RangedDownload resumes
+# it from the ranges sidecar, and a wrong md5 is rejected. Some requests are
+# answered with 503 or cut short to exercise the retries.
+#
+#   python -m scripts.fake_range_server
+#
+# or serve a file for the real pipeline with
+#   python -m scripts.fake_range_server --serve clip.mp4
+# and DRIVE_DOWNLOAD_URL=http://127.0.0.1:<port>/files/{file_id}
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.ranged_download import DownloadError, RangedDownload
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    payload = b""
+    fail_rate = 0.0          # share of requests answered with 503
+    truncate_rate = 0.0      # share of requests whose body is cut short
+    rate = 0                 # bytes/s per connection, 0 = unthrottled
+    requested_bytes = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = len(self.payload)
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not m:
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            self.wfile.write(self.payload)
+            return
+        start = int(m.group(1))
+        end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+        if start >= size or end < start:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if random.random() < self.fail_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = self.payload[start:end + 1]
+        with self._lock:
+            RangeHandler.requested_bytes += len(body)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if random.random() < self.truncate_rate:
+            # promise the whole range, send half, hang up
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        step = max(1, self.rate // 20) if self.rate else len(body)
+        try:
+            for i in range(0, len(body), step):
+                self.wfile.write(body[i:i + step])
+                if self.rate:
+                    time.sleep(step / self.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up on the range
+
+
+def serve(payload: bytes, port: int = 0) -> ThreadingHTTPServer:
+    RangeHandler.payload = payload
+    server = ThreadingHTTPServer(("127.0.0.1", port), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _DyingSession(requests.Session):
+    """Session that 'crashes' the process after a number of range GETs."""
+
+    def __init__(self, die_after: int):
+        super().__init__()
+        self.die_after = die_after
+        self._lock = threading.Lock()
+
+    def get(self, url, **kw):
+        with self._lock:
+            if self.die_after == 0:
+                raise KeyboardInterrupt("simulated crash")
+            self.die_after -= 1
+        return super().get(url, **kw)
+
+
+def check():
+    part = 256 * 1024
+    payload = os.urandom(part * 24 + 4321)
+    md5 = hashlib.md5(payload).hexdigest()
+    server = serve(payload)
+    url = f"http://127.0.0.1:{server.server_address[1]}/files/clip"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, "clip.mp4")
+
+        first = RangedDownload(_DyingSession(die_after=10), url, dest, len(payload), md5, part_size=part, workers=4)
+        try:
+            first.run()
+        except KeyboardInterrupt:
+            print(f"[*] First attempt died after {first.bytes_fetched} bytes "
+                  f"({len(first._done)}/{len(first.ranges)} ranges recorded)")
+        assert not os.path.exists(dest), "unfinished download renamed into place"
+
+        RangeHandler.fail_rate, RangeHandler.truncate_rate = 0.15, 0.15
+        RangeHandler.requested_bytes = 0
+        session = requests.Session()
+        t0 = time.perf_counter()
+        second = RangedDownload(session, url, dest, len(payload), md5, part_size=part, workers=4)
+        second.run()
+        print(f"[*] Resumed attempt fetched {second.bytes_fetched} of {len(payload)} bytes "
+              f"in {time.perf_counter() - t0:.2f}s (server sent {RangeHandler.requested_bytes} "
+              f"including retried and cut-short ranges)")
+
+        with open(dest, "rb") as f:
+            assert f.read() == payload, "downloaded file differs from the served one"
+        assert second.bytes_fetched < len(payload), "resume re-fetched the whole file"
+        assert sorted(os.listdir(tmp)) == ["clip.mp4"], f"leftovers: {os.listdir(tmp)}"
+
+        RangeHandler.fail_rate = RangeHandler.truncate_rate = 0.0
+        bad = os.path.join(tmp, "bad.mp4")
+        try:
+            RangedDownload(session, url, bad, len(payload), "0" * 32, part_size=part).run()
+        except DownloadError as e:
+            print(f"[*] Wrong md5 rejected: {e}")
+        else:
+            raise AssertionError("md5 mismatch was not detected")
+        assert not any(n.startswith("bad.mp4") for n in os.listdir(tmp)), "corrupt download left behind"
+        print("[+] Ranged download stand-in check passed")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Range-serving stand-in for Drive media downloads.")
+    parser.add_argument("--serve", metavar="FILE", help="serve FILE (any id) until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--rate-mbps", type=float, default=0, help="throttle each connection (megabits/s)")
+    args = parser.parse_args()
+    if not args.serve:
+        check()
+        return
+
+    with open(args.serve, "rb") as f:
+        payload = f.read()
+    RangeHandler.rate = int(args.rate_mbps * 1e6 / 8)
+    server = serve(payload, args.port)
+    port = server.server_address[1]
+    print(f"[+] Serving {args.serve} ({len(payload)} bytes, md5 {hashlib.md5(payload).hexdigest()})")
+    print(f"    DRIVE_DOWNLOAD_URL=http://127.0.0.1:{port}/files/{{file_id}}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# scripts/fake_resumable_server.py
+#
+# Local stand-in for Google's resumable upload endpoint. Run it directly to
+# exercise src.resumable_upload end to end: the upload is killed part way
+# through, then resumed by a fresh ResumableUpload from the persisted state.
+#
+#   python -m scripts.fake_resumable_server
+#
+# or point the uploader at it with YOUTUBE_UPLOAD_URL=http://127.0.0.1:<port>/upload
+
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.resumable_upload import ResumableUpload
+
+
+class _Session:
+    def __init__(self, total: int):
+        self.total = total
+        self.data = bytearray()
+
+
+class ResumableHandler(BaseHTTPRequestHandler):
+    sessions: dict[str, _Session] = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code: int, headers: dict | None = None, body: dict | None = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", "0")))
+
+    def do_POST(self):
+        self._read_body()
+        total = int(self.headers["X-Upload-Content-Length"])
+        sid = uuid.uuid4().hex
+        self.sessions[sid] = _Session(total)
+        host, port = self.server.server_address
+        self._reply(200, {"Location": f"http://{host}:{port}/session/{sid}"})
+
+    def do_PUT(self):
+        sid = self.path.rsplit("/", 1)[-1]
+        body = self._read_body()
+        sess = self.sessions.get(sid)
+        if sess is None:
+            return self._reply(404)
+
+        rng = self.headers.get("Content-Range", "")
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+)", rng)
+        if m:
+            start = int(m.group(1))
+            if start != len(sess.data):
+                return self._reply(400, body={"error": "offset mismatch"})
+            sess.data.extend(body)
+
+        if len(sess.data) >= sess.total:
+            return self._reply(200, body={"id": sid, "bytes": len(sess.data)})
+        headers = {"Range": f"bytes=0-{len(sess.data) - 1}"} if sess.data else {}
+        self._reply(308, headers)
+
+
+def serve(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), ResumableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _DyingSession(requests.Session):
+    """Session that 'crashes' the process after a number of chunk PUTs."""
+
+    def __init__(self, die_after: int):
+        super().__init__()
+        self.die_after = die_after
+
+    def put(self, url, **kw):
+        if kw.get("data"):
+            if self.die_after == 0:
+                raise KeyboardInterrupt("simulated crash")
+            self.die_after -= 1
+        return super().put(url, **kw)
+
+
+def main():
+    server = serve()
+    url = f"http://127.0.0.1:{server.server_address[1]}/upload"
+    chunk = 256 * 1024
+    payload = os.urandom(chunk * 10 + 1234)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(payload)
+        state_dir = os.path.join(tmp, "state")
+
+        first = ResumableUpload(_DyingSession(die_after=7), url, path, {"snippet": {}}, state_dir, chunk_size=chunk)
+        try:
+            first.run()
+        except KeyboardInterrupt:
+            print(f"[*] First attempt died after {first.bytes_sent} bytes")
+
+        second = ResumableUpload(requests.Session(), url, path, {"snippet": {}}, state_dir, chunk_size=chunk)
+        res = second.run()
+        print(f"[*] Resumed attempt sent {second.bytes_sent} of {len(payload)} bytes")
+
+        stored = bytes(ResumableHandler.sessions[res["id"]].data)
+        assert stored == payload, "server copy differs from source file"
+        assert second.bytes_sent < len(payload), "resume re-sent the whole file"
+        assert not os.listdir(state_dir), "state file left behind after completion"
+        print("[+] Resumable upload stand-in check passed")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
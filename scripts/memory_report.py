@@ -0,0 +1,74 @@
+# scripts/memory_report.py
+#
+# Per-stage memory from the spans recorded with MEMORY_PROFILE=true: the
+# largest and 95th-percentile need (RSS growth + child processes started
+# in the stage), the tracemalloc peak and the child-process peak of every
+# stage in METRICS_JSONL. Prints a STAGE_MEMORY_BUDGETS line (the largest
+# need plus --headroom) and how many jobs those budgets fit on this host.
+#
+#   MEMORY_PROFILE=true SERVICE_BACKEND=local python -m src.main
+#   python -m scripts.memory_report
+#   python -m scripts.memory_report --spans metrics/spans.jsonl --headroom 0.25
+
+import argparse
+import json
+from collections import defaultdict
+from dotenv import load_dotenv
+from src.config import settings
+from src.memory import available_mb, jobs_that_fit
+
+load_dotenv()
+
+
+def _p95(vals: list[float]) -> float:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(0.95 * (len(vals) - 1))))]
+
+
+def load(path: str) -> dict[str, list[dict]]:
+    by_stage = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("span", "").startswith("stage.") and "memory_mb" in rec:
+                by_stage[rec["span"][len("stage."):]].append(rec)
+    return by_stage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-stage memory and suggest budgets.")
+    parser.add_argument("--spans", default=settings.metrics_jsonl)
+    parser.add_argument("--headroom", type=float, default=0.2, help="added to the largest need (fraction)")
+    args = parser.parse_args()
+
+    by_stage = load(args.spans)
+    if not by_stage:
+        print(f"[!] No stage spans with memory figures in {args.spans}; run with MEMORY_PROFILE=true")
+        return
+
+    print(f"{'stage':<10} {'runs':>5} {'need max':>9} {'need p95':>9} {'py peak':>8} {'children':>9}  (MB)")
+    budgets = {}
+    for stage, recs in by_stage.items():
+        need = [r["memory_mb"] for r in recs]
+        print(f"{stage:<10} {len(recs):>5} {max(need):>9.0f} {_p95(need):>9.0f} "
+              f"{max(r.get('py_peak_mb', 0) for r in recs):>8.0f} "
+              f"{max(r.get('children_rss_peak_mb', 0) for r in recs):>9.0f}")
+        budgets[stage] = max(need) * (1 + args.headroom)
+
+    line = ",".join(f"{s}={max(1, round(mb))}" for s, mb in budgets.items())
+    print(f"\nSTAGE_MEMORY_BUDGETS={line}")
+    avail = available_mb()
+    if avail is not None:
+        per_job = max(budgets.values())
+        print(f"[*] {avail:.0f} MB available, {settings.memory_reserve_mb} MB reserved: "
+              f"{max(1, int((avail - settings.memory_reserve_mb) // per_job))} job(s) fit with these budgets")
+    fit = jobs_that_fit()
+    if fit is not None:
+        print(f"[*] The configured STAGE_MEMORY_BUDGETS fit {fit} job(s)")
+
+
+if __name__ == "__main__":
+    main()
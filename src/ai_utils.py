@@ -1,17 +1,11 @@
 import os
 import re
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from . import metrics
 
 # Load environment variables (expects GEMINI_API_KEY)
 load_dotenv()
 
-# Fetch API key once
-_GEMINI_KEY = os.getenv("GEMINI_API_KEY")
-if not _GEMINI_KEY:
-    raise RuntimeError("GEMINI_API_KEY environment variable is not set or empty.")
-
 # Hashtag extraction logic
 MOOD_MAP = {
     'happy':   ['happy', 'joy', 'upbeat', 'cheerful'],
@@ -24,26 +18,53 @@ MOOD_MAP = {
 AUDIO_ROOT = os.path.join(os.path.dirname(__file__), '..', 'assets', 'audio')
 
 
+_gemini_clients: dict[str, object] = {}
+
+
+def _gemini_client(api_key: str):
+    # one client (and HTTP connection pool) per key for the life of the process
+    from google import genai
+    client = _gemini_clients.get(api_key)
+    if client is None:
+        client = _gemini_clients[api_key] = genai.Client(api_key=api_key)
+    return client
+
+
 def generate_with_gemini(prompt: str) -> str:
     """
     Call Gemini and return the raw generated text.
     Raises RuntimeError if the API request fails or key is invalid.
     """
+    # Checked and imported on first use so importing this module stays cheap
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY environment variable is not set or empty.")
+    from google.genai import types
+
     try:
-        client = genai.Client(api_key=_GEMINI_KEY)
-        response = client.models.generate_content(
-            model="gemini-1.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                max_output_tokens=128,
-                temperature=0.1,
-            ),
-        )
+        with metrics.span("api.gemini", prompt_chars=len(prompt)):
+            response = _gemini_client(api_key).models.generate_content(
+                model="gemini-1.5-flash",
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    max_output_tokens=128,
+                    temperature=0.1,
+                ),
+            )
         return response.text
     except Exception as e:
         raise RuntimeError(f"Gemini generation failed: {e}")
 
 
+def generate(prompt: str) -> str:
+    """
+    Generated text from the configured LLM backend: Gemini, or the
+    keyword rules in local_services with LLM_BACKEND=local.
+    """
+    from .providers import get_llm
+    return get_llm()(prompt)
+
+
 def extract_hashtags(text: str, max_tags: int = 4) -> list[str]:
     tags = re.findall(r"#\w+", text)
     seen = set()
@@ -64,7 +85,7 @@ def suggest_hashtags(description: str, max_tags: int = 4) -> list[str]:
         f"{description}\n\n"
         f"Suggest up to {max_tags} relevant hashtags (include the #):\n"
     )
-    raw = generate_with_gemini(prompt)
+    raw = generate(prompt)
     return extract_hashtags(raw, max_tags)
 
 
@@ -80,7 +101,7 @@ def detect_mood(text: str) -> str:
         f"Text: {text}\n"
         "Respond with exactly one mood word."
     )
-    raw = generate_with_gemini(prompt).strip().lower()
+    raw = generate(prompt).strip().lower()
     return raw if raw in MOOD_MAP else 'neutral'
 
 
@@ -94,7 +115,7 @@ def detect_gender(text: str) -> str:
         f"\nText: {text}\n"
         "Respond with exactly one word: male or female."
     )
-    raw = generate_with_gemini(prompt).strip().lower()
+    raw = generate(prompt).strip().lower()
     return raw if raw in ('male', 'female') else 'female'
 
 
@@ -9,10 +9,10 @@ def format_ts(ms: float) -> str:
     c = cs % 100
     return f"{h}:{m:02d}:{s:02d}.{c:02d}"
 
-def write_karaoke_ass(all_words: list[dict]):
+def write_karaoke_ass(all_words: list[dict], out_path: str):
     # header
     with open(settings.template_ass, encoding='utf-8') as fin, \
-         open(settings.output_ass, 'w', encoding='utf-8') as fout:
+         open(out_path, 'w', encoding='utf-8') as fout:
         for line in fin:
             fout.write(line)
             if line.strip() == "[Events]":
@@ -26,7 +26,7 @@ def write_karaoke_ass(all_words: list[dict]):
     for w in all_words:
         by_sent.setdefault(w['sid'], []).append(w)
 
-    with open(settings.output_ass, 'a', encoding='utf-8') as fout:
+    with open(out_path, 'a', encoding='utf-8') as fout:
         for sid, words in sorted(by_sent.items()):
             # build windows
             windows, cur, length = [], [], 0
@@ -54,3 +54,28 @@ def write_karaoke_ass(all_words: list[dict]):
                 disp = r"{\an5\bord1}" + "".join(parts).strip()
                 st = format_ts(w['start']); et = format_ts(w['end'])
                 fout.write(f"Dialogue: 0,{st},{et},Default,,0,0,0,,{disp}\n")
+
+def parse_ts(ts: str) -> float:
+    h, m, s = ts.strip().split(":")
+    return round((int(h) * 3600 + int(m) * 60 + float(s)) * 1000)
+
+def slice_ass(src_path: str, dst_path: str, start_ms: float, end_ms: float):
+    """
+    Write the events of src_path overlapping [start_ms, end_ms) to dst_path,
+    shifted so start_ms becomes 0. Header and styles are copied verbatim.
+    """
+    with open(src_path, encoding='utf-8') as fin, \
+         open(dst_path, 'w', encoding='utf-8') as fout:
+        for line in fin:
+            if not line.startswith("Dialogue:"):
+                fout.write(line)
+                continue
+            # Dialogue: Layer,Start,End,Style,Name,MarginL,MarginR,MarginV,Effect,Text
+            head, rest = line.split(":", 1)
+            fields = rest.split(",", 9)
+            st, et = parse_ts(fields[1]), parse_ts(fields[2])
+            if et <= start_ms or st >= end_ms:
+                continue
+            fields[1] = format_ts(max(0, st - start_ms))
+            fields[2] = format_ts(min(end_ms, et) - start_ms)
+            fout.write(f"{head}: {fields[0].strip()}," + ",".join(fields[1:]))
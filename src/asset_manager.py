@@ -1,68 +1,147 @@
 import os
 import random
-import tempfile
-import time
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.errors import HttpError
 
-from .drive_utils import get_drive_service
+from .config import settings
+from .drive_utils import DRIVE_SCOPES, get_drive_service
+from .google_services import get_authorized_session
+from .ranged_download import RangedDownload
+from .progressive import ProgressiveClip
+from .keyframes import keyframe_index
+from . import metrics
 
 load_dotenv()
 
-def choose_and_stream_video() -> tempfile.NamedTemporaryFile:
+# live downloads by destination, so full downloads and progressive readers of
+# the same clip (concurrent jobs) share one RangedDownload and fetch each range once
+_downloads: dict[str, RangedDownload] = {}
+_downloads_lock = threading.Lock()
+
+def list_background_files(service=None) -> list[dict]:
     """
-    Pick a random clip from DRIVE_BACKGROUNDS_FOLDER_ID and stream it
-    into a temp file. Uses 8 MiB chunks, retries up to 3 times per chunk,
-    and logs progress every 5 chunks (~40 MiB).
+    List the clips in DRIVE_BACKGROUNDS_FOLDER_ID as Drive file dicts (id, name, size, md5Checksum).
     """
     folder_id = os.getenv("DRIVE_BACKGROUNDS_FOLDER_ID")
     if not folder_id:
         raise RuntimeError("Set DRIVE_BACKGROUNDS_FOLDER_ID in your .env")
 
-    service = get_drive_service()
-    resp = service.files().list(
-        q=f"'{folder_id}' in parents and trashed=false",
-        fields="files(id, name)"
-    ).execute()
+    service = service or get_drive_service()
+    with metrics.span("api.drive.list"):
+        resp = service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields="files(id, name, size, md5Checksum)"
+        ).execute()
     files = resp.get('files', [])
     if not files:
         raise RuntimeError(f"No files found in Drive folder {folder_id}")
+    return files
+
+def cached_clip_path(file: dict) -> Path:
+    suffix = Path(file['name']).suffix or ".mp4"
+    return Path(settings.background_cache_dir) / f"{file['id']}{suffix}"
+
+def _is_cached(file: dict, dest: Path) -> bool:
+    return dest.exists() and (not file.get('size') or dest.stat().st_size == int(file['size']))
+
+def _ranged_download(file: dict, service=None) -> RangedDownload:
+    dest = str(cached_clip_path(file))
+    with _downloads_lock:
+        dl = _downloads.get(dest)
+    if dl is not None:
+        return dl
+
+    if not file.get('size'):
+        service = service or get_drive_service()
+        file = {**file, **service.files().get(fileId=file['id'], fields="size, md5Checksum").execute()}
+    dl = RangedDownload(
+        get_authorized_session(DRIVE_SCOPES),
+        settings.drive_download_url.format(file_id=file['id']),
+        dest,
+        int(file['size']),
+        md5=file.get('md5Checksum'),
+        part_size=settings.drive_download_part_mb * 1024 * 1024,
+        workers=settings.drive_download_workers,
+    )
+    with _downloads_lock:
+        return _downloads.setdefault(dest, dl)
+
+def _forget(dl: RangedDownload) -> None:
+    """Drop a live download, so the next request for the clip builds a fresh one."""
+    with _downloads_lock:
+        if _downloads.get(str(dl.dest)) is dl:
+            del _downloads[str(dl.dest)]
+
+def _completed(dl: RangedDownload) -> None:
+    """A clip is fully in the cache: drop its live download and index it."""
+    _forget(dl)
+    keyframe_index(str(dl.dest))
+
+def download_background(file: dict, service=None) -> str:
+    """
+    Download a Drive clip into the local background cache (keyed by file id)
+    and return its path. Already-cached clips of the right size are reused.
+    Byte ranges are fetched in parallel over the shared authorized session;
+    an interrupted download resumes from its finished ranges, and the result
+    is checked against Drive's size and md5Checksum. New clips are
+    keyframe-indexed right away (see src/keyframes.py).
+    """
+    name = file['name']
+    dest = cached_clip_path(file)
+    if _is_cached(file, dest):
+        print(f"[+] Using cached background “{name}” -> {dest}")
+        return str(dest)
+
+    download = _ranged_download(file, service)
+    print(f"[+] Downloading background “{name}” ({download.size / 1024 ** 2:.0f} MiB) -> {dest}")
+    step = max(download.size // 5, 1)
+    logged = [0]
+
+    def progress(done: int, total: int) -> None:
+        # log about every 20%
+        if done - logged[0] >= step or done == total:
+            logged[0] = done
+            print(f"    Download progress: {done * 100 // total}%")
+
+    with metrics.span("api.drive.download", file_id=file['id']) as rec:
+        before = download.bytes_fetched
+        try:
+            download.run(on_progress=progress)
+        except BaseException:
+            _forget(download)
+            raise
+        finally:
+            rec["bytes"] = download.bytes_fetched - before
+            rec["ranges"] = len(download.ranges)
+    _completed(download)
+    return str(dest)
+
+def open_progressive(file: dict, service=None) -> ProgressiveClip:
+    """
+    Serve a clip that is not cached yet to ffmpeg while it downloads (see
+    src/progressive.py). Only what ffmpeg reads is fetched; the partial file
+    is kept and resumed by the next full download of the clip.
+    """
+    download = _ranged_download(file, service)
+    print(f"[+] Streaming background “{file['name']}” progressively "
+          f"({download.size / 1024 ** 2:.0f} MiB) -> {download.dest}")
+    try:
+        return ProgressiveClip(download, readahead=settings.progressive_readahead,
+                               on_complete=_completed, on_failed=_forget)
+    except BaseException:
+        _forget(download)
+        raise
 
-    choice = random.choice(files)
-    file_id = choice['id']
-    name    = choice['name']
-    suffix  = Path(name).suffix or ".mp4"
-
-    tmp = tempfile.NamedTemporaryFile(prefix="bg_", suffix=suffix, delete=False)
-    print(f"[+] Streaming background “{name}” -> {tmp.name}")
-
-    # Open with default buffering
-    with open(tmp.name, "wb") as fh:
-        downloader = MediaIoBaseDownload(
-            fh,
-            service.files().get_media(fileId=file_id),
-            chunksize=8 * 1024 * 1024  # 8 MiB
-        )
-
-        done = False
-        chunk_count = 0
-        while not done:
-            for attempt in range(1, 4):  # up to 3 retries per chunk
-                try:
-                    status, done = downloader.next_chunk()
-                    break
-                except (TimeoutError, HttpError) as e:
-                    print(f"    Warning: chunk download failed (attempt {attempt}/3): {e}")
-                    if attempt == 3:
-                        raise
-                    time.sleep(2 ** attempt)
-
-            chunk_count += 1
-            # log every 5 chunks (~40 MiB)
-            if chunk_count % 5 == 0 and status:
-                pct = int(status.progress() * 100)
-                print(f"    Download progress: {pct}%")
-
-    return tmp
+def choose_and_stream_video(progressive: bool = False) -> str | ProgressiveClip:
+    """
+    Pick a random clip from DRIVE_BACKGROUNDS_FOLDER_ID and return a local
+    path to it, downloading it into the background cache if needed. With
+    `progressive`, a clip that is not cached yet is returned as a
+    ProgressiveClip instead, so rendering can start before it has arrived.
+    """
+    service = get_drive_service()
+    choice  = random.choice(list_background_files(service))
+    if progressive and not _is_cached(choice, cached_clip_path(choice)):
+        return open_progressive(choice, service)
+    return download_background(choice, service)
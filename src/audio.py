@@ -1,12 +1,41 @@
 from pydub import AudioSegment
-import os, shutil
+import os, shutil, wave
+
+def _concat_pcm(wav_infos: list[tuple[str,int]], wav_out: str) -> bool:
+    """
+    Append the raw frames of same-format PCM WAVs into wav_out without
+    decoding them. Returns False (writing nothing) if the formats differ.
+    """
+    try:
+        params = []
+        for wav, _ in wav_infos:
+            with wave.open(wav, "rb") as w:
+                params.append(w.getparams()[:3])  # nchannels, sampwidth, framerate
+    except wave.Error:
+        return False
+    if len(set(params)) != 1:
+        return False
+
+    with wave.open(wav_out, "wb") as out:
+        out.setnchannels(params[0][0])
+        out.setsampwidth(params[0][1])
+        out.setframerate(params[0][2])
+        for wav, _ in wav_infos:
+            with wave.open(wav, "rb") as w:
+                out.writeframes(w.readframes(w.getnframes()))
+    return True
 
 def combine_wavs(wav_infos: list[tuple[str,int]], mp3_out: str, wav_out: str):
+    os.makedirs(os.path.dirname(mp3_out), exist_ok=True)
+    os.makedirs(os.path.dirname(wav_out) or ".", exist_ok=True)
+    if _concat_pcm(wav_infos, wav_out):
+        AudioSegment.from_wav(wav_out).export(mp3_out, format="mp3")
+        return
+
     combo = AudioSegment.empty()
     for wav, _ in wav_infos:
         seg = AudioSegment.from_file(wav)
         combo = seg if len(combo)==0 else combo.append(seg, crossfade=0)
-    os.makedirs(os.path.dirname(mp3_out), exist_ok=True)
     combo.export(mp3_out, format="mp3")
     combo.export(wav_out, format="wav")
 
@@ -0,0 +1,276 @@
+import base64
+import io
+import math
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from functools import lru_cache
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+from .thumbnail_card_generator import (
+    SVG_NS, SUBREDDIT_LABEL, LINE_HEIGHT, _font, wrap_title, text_width, card_growth,
+)
+from .svg_raster import finish_card
+from .config import settings
+from . import metrics
+
+# Draws the card with Pillow alone: the geometry, fills and embedded images
+# of the SVG template are read once, then each card is a few pastes and two
+# text draws. The layout (wrapping, checkmark position, growth for long
+# titles) comes from the same helpers generate_svg uses, so the result
+# matches the Chromium path (CARD_RENDERER=playwright) to within text
+# antialiasing; scripts/compare_card_renderers.py measures the difference.
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+CHECKMARK_PNG = "assets/checkmark.png"
+
+_ns = {"svg": SVG_NS}
+
+
+@dataclass(frozen=True)
+class Sprite:
+    id: str
+    box: tuple[float, float, float, float]  # x, y, w, h in template px
+    image: Image.Image                       # RGBA, already fitted to the box
+    shadow: tuple[float, float, float, float] | None = None  # dx, dy, blur sigma, opacity
+
+
+@dataclass(frozen=True)
+class CardTemplate:
+    width: int
+    height: int
+    card: tuple[float, float, float, float, float]  # x, y, w, h, rx
+    card_fill: str
+    sprites: tuple[Sprite, ...]
+    sub_pos: tuple[float, float]    # baseline origin of the subreddit line
+    title_pos: tuple[float, float]  # baseline origin of the first title line
+    text_fill: str
+
+
+def _floats(el, *names, default="0") -> list[float]:
+    return [float(el.get(n, default)) for n in names]
+
+
+def _transform(spec: str) -> tuple[float, float, float, float]:
+    """(a, d, e, f) of a scale()/matrix() transform; skew terms are not used by the template."""
+    nums = [float(v) for v in re.findall(r"-?[\d.]+(?:e-?\d+)?", spec or "")]
+    if spec.startswith("matrix"):
+        a, _, _, d, e, f = nums
+        return a, d, e, f
+    if spec.startswith("scale"):
+        sx = nums[0]
+        return sx, nums[1] if len(nums) > 1 else sx, 0.0, 0.0
+    return 1.0, 1.0, 0.0, 0.0
+
+
+def _data_image(href: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(href.split(",", 1)[1]))).convert("RGBA")
+
+
+def _fit_pattern(img: Image.Image, w: float, h: float, tf: tuple[float, float, float, float]) -> Image.Image:
+    """
+    Place an objectBoundingBox pattern image in a w x h box: image pixel
+    (u, v) lands at ((a*u + e) * w, (d*v + f) * h), clipped to the box.
+    """
+    a, d, e, f = tf
+    size = (max(1, round(img.width * a * w)), max(1, round(img.height * d * h)))
+    layer = Image.new("RGBA", (math.ceil(w), math.ceil(h)), (0, 0, 0, 0))
+    layer.paste(img.resize(size, Image.LANCZOS), (round(e * w), round(f * h)))
+    return layer
+
+
+def _drop_shadow(filt) -> tuple[float, float, float, float] | None:
+    offset = filt.find("svg:feOffset", _ns)
+    blur = filt.find("svg:feGaussianBlur", _ns)
+    if offset is None or blur is None:
+        return None
+    # the last colour matrix sets the shadow's alpha (its 19th value)
+    matrix = filt.findall("svg:feColorMatrix", _ns)[-1].get("values").split()
+    return (*_floats(offset, "dx", "dy"), float(blur.get("stdDeviation")), float(matrix[18]))
+
+
+def _rects(el):
+    """(rect, parent element) pairs in document (paint) order, skipping <defs>."""
+    for child in el:
+        if child.tag == f"{{{SVG_NS}}}rect":
+            yield child, el
+        elif child.tag != f"{{{SVG_NS}}}defs":
+            yield from _rects(child)
+
+
+@lru_cache(maxsize=4)
+def load_template(path: str) -> CardTemplate:
+    root = ET.parse(path).getroot()
+    patterns = {p.get("id"): p for p in root.iter(f"{{{SVG_NS}}}pattern")}
+    images = {i.get("id"): i for i in root.iter(f"{{{SVG_NS}}}image")}
+    filters = {f.get("id"): f for f in root.iter(f"{{{SVG_NS}}}filter")}
+
+    card_el = root.find(".//svg:rect[@id='card']", _ns)
+    sprites = []
+    # rects filled with an image pattern, in paint order; a filter on the
+    # parent group is treated as a drop shadow
+    for rect, group in _rects(root):
+        m = re.fullmatch(r"url\(#(.+)\)", rect.get("fill", ""))
+        if not m or m.group(1) not in patterns:
+            continue
+        use = patterns[m.group(1)].find("svg:use", _ns)
+        img = _data_image(images[use.get(XLINK_HREF).lstrip("#")].get(XLINK_HREF))
+        x, y, w, h = _floats(rect, "x", "y", "width", "height")
+        fm = re.fullmatch(r"url\(#(.+)\)", group.get("filter", ""))
+        shadow = _drop_shadow(filters[fm.group(1)]) if fm else None
+        sprites.append(Sprite(rect.get("id", ""), (x, y, w, h),
+                              _fit_pattern(img, w, h, _transform(use.get("transform", ""))), shadow))
+
+    sub = root.find(".//svg:text[@id='subreddit']/svg:tspan", _ns)
+    title_text = root.find(".//svg:text[@id='posttitle']", _ns)
+    title = title_text.find("svg:tspan", _ns)
+    return CardTemplate(
+        width=int(float(root.get("width"))),
+        height=int(float(root.get("height"))),
+        card=(*_floats(card_el, "x", "y", "width", "height"), float(card_el.get("rx", "0"))),
+        card_fill=card_el.get("fill", "white"),
+        sprites=tuple(sprites),
+        sub_pos=tuple(_floats(sub, "x", "y")),
+        title_pos=tuple(_floats(title, "x", "y")),
+        text_fill=title_text.get("fill", "black"),
+    )
+
+
+@lru_cache(maxsize=4)
+def _checkmark(path: str, w: int, h: int) -> Image.Image:
+    with Image.open(path) as img:
+        return img.convert("RGBA").resize((w, h), Image.LANCZOS)
+
+
+def _paste(canvas: Image.Image, sprite: Sprite, x: float, y: float, scale: float) -> None:
+    """Composite a sprite (and its drop shadow) at template position (x, y), scaled."""
+    w, h = round(sprite.box[2] * scale), round(sprite.box[3] * scale)
+    img = sprite.image if sprite.image.size == (w, h) else sprite.image.resize((w, h), Image.LANCZOS)
+    x, y = round(x * scale), round(y * scale)
+    if sprite.shadow:
+        dx, dy, sigma = (v * scale for v in sprite.shadow[:3])
+        opacity = sprite.shadow[3]
+        pad = math.ceil(3 * sigma)
+        alpha = Image.new("L", (w + 2 * pad, h + 2 * pad), 0)
+        alpha.paste(img.getchannel("A"), (pad, pad))
+        shadow = ImageChops.offset(alpha, round(dx), round(dy)).filter(ImageFilter.GaussianBlur(sigma))
+        # feComposite operator="out": no shadow under the shape itself
+        shadow = ImageChops.multiply(shadow, ImageChops.invert(alpha)).point(lambda v: round(v * opacity))
+        layer = Image.new("RGBA", shadow.size, (0, 0, 0, 0))
+        layer.putalpha(shadow)
+        canvas.alpha_composite(layer, (x - pad, y - pad))
+    canvas.alpha_composite(img, (x, y))
+
+
+@lru_cache(maxsize=32)
+def _base_layer(
+    template_svg: str,
+    font_path: str,
+    sub_size: int,
+    padding: int,
+    verified: bool,
+    extra_h: float,
+    scale: float,
+    checkmark_png: str,
+) -> Image.Image:
+    """
+    Everything but the title: card, images, shadow and subreddit line on
+    the (grown) canvas. It only depends on settings and the number of extra
+    title lines, so it is drawn once and copied for each card.
+    """
+    tpl = load_template(template_svg)
+    size = (math.ceil(tpl.width * scale), math.ceil((tpl.height + extra_h) * scale))
+    canvas = Image.new("RGBA", size, "white")
+    draw = ImageDraw.Draw(canvas)
+
+    cx, cy, cw, ch, rx = tpl.card
+    draw.rounded_rectangle(
+        [(cx * scale, cy * scale), ((cx + cw) * scale - 1, (cy + ch + extra_h) * scale - 1)],
+        radius=rx * scale, fill=tpl.card_fill,
+    )
+
+    sx, sy = tpl.sub_pos
+    for sprite in tpl.sprites:
+        x, y, w, h = sprite.box
+        if sprite.id == "checkmark":
+            if verified:
+                check = Sprite(sprite.id, sprite.box, _checkmark(checkmark_png, round(w * scale), round(h * scale)))
+                _paste(canvas, check, sx + text_width(SUBREDDIT_LABEL, font_path, sub_size) + padding, y, scale)
+            continue
+        if sprite.id in ("likes", "shares"):
+            y += extra_h
+        _paste(canvas, sprite, x, y, scale)
+
+    draw.text((sx * scale, sy * scale), SUBREDDIT_LABEL,
+              font=_font(font_path, sub_size * scale), fill=tpl.text_fill, anchor="ls")
+    return canvas
+
+
+def draw_card(
+    title: str,
+    verified: bool = False,
+    template_svg: str | None = None,
+    font_path: str | None = None,
+    sub_font_size: int | None = None,
+    title_font_size: int | None = None,
+    padding_px: int | None = None,
+    checkmark_png: str = CHECKMARK_PNG,
+    scale: float = 1.0,
+) -> Image.Image:
+    """
+    Draw the full template canvas (grown for long titles) as an RGBA image
+    on the white page background Chromium screenshots with, `scale` times
+    the template size. Wrapping is decided at template size, as in the SVG.
+    """
+    template_svg = template_svg or settings.thumbnail_template_svg
+    tpl = load_template(template_svg)
+    font_path = font_path or settings.thumbnail_font_path
+    sub_size = sub_font_size or settings.thumbnail_sub_font_size
+    title_size = title_font_size or settings.thumbnail_title_font_size
+    padding = settings.thumbnail_padding if padding_px is None else padding_px
+
+    extra_h = card_growth(title, title_size)
+    canvas = _base_layer(template_svg, font_path, sub_size, padding, verified,
+                         extra_h, scale, checkmark_png).copy()
+    draw = ImageDraw.Draw(canvas)
+
+    cx, _, cw, _, _ = tpl.card
+    tx, ty = tpl.title_pos
+    font = _font(font_path, title_size * scale)
+    for i, line in enumerate(wrap_title(title, font_path, title_size, cx + cw - tx - padding)):
+        y = ty + i * title_size * LINE_HEIGHT
+        draw.text((tx * scale, y * scale), line, font=font, fill=tpl.text_fill, anchor="ls")
+    return canvas
+
+
+def render_card(
+    title: str,
+    out_png: str,
+    verified: bool = False,
+    template_svg: str | None = None,
+    font_path: str | None = None,
+    sub_font_size: int | None = None,
+    title_font_size: int | None = None,
+    padding_px: int | None = None,
+    crop_x: int = 13, crop_y: int = 0,
+    crop_w: int = 1444, crop_h: int = 820,
+    target_w: int = 1080,
+    corner_radius: int = 50,
+):
+    """
+    Pillow counterpart of generate_svg + svg_to_card_png: same arguments,
+    same output PNG, no browser. The card is drawn directly at target_w
+    rather than rendered at template size and downscaled.
+    """
+    with metrics.span("card.pillow"):
+        s = target_w / crop_w
+        canvas = draw_card(title, verified, template_svg, font_path,
+                           sub_font_size, title_font_size, padding_px, scale=s)
+        # Chromium shows the SVG in a crop_x+crop_w by crop_h viewport with
+        # object-fit:none, i.e. a grown canvas is centred and clipped
+        top = (canvas.height - round(crop_h * s)) // 2
+        finish_card(
+            canvas, out_png,
+            round(crop_x * s), top + round(crop_y * s),
+            target_w, int(crop_h * s),
+            target_w, corner_radius * s,
+        )
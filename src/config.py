@@ -11,6 +11,10 @@ def _load_subreddits() -> list[str]:
 def _str_to_bool(val: str) -> bool:
     return val.strip().lower() in ("1","true","yes","y","on")
 
+def _backend(service: str) -> str:
+    # <SERVICE>_BACKEND, else SERVICE_BACKEND, else "live"
+    return os.getenv(f"{service}_BACKEND", os.getenv("SERVICE_BACKEND","live")).strip().lower()
+
 @dataclass(frozen=True)
 class Settings:
     # Reddit
@@ -18,8 +22,27 @@ class Settings:
     reddit_client_secret: str = os.getenv("REDDIT_CLIENT_SECRET","")
     reddit_user_agent: str = os.getenv("REDDIT_USER_AGENT","")
 
-    # TTS
-    tts_provider: str = os.getenv("TTS_PROVIDER","elevenlabs")
+    # Optional text normalization rules: urls, currencies, numbers, acronyms
+    text_rules: str = os.getenv("TEXT_RULES","")
+
+    # Service backends: "live" talks to Reddit, Google Drive/YouTube and Gemini;
+    # "local" uses the stand-ins in src/local_services.py (no credentials, no network)
+    reddit_backend: str = _backend("REDDIT")
+    drive_backend: str = _backend("DRIVE")
+    youtube_backend: str = _backend("YOUTUBE")
+    llm_backend: str = _backend("LLM")
+    local_reddit_posts: str = os.getenv("LOCAL_REDDIT_POSTS","local/reddit_posts.json")
+    local_post_size: str = os.getenv("LOCAL_POST_SIZE","medium")
+    local_drive_dir: str = os.getenv("LOCAL_DRIVE_DIR","local/drive")
+    local_upload_dir: str = os.getenv("LOCAL_UPLOAD_DIR","local/youtube")
+    local_tts_ms_per_char: int = int(os.getenv("LOCAL_TTS_MS_PER_CHAR","55"))
+    local_tts_noise: float = float(os.getenv("LOCAL_TTS_NOISE","0.1"))
+
+    # TTS ("local" is the synthetic-tone stand-in, the default with SERVICE_BACKEND=local)
+    tts_provider: str = os.getenv("TTS_PROVIDER","local" if _backend("TTS") == "local" else "elevenlabs")
+    # sentences are merged into requests of up to TARGET chars; longer ones are split at MAX
+    tts_chunk_target_chars: int = int(os.getenv("TTS_CHUNK_TARGET_CHARS","250"))
+    tts_chunk_max_chars: int = int(os.getenv("TTS_CHUNK_MAX_CHARS","500"))
     edge_tts_voice_female: str = os.getenv("EDGE_TTS_VOICE_FEMALE","en-US-JennyNeural")
     edge_tts_voice_male: str = os.getenv("EDGE_TTS_VOICE_MALE","en-US-BrianNeural")
     edge_tts_rate: str = os.getenv("EDGE_TTS_RATE","+10%")
@@ -29,14 +52,26 @@ class Settings:
     elevenlabs_prosody_rate:str= os.getenv("ELEVENLABS_PROSODY_RATE","100%")
     elevenlabs_stability: float= float(os.getenv("ELEVENLABS_STABILITY","0.75"))
     elevenlabs_similarity_boost: float = float(os.getenv("ELEVENLABS_SIMILARITY_BOOST","0.85"))
+    # parallel requests; keep at or below the plan's concurrency limit
+    elevenlabs_concurrency: int = int(os.getenv("ELEVENLABS_CONCURRENCY","3"))
+    elevenlabs_max_retries: int = int(os.getenv("ELEVENLABS_MAX_RETRIES","5"))
+    # pcm_<rate> returns raw samples (no MP3 decode); mp3_44100_128 etc. still work
+    elevenlabs_output_format: str = os.getenv("ELEVENLABS_OUTPUT_FORMAT","pcm_24000")
+    # empty = the SDK's default endpoint (point it at scripts/fake_elevenlabs_server.py to test)
+    elevenlabs_base_url: str = os.getenv("ELEVENLABS_BASE_URL","")
+
+    # Whisper alignment (TTS_PROVIDER=whisper): chunks transcribed in parallel
+    whisper_model: str = os.getenv("WHISPER_MODEL","tiny.en")
+    whisper_workers: int = int(os.getenv("WHISPER_WORKERS","2"))
 
     # Subtitles
     template_ass: str = "captions/captions.ass"
-    output_ass: str = "captions/captions_karaoke.ass"
 
-    # Audio
-    audio_mp3: str = "output/combined.mp3"
-    audio_wav: str = "output/combined.wav"
+    # Per-job workspaces (audio, captions, card, output) live in <workspace_dir>/<post_id>/
+    workspace_dir: str = os.getenv("WORKSPACE_DIR","workspaces")
+    # Total for workspaces + clip caches; 0 disables eviction
+    disk_budget_gb: float = float(os.getenv("DISK_BUDGET_GB","0"))
+    disk_protect_minutes: float = float(os.getenv("DISK_PROTECT_MINUTES","60"))
 
     # Fonts/models
     model_dir: str = "model"
@@ -53,14 +88,70 @@ class Settings:
     drive_backgrounds_folder_id: str = os.getenv("DRIVE_BACKGROUNDS_FOLDER_ID","")
     drive_outputs_folder_id:     str = os.getenv("DRIVE_OUTPUTS_FOLDER_ID","")
 
+    # Background clip cache and pre-normalized 1080x1920 mezzanines
+    background_cache_dir: str = os.getenv("BACKGROUND_CACHE_DIR","cache/backgrounds")
+    mezzanine_dir: str = os.getenv("MEZZANINE_DIR","cache/mezzanine")
+    # Clips are fetched as parallel byte ranges; {file_id} is filled in (point it at
+    # scripts/fake_range_server.py to test)
+    drive_download_url: str = os.getenv("DRIVE_DOWNLOAD_URL","https://www.googleapis.com/drive/v3/files/{file_id}?alt=media")
+    drive_download_part_mb: int = int(os.getenv("DRIVE_DOWNLOAD_PART_MB","8"))
+    drive_download_workers: int = int(os.getenv("DRIVE_DOWNLOAD_WORKERS","4"))
+    # Render from a clip that is not cached yet while it downloads (ffmpeg reads it
+    # over loopback HTTP); readahead = ranges fetched past the one being read
+    progressive_background: bool = _str_to_bool(os.getenv("PROGRESSIVE_BACKGROUND","true"))
+    progressive_readahead: int = int(os.getenv("PROGRESSIVE_READAHEAD","2"))
+    mezzanine_on_demand: bool = _str_to_bool(os.getenv("MEZZANINE_ON_DEMAND","false"))
+    mezzanine_fps: int = int(os.getenv("MEZZANINE_FPS","30"))
+    mezzanine_gop_seconds: float = float(os.getenv("MEZZANINE_GOP_SECONDS","1"))
+    mezzanine_crf: int = int(os.getenv("MEZZANINE_CRF","18"))
+    mezzanine_preset: str = os.getenv("MEZZANINE_PRESET","veryfast")
+    # Start each render at a random keyframe of the clip (from its .keyframes.json index)
+    background_random_offset: bool = _str_to_bool(os.getenv("BACKGROUND_RANDOM_OFFSET","true"))
+
+    # FFmpeg supervision: timeout = base + expected output seconds * factor
+    ffmpeg_timeout_base: float = float(os.getenv("FFMPEG_TIMEOUT_BASE","120"))
+    ffmpeg_timeout_factor: float = float(os.getenv("FFMPEG_TIMEOUT_FACTOR","10"))
+    ffmpeg_stall_seconds: float = float(os.getenv("FFMPEG_STALL_SECONDS","90"))
+
+    # Rendering: >1 splits the timeline into that many segments rendered in parallel
+    render_segments: int = int(os.getenv("RENDER_SEGMENTS","1"))
+    # Comma-separated output profiles, all encoded from one decode; the first is the
+    # main video. Names from video_creation.PROFILES or name:WxH[:crf[:preset[:abitrate[:container]]]]
+    output_profiles: str = os.getenv("OUTPUT_PROFILES","short")
+
+    # Google OAuth token store (refreshed tokens are written back here)
+    token_store_path: str = os.getenv("TOKEN_STORE","token.json")
+
+    # Worker daemon (python -m src.worker): jobs are JSON lines appended to
+    # worker_jobs_file, or one JSON file per job dropped into worker_spool_dir
+    worker_jobs_file: str = os.getenv("WORKER_JOBS_FILE","requests.jsonl")
+    worker_spool_dir: str = os.getenv("WORKER_SPOOL_DIR","")
+    worker_state_dir: str = os.getenv("WORKER_STATE_DIR","worker_state")
+    worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY","1"))
+    worker_poll_seconds: float = float(os.getenv("WORKER_POLL_SECONDS","2"))
+
+    # Memory profiling: each stage span records its tracemalloc peak, RSS growth and
+    # child-process RSS (sampled every MEMORY_SAMPLE_MS)
+    memory_profile: bool = _str_to_bool(os.getenv("MEMORY_PROFILE","false"))
+    memory_sample_ms: int = int(os.getenv("MEMORY_SAMPLE_MS","50"))
+    # MB one job may need per stage ("tts=1500,render=900"); the worker runs only as
+    # many jobs as fit in MemAvailable minus MEMORY_RESERVE_MB
+    stage_memory_budgets: str = os.getenv("STAGE_MEMORY_BUDGETS","")
+    memory_reserve_mb: int = int(os.getenv("MEMORY_RESERVE_MB","1024"))
+
+    # Metrics (JSON lines per span; Prometheus textfile is optional)
+    metrics_jsonl: str = os.getenv("METRICS_JSONL","metrics/spans.jsonl")
+    metrics_prom_path: str = os.getenv("METRICS_PROM_PATH","")
+    metrics_window: int = int(os.getenv("METRICS_WINDOW","200"))
+
     # Toggles
     upload_to_drive: bool = _str_to_bool(os.getenv("UPLOAD_DRIVE","true"))
     upload_to_youtube: bool = _str_to_bool(os.getenv("UPLOAD_YT","true"))
 
     # Thumbnail
+    # "pillow" draws the card natively; "playwright" rasterizes the SVG in Chromium (exact fidelity)
+    card_renderer: str = os.getenv("CARD_RENDERER","pillow")
     thumbnail_template_svg: str = "assets/Reddit Thumbnail.svg"
-    thumbnail_populated_svg: str = "output/populated.svg"
-    thumbnail_output_png: str = "output/thumbnail.png"
     thumbnail_font_path: str = "assets/fonts/Inter_18pt-Bold.ttf"
     thumbnail_sub_font_size: int = 56
     thumbnail_title_font_size:int = 68
@@ -69,4 +160,18 @@ class Settings:
     # YouTube tags
     youtube_video_tags: list[str] = field(default_factory=lambda: ["#shorts", "#reddit", "#redditstories"])
 
+    # YouTube resumable uploads
+    youtube_upload_url: str = os.getenv("YOUTUBE_UPLOAD_URL","https://www.googleapis.com/upload/youtube/v3/videos")
+    youtube_upload_chunk_mb: int = int(os.getenv("YOUTUBE_UPLOAD_CHUNK_MB","8"))
+    upload_state_dir: str = os.getenv("UPLOAD_STATE_DIR","upload_state")
+
+    # YouTube Data API quota: units per project per Pacific-time day
+    youtube_quota_project: str = os.getenv("YOUTUBE_QUOTA_PROJECT","default")
+    youtube_daily_quota: int = int(os.getenv("YOUTUBE_DAILY_QUOTA","10000"))
+    youtube_quota_reserve: int = int(os.getenv("YOUTUBE_QUOTA_RESERVE","0"))
+    youtube_quota_ledger: str = os.getenv("YOUTUBE_QUOTA_LEDGER","upload_state/quota/ledger.json")
+    youtube_upload_queue_dir: str = os.getenv("YOUTUBE_UPLOAD_QUEUE_DIR","upload_state/queue")
+    # "wait": hold new renders while today's quota is spoken for; "queue": render anyway and queue the uploads
+    youtube_over_quota: str = os.getenv("YOUTUBE_OVER_QUOTA","wait")
+
 settings = Settings()
@@ -1,9 +1,8 @@
-import os, json
-from googleapiclient.discovery import build
+import os
 from googleapiclient.http import MediaFileUpload
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 from .config import settings
+from .google_services import get_service
+from . import metrics
 
 DRIVE_SCOPES = [
     'https://www.googleapis.com/auth/drive.file',
@@ -12,19 +11,8 @@ DRIVE_SCOPES = [
 ]
 
 def get_drive_service():
-    token_json = os.getenv('TOKEN_JSON')
-    if not token_json:
-        raise RuntimeError("TOKEN_JSON not set in env")
-    info = json.loads(token_json)
-    creds = Credentials.from_authorized_user_info(info, DRIVE_SCOPES)
-
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-
-    if not creds or not creds.valid:
-        raise RuntimeError("Drive credentials invalid—please refresh TOKEN_JSON")
-
-    return build('drive','v3', credentials=creds)
+    # cached per process; see google_services
+    return get_service('drive', 'v3', DRIVE_SCOPES)
 
 def upload_to_drive(local_path: str) -> str:
     service = get_drive_service()
@@ -38,8 +26,9 @@ def upload_to_drive(local_path: str) -> str:
         fields="id"
     )
     resp = None
-    while resp is None:
-        status, resp = req.next_chunk()
-        if status:
-            print(f"  → Drive upload {int(status.progress()*100)}%")
+    with metrics.span("api.drive.upload", bytes=os.path.getsize(local_path)):
+        while resp is None:
+            status, resp = req.next_chunk()
+            if status:
+                print(f"  → Drive upload {int(status.progress()*100)}%")
     return resp["id"]
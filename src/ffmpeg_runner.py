@@ -0,0 +1,159 @@
+import collections
+import os
+import subprocess
+import threading
+import time
+from .config import settings
+from . import metrics
+
+# Every ffmpeg invocation goes through run_ffmpeg(): it adds `-progress pipe:1`,
+# turns the key=value blocks into progress events (fps, speed, ETA), and kills
+# the process when it exceeds a timeout derived from the expected output
+# duration, stops advancing (stall), or is cancelled by the caller.
+
+
+class FFmpegError(RuntimeError):
+    def __init__(self, label: str, reason: str, returncode: int | None, stderr_tail: str):
+        super().__init__(f"ffmpeg {label} {reason} (exit {returncode}):\n{stderr_tail}")
+        self.label = label
+        self.reason = reason
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+
+
+def _print_progress(ev: dict) -> None:
+    pct = f"{ev['percent']:5.1f}%" if ev.get("percent") is not None else f"{ev['out_time_s']:.1f}s"
+    eta = f" eta {ev['eta_s']:.0f}s" if ev.get("eta_s") is not None else ""
+    print(f"    [{ev['label']}] {pct} {ev['fps']:.1f} fps {ev['speed']:.2f}x{eta}")
+
+
+def _num(val: str | None) -> float:
+    # ffmpeg reports "N/A" until it has produced output
+    try:
+        return float((val or "0").rstrip("x"))
+    except ValueError:
+        return 0.0
+
+
+def run_ffmpeg(
+    cmd: list[str],
+    label: str,
+    expected_s: float | None = None,
+    on_progress=None,
+    cancel: threading.Event | None = None,
+    timeout_s: float | None = None,
+    print_every_s: float = 5.0,
+) -> dict:
+    """
+    Run an ffmpeg command (cmd[0] == "ffmpeg") and return final stats
+    {"wall_s", "fps", "speed", "out_time_s"}. Raises FFmpegError on a
+    non-zero exit, timeout, stall or cancellation; the child is killed first.
+    `on_progress(event)` receives every progress block; without one, a line
+    is printed every `print_every_s` seconds.
+    """
+    if timeout_s is None and expected_s is not None:
+        timeout_s = settings.ffmpeg_timeout_base + expected_s * settings.ffmpeg_timeout_factor
+    stall_s = settings.ffmpeg_stall_seconds
+
+    full = [cmd[0], "-nostats", "-progress", "pipe:1", *cmd[1:]]
+    proc = subprocess.Popen(
+        full, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, bufsize=1
+    )
+
+    stderr_tail: collections.deque[str] = collections.deque(maxlen=40)
+    state = {"out_time_s": 0.0, "fps": 0.0, "speed": 0.0, "advanced_at": time.monotonic()}
+    lock = threading.Lock()
+    t0 = time.monotonic()
+    last_print = [0.0]
+
+    def read_stderr():
+        for line in proc.stderr:
+            stderr_tail.append(line.rstrip())
+
+    def read_progress():
+        block = {}
+        for line in proc.stdout:
+            key, _, val = line.strip().partition("=")
+            block[key] = val
+            if key != "progress":
+                continue
+            out_us = block.get("out_time_us") or block.get("out_time_ms") or ""
+            with lock:
+                # fields missing or "N/A" in a block keep their previous value
+                out_s = max(0.0, int(out_us) / 1e6) if out_us.lstrip("-").isdigit() else state["out_time_s"]
+                if out_s > state["out_time_s"]:
+                    state["advanced_at"] = time.monotonic()
+                state["out_time_s"] = out_s
+                state["fps"] = _num(block.get("fps")) or state["fps"]
+                state["speed"] = _num(block.get("speed")) or state["speed"]
+                ev = {
+                    "label":      label,
+                    "out_time_s": out_s,
+                    "fps":        state["fps"],
+                    "speed":      state["speed"],
+                    "frame":      int(_num(block.get("frame"))),
+                    "percent":    None,
+                    "eta_s":      None,
+                    "done":       val == "end",
+                }
+            if expected_s:
+                ev["percent"] = min(100.0, 100.0 * out_s / expected_s)
+                if ev["speed"] > 0:
+                    ev["eta_s"] = max(0.0, (expected_s - out_s) / ev["speed"])
+            if on_progress:
+                on_progress(ev)
+            elif time.monotonic() - last_print[0] >= print_every_s or ev["done"]:
+                last_print[0] = time.monotonic()
+                _print_progress(ev)
+            block = {}
+
+    readers = [threading.Thread(target=read_stderr, daemon=True),
+               threading.Thread(target=read_progress, daemon=True)]
+    for t in readers:
+        t.start()
+
+    reason = None
+    with metrics.span("ffmpeg", step=label, expected_s=expected_s) as rec:
+        try:
+            while proc.poll() is None:
+                time.sleep(0.25)
+                now = time.monotonic()
+                with lock:
+                    idle = now - state["advanced_at"]
+                if cancel is not None and cancel.is_set():
+                    reason = "cancelled"
+                elif timeout_s and now - t0 > timeout_s:
+                    reason = f"timed out after {timeout_s:.0f}s"
+                elif stall_s and idle > stall_s:
+                    reason = f"stalled (no progress for {idle:.0f}s)"
+                if reason:
+                    proc.kill()
+                    break
+        finally:
+            # also reached on KeyboardInterrupt: never leave an orphaned encoder
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            for t in readers:
+                t.join(timeout=2)
+
+        stats = {
+            "wall_s":     round(time.monotonic() - t0, 3),
+            "fps":        state["fps"],
+            "speed":      state["speed"],
+            "out_time_s": state["out_time_s"],
+        }
+        rec.update(stats)
+        output = cmd[-1]
+        if reason is None and proc.returncode == 0 and os.path.isfile(output):
+            rec["bytes"] = os.path.getsize(output)
+
+        if reason is None and proc.returncode != 0:
+            reason = "failed"
+        if reason:
+            tail = "\n".join(stderr_tail)
+            print(f"[!] ffmpeg {label} {reason}")
+            raise FFmpegError(label, reason, proc.returncode, tail)
+
+    return stats
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from .config import settings
+
+# One credentials object, API client and HTTP session per process. Every
+# module (Drive listing, downloads, uploads, YouTube) goes through here so a
+# run refreshes the token at most once and parses each discovery doc once.
+_lock = threading.Lock()
+_creds: Credentials | None = None
+_services: dict[tuple[str, str], object] = {}
+_session = None
+
+
+def _load_token_info() -> dict | None:
+    """
+    Prefer the local token store (kept fresh by this module) and fall back
+    to TOKEN_JSON from the environment for first runs and CI.
+    """
+    path = settings.token_store_path
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    token_json = os.getenv("TOKEN_JSON")
+    if token_json:
+        return json.loads(token_json)
+    return None
+
+
+def _save_token(creds: Credentials) -> None:
+    path = settings.token_store_path
+    if not path:
+        return
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(creds.to_json())
+    os.replace(tmp, path)
+
+
+def get_credentials(scopes: list[str] | None = None, interactive: bool = False) -> Credentials:
+    """
+    Return the process-wide OAuth credentials, refreshing them if expired
+    and writing the refreshed token back to the token store.
+    With `interactive`, fall back to the console consent flow via CREDS_JSON.
+    """
+    global _creds
+    with _lock:
+        creds = _creds
+        if creds is None:
+            info = _load_token_info()
+            if info:
+                # keep the scopes the token was granted with so one object serves Drive and YouTube
+                creds = Credentials.from_authorized_user_info(info)
+
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+            _save_token(creds)
+
+        if not creds or not creds.valid:
+            if not interactive:
+                raise RuntimeError("Google credentials invalid—please refresh TOKEN_JSON")
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            creds_json = os.getenv("CREDS_JSON")
+            if not creds_json:
+                raise RuntimeError("CREDS_JSON not set in .env")
+            flow = InstalledAppFlow.from_client_config(json.loads(creds_json), scopes)
+            creds = flow.run_console()
+            _save_token(creds)
+
+        _creds = creds
+        return creds
+
+
+def get_service(api: str, version: str, scopes: list[str] | None = None, interactive: bool = False):
+    """
+    Cached googleapiclient resource built from the discovery documents that
+    ship with google-api-python-client, so no discovery fetch happens.
+    Resources share one httplib2 connection and are not thread-safe; use
+    get_authorized_session() from worker threads.
+    """
+    creds = get_credentials(scopes, interactive)
+    key = (api, version)
+    with _lock:
+        svc = _services.get(key)
+        if svc is None:
+            svc = build(api, version, credentials=creds, static_discovery=True, cache_discovery=False)
+            _services[key] = svc
+        return svc
+
+
+def get_authorized_session(scopes: list[str] | None = None, interactive: bool = False):
+    """
+    Cached requests session carrying the same credentials; safe to share
+    across threads and used for raw upload/download protocols.
+    """
+    global _session
+    creds = get_credentials(scopes, interactive)
+    with _lock:
+        if _session is None:
+            _session = AuthorizedSession(creds)
+        return _session
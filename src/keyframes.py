@@ -0,0 +1,123 @@
+import bisect
+import json
+import os
+import random
+import subprocess
+import threading
+from dataclasses import dataclass
+from .config import settings
+from . import metrics
+
+# Input seeking (-ss before -i) jumps to the keyframe at or before the
+# requested time and then decodes every frame up to it, so a start that
+# lands just before the next keyframe of a long-GOP clip costs a whole GOP
+# of decoding before the first output frame. Each cached clip therefore
+# gets a keyframe index, read once from ffprobe's packet flags and kept in
+# a "<clip>.keyframes.json" sidecar, and render offsets are picked from it.
+
+KEYFRAMES_SUFFIX = ".keyframes.json"
+
+_lock = threading.Lock()
+_memo: dict[str, tuple[tuple, "KeyframeIndex"]] = {}
+
+
+@dataclass(frozen=True)
+class KeyframeIndex:
+    duration: float
+    times: tuple[float, ...]  # keyframe timestamps in seconds from the clip start, ascending
+
+    def floor(self, t: float) -> float:
+        """The last keyframe at or before t (the first keyframe if none)."""
+        i = bisect.bisect_right(self.times, t)
+        return self.times[max(0, i - 1)] if self.times else 0.0
+
+    def nearest(self, t: float) -> float:
+        """The keyframe closest to t."""
+        if not self.times:
+            return 0.0
+        i = bisect.bisect_left(self.times, t)
+        return min(self.times[max(0, i - 1):i + 1], key=lambda k: abs(k - t))
+
+    def random_start(self, needed_s: float) -> float:
+        """
+        A random keyframe from which needed_s seconds play without looping,
+        or the first keyframe if the clip is shorter than that.
+        """
+        last = bisect.bisect_right(self.times, self.duration - needed_s)
+        return random.choice(self.times[:last]) if last else self.floor(0.0)
+
+
+def sidecar_path(clip: str) -> str:
+    return clip + KEYFRAMES_SUFFIX
+
+
+def _stamp(clip: str) -> tuple:
+    st = os.stat(clip)
+    return st.st_size, st.st_mtime_ns
+
+
+def probe_keyframes(clip: str) -> KeyframeIndex:
+    """
+    Keyframe times of the first video stream, from packet flags (the
+    container is only demuxed, nothing is decoded). Times are relative to
+    the format start time, i.e. the values -ss takes.
+    """
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "packet=pts_time,dts_time,flags:format=start_time,duration",
+         "-of", "json", clip],
+        capture_output=True, text=True, check=True,
+        timeout=settings.ffmpeg_timeout_base
+    ).stdout
+    info = json.loads(out)
+    fmt = info.get("format", {})
+    start = float(fmt.get("start_time") or 0.0)
+    times = set()
+    for pkt in info.get("packets", []):
+        ts = pkt.get("pts_time", pkt.get("dts_time"))
+        if "K" in pkt.get("flags", "") and ts not in (None, "N/A"):
+            times.add(round(max(0.0, float(ts) - start), 6))
+    return KeyframeIndex(float(fmt.get("duration") or 0.0), tuple(sorted(times)))
+
+
+def _read_sidecar(clip: str, stamp: tuple) -> KeyframeIndex | None:
+    try:
+        with open(sidecar_path(clip), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if [data.get("size"), data.get("mtime_ns")] != list(stamp):
+        return None  # clip replaced or rebuilt since it was indexed
+    return KeyframeIndex(data["duration"], tuple(data["keyframes"]))
+
+
+def _write_sidecar(clip: str, stamp: tuple, index: KeyframeIndex) -> None:
+    path = sidecar_path(clip)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"size": stamp[0], "mtime_ns": stamp[1],
+                   "duration": index.duration, "keyframes": list(index.times)}, f)
+    os.replace(tmp, path)
+
+
+def keyframe_index(clip: str) -> KeyframeIndex:
+    """
+    The clip's keyframe index: from memory, else from its sidecar if that
+    still matches the clip's size and mtime, else probed and persisted.
+    """
+    key = os.path.abspath(clip)
+    stamp = _stamp(clip)
+    with _lock:
+        hit = _memo.get(key)
+    if hit and hit[0] == stamp:
+        return hit[1]
+
+    index = _read_sidecar(clip, stamp)
+    if index is None:
+        with metrics.span("media.keyframe_index", clip=os.path.basename(clip)) as rec:
+            index = probe_keyframes(clip)
+            rec["keyframes"] = len(index.times)
+        _write_sidecar(clip, stamp, index)
+    with _lock:
+        _memo[key] = (stamp, index)
+    return index
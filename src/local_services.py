@@ -0,0 +1,271 @@
+import array
+import json
+import math
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from functools import lru_cache
+from types import SimpleNamespace
+from .config import settings
+from .ffmpeg_runner import run_ffmpeg
+
+# Local stand-ins for every external service, selected with SERVICE_BACKEND=local
+# (or REDDIT_/DRIVE_/YOUTUBE_/LLM_BACKEND=local, TTS_PROVIDER=local; see
+# src/providers.py). Nothing here needs credentials or touches the network,
+# so the whole pipeline runs hermetically at full speed on a build box:
+#
+#   reddit   posts from LOCAL_REDDIT_POSTS (a JSON list), or an endless
+#            listing of deterministic synthetic posts when that file is missing
+#   drive    backgrounds from <LOCAL_DRIVE_DIR>/backgrounds (a synthetic clip
+#            is generated if it is empty), uploads into <LOCAL_DRIVE_DIR>/outputs
+#   youtube  uploads into LOCAL_UPLOAD_DIR as <id>.mp4 + <id>.json
+#   llm      keyword rules answering the prompts ai_utils sends
+#   tts      sine tone plus noise per chunk, with evenly spaced word timings
+
+WORDS = (
+    "so my roommate decided that the kitchen was his personal science lab and "
+    "honestly I should have seen it coming because last week he microwaved a "
+    "whole egg and acted surprised when it exploded everywhere anyway yesterday "
+    "I came home to find the smoke alarm going off and the landlord standing "
+    "in the hallway with a very confused look on her face"
+).split()
+
+# sentences per synthetic post
+POST_SIZES = {"small": 6, "medium": 40, "huge": 300}
+
+VIDEO_EXTS = (".mp4", ".mkv", ".mov")
+
+
+# ---- Reddit ----
+
+def make_post(size: str, seed: int = 0, subreddit: str = "tifu") -> SimpleNamespace:
+    """
+    Deterministic praw-Submission lookalike with `POST_SIZES[size]` sentences
+    and a sprinkling of markdown, abbreviations and emojis.
+    """
+    rng = random.Random(f"{size}-{seed}")
+    extras = ["TIFU", "IMO", "**really**", "[link](https://example.com)", "`code`", "BTW", "&amp;", "\U0001F602"]
+    sentences = []
+    for _ in range(POST_SIZES[size]):
+        words = rng.choices(WORDS, k=rng.randint(4, 24))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(extras))
+        sentences.append(" ".join(words).capitalize() + rng.choice([".", "!", "?"]))
+    body = ""
+    for i, s in enumerate(sentences):
+        body += s + ("\n\n" if i % 5 == 4 else " ")
+    return _submission({
+        "id":       f"{size}{seed}",
+        "title":    f"TIFU by benchmarking a {size} post",
+        "selftext": body.strip(),
+        "subreddit": subreddit,
+    })
+
+
+def _submission(post: dict) -> SimpleNamespace:
+    """A praw-like Submission from a dict with at least id, title and selftext."""
+    sub = post.get("subreddit") or "local"
+    return SimpleNamespace(
+        id=post["id"],
+        title=post["title"],
+        selftext=post.get("selftext", ""),
+        subreddit=SimpleNamespace(display_name=sub),
+        permalink=post.get("permalink") or f"/r/{sub}/comments/{post['id']}/",
+        author=post.get("author", "local"),
+        distinguished=post.get("distinguished"),
+        num_comments=post.get("num_comments", 999),
+        over_18=post.get("over_18", False),
+    )
+
+
+class LocalReddit:
+    """
+    Minimal praw.Reddit over a list of post dicts: subreddit(name).hot()
+    and submission(id=/url=). With no posts, every subreddit lists
+    synthetic posts of `size` without end.
+    """
+
+    def __init__(self, posts: list[dict] | None = None, size: str = "medium"):
+        self.posts = [_submission(p) for p in posts or []]
+        self.size = size
+
+    def _hot(self, name: str):
+        if self.posts:
+            return (p for p in self.posts if p.subreddit.display_name.lower() == name.lower())
+        return (make_post(self.size, seed, name) for seed in range(10 ** 9))
+
+    def subreddit(self, name: str):
+        return SimpleNamespace(hot=lambda limit=None: self._hot(name))
+
+    def submission(self, id: str | None = None, url: str | None = None):
+        if id is None:
+            m = re.search(r"/comments/([^/]+)", url or "")
+            if not m:
+                raise ValueError(f"Not a Reddit post URL: {url!r}")
+            id = m.group(1)
+        for p in self.posts:
+            if p.id == id:
+                return p
+        m = re.fullmatch(r"(small|medium|huge)(\d+)", id)
+        if not m:
+            raise LookupError(f"No local post {id!r}")
+        return make_post(m.group(1), int(m.group(2)))
+
+
+@lru_cache(maxsize=1)
+def init_local_reddit() -> LocalReddit:
+    path = settings.local_reddit_posts
+    posts = None
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            posts = json.load(f)
+    return LocalReddit(posts, size=settings.local_post_size)
+
+
+# ---- LLM ----
+
+_MALE = re.compile(r"\bmy (wife|girlfriend)\b|\(\d\d ?m\)|\b\d\dm\b|\bi'?m a (guy|man|dad)\b", re.I)
+_MOODS = {
+    "happy":   ("happy", "funny", "laugh", "love", "best", "excited", "surprise"),
+    "sad":     ("sad", "cried", "died", "lost", "miss", "funeral", "sorry"),
+    "tense":   ("angry", "yelled", "fight", "police", "alarm", "scared", "exploded", "smoke"),
+    "relaxed": ("calm", "chill", "quiet", "vacation", "relaxed", "peaceful"),
+}
+_STOP = set("the a an and or but so to of in on at for with was were is it i my me he she they that this".split())
+
+
+def rule_based_llm(prompt: str) -> str:
+    """Keyword rules standing in for Gemini on the prompts ai_utils sends."""
+    text = prompt.split("Text:", 1)[-1]
+    if "male or female" in prompt:
+        if _MALE.search(text):
+            return "male"
+        return "female"
+    if "Classify the mood" in prompt:
+        words = Counter(re.findall(r"[a-z']+", text.lower()))
+        scores = {mood: sum(words[w] for w in keys) for mood, keys in _MOODS.items()}
+        best = max(scores, key=scores.get)
+        return best if scores[best] else "neutral"
+    if "hashtags" in prompt:
+        words = Counter(w for w in re.findall(r"[a-z]{4,}", prompt.lower()) if w not in _STOP)
+        return " ".join(f"#{w}" for w, _ in words.most_common(4))
+    return ""
+
+
+# ---- TTS ----
+
+@lru_cache(maxsize=64)
+def _tone_second(freq: float, rate: int, noise: float) -> bytes:
+    rng = random.Random(freq)
+    return array.array("h", (
+        int(6000 * math.sin(2 * math.pi * freq * i / rate) + 6000 * noise * rng.uniform(-1, 1))
+        for i in range(rate)
+    )).tobytes()
+
+
+def write_tone(path: str, duration_ms: int, freq: float, rate: int = 24000, noise: float = 0.0) -> None:
+    """Mono 16-bit WAV of a sine at `freq`, with `noise` (0-1) of white noise mixed in."""
+    n = int(rate * duration_ms / 1000)
+    # one second is built once and repeated; per-sample packing is too slow for huge posts
+    block = _tone_second(freq, rate, noise)
+    frames = (block * (n // rate + 1))[: n * 2]
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(frames)
+
+
+def synthesize_tones(chunks: list, out_dir: str, voice: str, ms_per_char: int | None = None):
+    """
+    TTS stand-in: one tone WAV per chunk, length proportional to the text,
+    plus evenly spaced word timings in the ElevenLabs format.
+    """
+    ms_per_char = ms_per_char or settings.local_tts_ms_per_char
+    os.makedirs(out_dir, exist_ok=True)
+    wav_infos, all_words, offset = [], [], 0
+    for cid, chunk in enumerate(chunks):
+        text = chunk.text
+        dur = max(300, len(text) * ms_per_char)
+        path = os.path.join(out_dir, f"{cid:03d}.wav")
+        write_tone(path, dur, 220 + 40 * (cid % 8), noise=settings.local_tts_noise)
+        words = [(m.start(), m.group()) for m in re.finditer(r"\S+", text)]
+        step = dur / max(1, len(words))
+        for i, (pos, w) in enumerate(words):
+            all_words.append({
+                "word": w,
+                "start": offset + i * step,
+                "end": offset + (i + 1) * step,
+                "sid": chunk.sid_at(pos),
+            })
+        wav_infos.append((path, dur))
+        offset += dur
+    return wav_infos, all_words
+
+
+# ---- Drive ----
+
+_clip_lock = threading.Lock()
+
+
+def ensure_background_clip(path: str, seconds: int = 60) -> str:
+    """Generate a synthetic 16:9 test clip once so the local Drive has something to serve."""
+    with _clip_lock:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = path + ".tmp.mp4"
+            run_ffmpeg([
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={seconds}",
+                "-c:v", "libx264", "-preset", "veryfast", "-g", "250", tmp,
+            ], "local_background_clip", expected_s=seconds)
+            os.replace(tmp, path)
+    return path
+
+
+def choose_local_background(progressive: bool = False) -> str:
+    """A random clip from <local_drive_dir>/backgrounds (always a local path)."""
+    clips_dir = os.path.join(settings.local_drive_dir, "backgrounds")
+    os.makedirs(clips_dir, exist_ok=True)
+    clips = sorted(f for f in os.listdir(clips_dir) if f.lower().endswith(VIDEO_EXTS))
+    if not clips:
+        return ensure_background_clip(os.path.join(clips_dir, "background.mp4"))
+    return os.path.join(clips_dir, random.choice(clips))
+
+
+def _place(src: str, dest: str) -> None:
+    # a hard link costs nothing; the workspace copy is deleted after upload
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def upload_to_local_drive(local_path: str) -> str:
+    out_dir = os.path.join(settings.local_drive_dir, "outputs")
+    os.makedirs(out_dir, exist_ok=True)
+    file_id = uuid.uuid4().hex[:12]
+    _place(local_path, os.path.join(out_dir, f"{file_id}_{os.path.basename(local_path)}"))
+    return file_id
+
+
+# ---- YouTube ----
+
+def upload_to_sink(file_path: str, title: str, description: str, thumbnail_path: str | None = None) -> str:
+    """Upload sink writing the video and its metadata to local_upload_dir."""
+    out_dir = settings.local_upload_dir
+    os.makedirs(out_dir, exist_ok=True)
+    vid = uuid.uuid4().hex[:11]
+    _place(file_path, os.path.join(out_dir, f"{vid}.mp4"))
+    if thumbnail_path:
+        shutil.copyfile(thumbnail_path, os.path.join(out_dir, f"{vid}.png"))
+    with open(os.path.join(out_dir, f"{vid}.json"), "w", encoding="utf-8") as f:
+        json.dump({"title": title, "description": description,
+                   "size": os.path.getsize(file_path), "uploaded": time.time()}, f, indent=2)
+    return vid
@@ -1,42 +1,83 @@
+import contextvars
 import os
-from pathlib import Path
-import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
-from .reddit_client import init_reddit
 from .post_finder import find_next_post
-from .text_processing import translate_phrases, clean_markdown, split_sentences
-from .audio import combine_wavs, cleanup as audio_cleanup
+from .text_processing import Chunk, normalize_text, split_sentences, plan_chunks
+from .audio import combine_wavs
 from .ass_builder import write_karaoke_ass
 from .thumbnail_card_generator import generate_svg
 from .svg_raster import svg_to_card_png
+from .card_renderer import render_card as draw_card_png
 from .video_creation import burn_and_mux
-from .tts_elevenlabs import synthesize_with_elevenlabs
-from .tts_whisper import synthesize_with_whisper
-from .tts_edge import synthesize_sentences as synthesize_with_edge
+from .youtube_thumbnail import build_thumbnail
 from .ai_utils import detect_mood, detect_gender, select_sound_for_mood
-from .youtube_uploader import upload_to_youtube
+from .providers import get_background_source, get_reddit, get_tts, get_uploader
+from .ranged_download import DownloadError
+from .resumable_upload import ResumableUploadError
+from .workspace import Workspace, DiskBudget
 from .config import settings
-from googleapiclient.errors import HttpError
+from . import memory, metrics
 
 load_dotenv()
 
-def main():
-    # 1) Fetch next Reddit post
-    reddit     = init_reddit()
-    submission = find_next_post(reddit)
+# Work that overlaps a stage (the YouTube thumbnail while the video renders)
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="background")
+
+
+@dataclass
+class Job:
+    """
+    State handed from one pipeline stage to the next.
+    """
+    submission: object = None
+    ws: Workspace | None = None
+    raw_post: str = ""
+    sentences: list[str] = field(default_factory=list)
+    chunks: list[Chunk] = field(default_factory=list)
+    edge_voice: str = ""
+    wav_infos: list[tuple[str, int]] = field(default_factory=list)
+    all_words: list[dict] = field(default_factory=list)
+    card_png: str = ""
+    bg_music: str | None = None
+    drive_id: str | None = None
+    final_video: str = ""
+    variants: dict[str, str] = field(default_factory=dict)
+    thumb_frame: str = ""
+    thumb_future: Future | None = None
+    yt_pending: bool = False
+
+
+def fetch_post(job: Job) -> None:
+    # 1) Fetch next Reddit post (unless the caller, e.g. src.worker, picked one)
+    submission = job.submission or find_next_post(get_reddit())
     post_id    = submission.id
     print(f"[+] r/{submission.subreddit.display_name} • {post_id}")
     print(f"    Title: {submission.title!r}")
     print(f"    URL:   https://reddit.com{submission.permalink}\n")
+    metrics.set_context(post_id=post_id)
+    job.submission = submission
+
+    # Everything this job writes goes under workspaces/<post_id>/
+    job.ws = Workspace.for_post(post_id)
+    DiskBudget().enforce()
 
-    # 2) Prepare text and split into sentences
-    raw_post  = submission.title + "\n\n" + submission.selftext
-    text      = clean_markdown(translate_phrases(raw_post))
-    sentences = split_sentences(text)
 
+def prepare_text(job: Job) -> None:
+    # 2) Prepare text, split into sentences and group them into TTS chunks
+    submission    = job.submission
+    job.raw_post  = submission.title + "\n\n" + submission.selftext
+    text          = normalize_text(job.raw_post)
+    job.sentences = split_sentences(text)
+    job.chunks    = plan_chunks(job.sentences)
+    print(f"[*] {len(job.sentences)} sentences → {len(job.chunks)} TTS requests")
+
+
+def choose_voice(job: Job) -> None:
     # 3) Detect author gender and choose Edge voice
-    author_gender = detect_gender(raw_post)
+    author_gender = detect_gender(job.raw_post)
     if author_gender == 'male':
         edge_voice = settings.edge_tts_voice_male
     elif author_gender == 'female':
@@ -44,129 +85,260 @@ def main():
     else:
         edge_voice = settings.edge_tts_voice_female  # fallback
     print(f"[*] Detected gender: {author_gender}, using Edge voice: {edge_voice}")
+    job.edge_voice = edge_voice
+
+
+def synthesize_audio(job: Job) -> None:
+    # 4) Synthesize per-chunk audio and collect word timings if available
+    synthesize = get_tts(settings.tts_provider)
+    job.wav_infos, job.all_words = synthesize(job.chunks, job.ws.chunks_dir, job.edge_voice)
 
-    # 4) Synthesize per-sentence audio and collect word timings if available
-    provider = settings.tts_provider.lower()
-    if provider == "elevenlabs":
-        wav_infos, all_words = synthesize_with_elevenlabs(sentences, out_dir="audio_chunks")
-    elif provider == "whisper":
-        # pass voice to whisper synth function
-        wav_infos, all_words = synthesize_with_whisper(
-            sentences,
-            out_dir="audio_chunks",
-            voice=edge_voice
-        )
-    else:
-        # Edge TTS: returns list of (wav_path, duration_ms), no timings
-        wav_infos = synthesize_with_edge(sentences, out_dir="audio_chunks", voice=edge_voice)
-        all_words  = []
 
+def build_audio_and_subtitles(job: Job) -> None:
     # 5) Combine all chunks into final MP3 and WAV, then write .ass subtitles
-    combine_wavs(wav_infos, settings.audio_mp3, settings.audio_wav)
-    write_karaoke_ass(all_words)
-
-    # 6) Generate and rasterize the thumbnail card
-    tpl_svg = settings.thumbnail_template_svg
-    pop_svg = settings.thumbnail_populated_svg
-    generate_svg(
-        template_svg    = tpl_svg,
-        output_svg      = pop_svg,
-        subreddit       = submission.subreddit.display_name,
-        title           = submission.title,
-        verified        = False,
-        font_path       = settings.thumbnail_font_path,
-        sub_font_size   = settings.thumbnail_sub_font_size,
-        title_font_size = settings.thumbnail_title_font_size,
-        padding_px      = settings.thumbnail_padding,
-    )
-    print(f"[+] Populated SVG → {pop_svg}")
-
-    card_png = settings.thumbnail_output_png
-    svg_to_card_png(
-        svg_path      = pop_svg,
-        out_png       = card_png,
-        crop_x        = 13,
-        crop_y        = 0,
-        crop_w        = 1444,
-        crop_h        = 820,
-        target_w      = 1080,
-        corner_radius = 50
-    )
+    combine_wavs(job.wav_infos, job.ws.audio_mp3, job.ws.audio_wav)
+    write_karaoke_ass(job.all_words, job.ws.ass)
+
+
+def render_card(job: Job) -> None:
+    # 6) Draw the thumbnail card (Pillow), or generate the SVG and rasterize it in Chromium
+    submission = job.submission
+    tpl_svg  = settings.thumbnail_template_svg
+    card_png = job.ws.card_png
+    if settings.card_renderer == "playwright":
+        pop_svg = job.ws.svg
+        generate_svg(
+            template_svg    = tpl_svg,
+            output_svg      = pop_svg,
+            subreddit       = submission.subreddit.display_name,
+            title           = submission.title,
+            verified        = False,
+            font_path       = settings.thumbnail_font_path,
+            sub_font_size   = settings.thumbnail_sub_font_size,
+            title_font_size = settings.thumbnail_title_font_size,
+            padding_px      = settings.thumbnail_padding,
+        )
+        print(f"[+] Populated SVG → {pop_svg}")
+
+        svg_to_card_png(
+            svg_path      = pop_svg,
+            out_png       = card_png,
+            crop_x        = 13,
+            crop_y        = 0,
+            crop_w        = 1444,
+            crop_h        = 820,
+            target_w      = 1080,
+            corner_radius = 50,
+            tmp_dir       = job.ws.tmp_dir
+        )
+    else:
+        draw_card_png(
+            title           = submission.title,
+            out_png         = card_png,
+            verified        = False,
+            template_svg    = tpl_svg,
+            font_path       = settings.thumbnail_font_path,
+            sub_font_size   = settings.thumbnail_sub_font_size,
+            title_font_size = settings.thumbnail_title_font_size,
+            padding_px      = settings.thumbnail_padding,
+            crop_x          = 13,
+            crop_y          = 0,
+            crop_w          = 1444,
+            crop_h          = 820,
+            target_w        = 1080,
+            corner_radius   = 50
+        )
     print(f"[+] Card PNG → {card_png}")
+    job.card_png = card_png
 
-    # 7) Compute first-sentence duration for overlay timing
-    _, first_ms = wav_infos[0]
-    first_dur   = first_ms / 1000.0
 
+def pick_music(job: Job) -> None:
     # 8) Mood detection → pick background music track
-    mood     = detect_mood(raw_post)
+    mood     = detect_mood(job.raw_post)
     bg_music = select_sound_for_mood(mood)
     if bg_music:
         print(f"[*] Mood-detected '{mood}', using music: {bg_music}")
     else:
         print(f"[*] Mood-detected '{mood}', but no tracks found; proceeding without music.")
+    job.bg_music = bg_music
+
 
-    # 9) Burn subtitles, overlay card, mix in music, and output video
-    drive_id, final_video = burn_and_mux(
-        card_png   = card_png,
-        ass_path   = settings.output_ass,
-        first_dur  = first_dur,
-        bg_music   = bg_music
+def render_video(job: Job) -> None:
+    # 7) Compute first-sentence duration for overlay timing (chunk 0 is the title alone)
+    _, first_ms = job.wav_infos[0]
+    first_dur   = first_ms / 1000.0
+
+    # Pick the background clip up front: the thumbnail needs only it and the
+    # card, so it is composed while the video renders. A clip that is not
+    # cached yet is rendered from while it downloads (progressive_background).
+    from .progressive import ProgressiveClip
+    bg_video = get_background_source()(progressive=settings.progressive_background)
+    progressive = isinstance(bg_video, ProgressiveClip)
+    job.thumb_future = _background.submit(
+        contextvars.copy_context().run, build_thumbnail,
+        job.card_png, bg_video.url if progressive else bg_video,
+        job.ws.thumb_frame, os.path.join(job.ws.tmp_dir, "thumb_bg.png")
     )
-    print(f"[+] Final video → {final_video}")
+
+    # 9) Burn subtitles, overlay card, mix in music, and output every profile
+    try:
+        job.drive_id, job.final_video, job.variants = burn_and_mux(
+            card_png   = job.card_png,
+            ass_path   = job.ws.ass,
+            first_dur  = first_dur,
+            audio_mp3  = job.ws.audio_mp3,
+            audio_wav  = job.ws.audio_wav,
+            out_dir    = job.ws.output_dir,
+            bg_video   = bg_video,
+            bg_music   = job.bg_music
+        )
+    except BaseException:
+        if progressive:
+            # the thumbnail reads the same stream; keep the render's own error
+            wait([job.thumb_future])
+            try:
+                bg_video.close()
+            except DownloadError as e:
+                print(f"[!] Background clip failed verification: {e}")
+        raise
+    if progressive:
+        wait([job.thumb_future])
+        # the render read these bytes: a clip that fails its md5/size check
+        # means the video may be corrupt too, so the job fails here
+        bg_video.close()
+    print(f"[+] Final video → {job.final_video}")
 
     # 10) Optionally upload to Google Drive
-    if settings.upload_to_drive and drive_id:
-        print(f"[+] Drive URL: https://drive.google.com/file/d/{drive_id}/view")
+    if settings.upload_to_drive and job.drive_id:
+        print(f"[+] Drive URL: https://drive.google.com/file/d/{job.drive_id}/view")
     else:
         print("[*] Skipped Drive upload")
 
-    # 11) Extract a YouTube thumbnail frame
-    thumb_frame = "output/youtube_thumbnail.png"
-    subprocess.run([
-        "ffmpeg", "-y",
-        "-ss", "00:00:01",
-        "-i", final_video,
-        "-frames:v", "1",
-        "-vf", "transpose=1,scale=1280:-1,pad=1280:720:(ow-iw)/2:(oh-ih)/2",
-        thumb_frame
-    ], check=True)
-    print(f"[+] Thumbnail → {thumb_frame}")
 
+def extract_thumbnail(job: Job) -> None:
+    # 11) Collect the YouTube thumbnail composed during the render
+    try:
+        job.thumb_frame = job.thumb_future.result()
+        print(f"[+] Thumbnail → {job.thumb_frame}")
+    except Exception as e:
+        print(f"[!] Thumbnail failed, continuing without one: {e}")
+
+
+def publish(job: Job) -> None:
     # 12) Optionally upload to YouTube
-    if settings.upload_to_youtube:
+    # (uploads past today's API quota are queued and the video kept for them)
+    upload_to_youtube = get_uploader("youtube")
+    if upload_to_youtube:
+        thumb_errors = ()  # the Google client libraries only load for the live backend
+        if settings.youtube_backend == "live":
+            from googleapiclient.errors import HttpError
+            thumb_errors = (HttpError,)
         try:
             yt_id = upload_to_youtube(
-                final_video,
-                title=submission.title,
-                description=raw_post + "\n\n" + " ".join(settings.youtube_video_tags),
-                # thumbnail_path=thumb_frame
+                job.final_video,
+                title=job.submission.title,
+                description=job.raw_post + "\n\n" + " ".join(settings.youtube_video_tags),
+                # thumbnail_path=job.thumb_frame
             )
-            print(f"[+] YouTube URL: https://youtu.be/{yt_id}")
-        except HttpError as e:
+            if yt_id is None:
+                job.yt_pending = True
+            else:
+                print(f"[+] YouTube URL: https://youtu.be/{yt_id}")
+        except thumb_errors as e:
             print(f"[!] Upload succeeded but thumbnail set failed: {e}")
+        except ResumableUploadError as e:
+            print(f"[!] YouTube upload failed, will resume next run: {e}")
+            job.yt_pending = True
     else:
         print("[*] Skipped YouTube upload")
 
-    # 13) Cleanup: retain only the final video in output/, then delete it too if uploaded
-    out_dir    = Path("output")
-    final_name = Path(final_video).name
 
-    for f in out_dir.iterdir():
-        if f.is_file() and f.name != final_name:
-            try:
-                f.unlink()
-            except OSError:
-                pass
+def cleanup(job: Job) -> None:
+    # 13) Cleanup: retain only the final video in this job's workspace,
+    #     and drop that too once uploaded (unless a YouTube upload is pending)
+    uploaded = (settings.upload_to_drive or settings.upload_to_youtube) and not job.yt_pending
+    job.ws.clean_intermediates(keep=[] if uploaded else [job.final_video, *job.variants.values()])
+
+    # 14) Hand the workspace over to the disk budget
+    job.ws.mark_complete()
+    DiskBudget().enforce()
+
+
+# Pipeline order; benchmarks and instrumentation iterate over this
+STAGES = [
+    ("fetch",     fetch_post),
+    ("text",      prepare_text),
+    ("voice",     choose_voice),
+    ("tts",       synthesize_audio),
+    ("audio",     build_audio_and_subtitles),
+    ("card",      render_card),
+    ("music",     pick_music),
+    ("render",    render_video),
+    ("thumbnail", extract_thumbnail),
+    ("publish",   publish),
+    ("cleanup",   cleanup),
+]
 
-    if settings.upload_to_drive or settings.upload_to_youtube:
+
+def run_job(job: Job) -> Job:
+    """
+    Run every stage on `job`, each inside its own metrics span (with its
+    memory figures when settings.memory_profile is on).
+    """
+    for name, stage in STAGES:
+        with metrics.span(f"stage.{name}") as rec, memory.profile(name, rec):
+            stage(job)
+    return job
+
+
+def resume_uploads() -> None:
+    # 0) Finish any YouTube upload a previous run was killed in the middle of,
+    #    then send queued ones as far as today's quota allows
+    if settings.upload_to_youtube and settings.youtube_backend == "live":
+        from googleapiclient.errors import HttpError
+        from .youtube_uploader import resume_pending_uploads
         try:
-            (out_dir / final_name).unlink()
-        except OSError:
-            pass
+            resume_pending_uploads()
+        except (HttpError, ResumableUploadError) as e:
+            print(f"[!] Could not resume pending upload: {e}")
+        drain_uploads()
+
+
+def drain_uploads() -> None:
+    """Upload queued videos while today's YouTube quota lasts."""
+    from googleapiclient.errors import HttpError
+    from .youtube_uploader import drain_upload_queue
+    try:
+        drain_upload_queue()
+    except (HttpError, ResumableUploadError) as e:
+        print(f"[!] Could not upload queued video: {e}")
+
+
+def upload_slots() -> int | None:
+    """
+    How many more renders today's YouTube quota can publish (after the
+    queued videos), or None when the quota does not hold renders back
+    (YouTube uploads off or local, or youtube_over_quota = "queue").
+    """
+    if not settings.upload_to_youtube or settings.youtube_backend != "live" or settings.youtube_over_quota != "wait":
+        return None
+    from .youtube_quota import upload_capacity
+    return upload_capacity()
+
+
+def main():
+    resume_uploads()
+
+    slots = upload_slots()
+    if slots is not None and slots <= 0:
+        from .youtube_quota import describe_reset
+        print(f"[!] Today's YouTube quota is spoken for; not rendering ({describe_reset()})")
+        return
 
-    # 14) Cleanup audio chunks always
-    audio_cleanup("audio_chunks", settings.audio_mp3, settings.audio_wav)
+    try:
+        run_job(Job())
+    finally:
+        metrics.flush()
 
     print("\n[+] Done.\n")
 
@@ -0,0 +1,24 @@
+import subprocess
+import wave
+from .config import settings
+
+
+def probe_duration(path: str) -> float:
+    """
+    Container duration in seconds, via ffprobe.
+    """
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", path],
+        capture_output=True, text=True, check=True,
+        timeout=settings.ffmpeg_timeout_base
+    ).stdout
+    return float(out.strip())
+
+
+def wav_duration(path: str) -> float:
+    """
+    Duration of a PCM WAV in seconds, read from its header (no decode).
+    """
+    with wave.open(path, "rb") as w:
+        return w.getnframes() / w.getframerate()
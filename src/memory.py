@@ -0,0 +1,184 @@
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import lru_cache
+from .config import settings
+
+# Opt-in memory profiling (MEMORY_PROFILE=true). Each pipeline stage span
+# gets the peak of Python allocations (tracemalloc), how far this process's
+# RSS grew above where the stage started (native buffers, torch, pydub's
+# copies) and the peak combined RSS of the child processes started during
+# the stage (ffmpeg, Chromium renderers), sampled every memory_sample_ms;
+# children already running when it began, such as the browser warm_up()
+# keeps open, belong to the idle worker and are left out. The sum of
+# the last two is what the stage needs on top of an idle worker, which is
+# what STAGE_MEMORY_BUDGETS are compared with and what jobs_that_fit()
+# divides the host's available memory by.
+#
+# Figures are process-wide: profile with WORKER_CONCURRENCY=1 to attribute
+# them to a single job.
+
+MB = 1024 * 1024
+
+
+def _status_kb(pid: int | str, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def rss_mb() -> float:
+    """Resident set size of this process."""
+    return _status_kb("self", "VmRSS") / 1024
+
+
+def _child_pids(pid: int) -> list[int]:
+    out = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return out
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out += [int(c) for c in f.read().split()]
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def descendant_pids(pid: int | None = None) -> set[int]:
+    """Every process below pid (default: this process)."""
+    todo, seen = _child_pids(pid or os.getpid()), set()
+    while todo:
+        child = todo.pop()
+        if child not in seen:
+            seen.add(child)
+            todo += _child_pids(child)
+    return seen
+
+
+def children_rss_mb(pid: int | None = None, exclude: set[int] = frozenset()) -> float:
+    """
+    Combined RSS of every descendant of pid (default: this process),
+    leaving out the processes in `exclude`.
+    """
+    return sum(_status_kb(child, "VmRSS") for child in descendant_pids(pid) - exclude) / 1024
+
+
+def available_mb() -> float | None:
+    """MemAvailable from /proc/meminfo, or None where there is no /proc."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class _Sampler(threading.Thread):
+    """
+    Polls own RSS and that of children started since it was created until
+    stopped, keeping the maxima.
+    """
+
+    def __init__(self, interval_s: float):
+        super().__init__(daemon=True, name="memory-sampler")
+        self.interval_s = interval_s
+        self.rss_peak = 0.0
+        self.children_peak = 0.0
+        self.baseline = descendant_pids()
+        self._done = threading.Event()
+        self.sample()
+
+    def sample(self):
+        self.rss_peak = max(self.rss_peak, rss_mb())
+        self.children_peak = max(self.children_peak, children_rss_mb(exclude=self.baseline))
+
+    def run(self):
+        while not self._done.wait(self.interval_s):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+@lru_cache(maxsize=4)
+def _parse_budgets(raw: str) -> dict[str, float]:
+    budgets = {}
+    for part in raw.split(","):
+        name, sep, mb = part.partition("=")
+        if sep and name.strip():
+            budgets[name.strip()] = float(mb)
+    return budgets
+
+
+def stage_budgets() -> dict[str, float]:
+    """STAGE_MEMORY_BUDGETS as {stage: MB}, e.g. "tts=1500,render=900"."""
+    return _parse_budgets(settings.stage_memory_budgets)
+
+
+def jobs_that_fit(available: float | None = None) -> int | None:
+    """
+    How many jobs can run side by side if each may be in its most
+    expensive stage at the same time, keeping memory_reserve_mb free. None
+    when no budgets are configured or available memory is unknown; never
+    less than 1.
+    """
+    budgets = stage_budgets()
+    available = available_mb() if available is None else available
+    if not budgets or available is None:
+        return None
+    per_job = max(budgets.values())
+    if per_job <= 0:
+        return None
+    return max(1, int((available - settings.memory_reserve_mb) // per_job))
+
+
+@contextmanager
+def profile(stage: str, rec: dict):
+    """
+    Record the memory figures of one stage into its span record `rec`
+    (no-op unless settings.memory_profile), and warn if the stage went over
+    its budget.
+    """
+    if not settings.memory_profile:
+        yield
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    py_base = tracemalloc.get_traced_memory()[0]
+    rss_base = rss_mb()
+    sampler = _Sampler(settings.memory_sample_ms / 1000)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        py_peak = (tracemalloc.get_traced_memory()[1] - py_base) / MB
+        growth = max(0.0, sampler.rss_peak - rss_base)
+        need = growth + sampler.children_peak
+        rec.update({
+            "py_peak_mb":           round(py_peak, 1),
+            "rss_peak_mb":          round(sampler.rss_peak, 1),
+            "rss_growth_mb":        round(growth, 1),
+            "children_rss_peak_mb": round(sampler.children_peak, 1),
+            "memory_mb":            round(need, 1),
+        })
+        budget = stage_budgets().get(stage)
+        if budget is not None:
+            rec["memory_budget_mb"] = budget
+            if need > budget:
+                print(f"[!] Stage {stage} needed {need:.0f} MB, over its {budget:.0f} MB budget "
+                      f"(RSS +{growth:.0f} MB, children {sampler.children_peak:.0f} MB)")
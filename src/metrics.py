@@ -0,0 +1,140 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from .config import settings
+
+# Lightweight span recorder. Every span becomes one JSON line in
+# settings.metrics_jsonl; flush() additionally renders a Prometheus textfile
+# (node_exporter textfile collector format) when settings.metrics_prom_path
+# is set. Quantiles in the textfile are computed over the last
+# settings.metrics_window spans of each name, so they span several runs.
+
+_lock = threading.Lock()
+_run_id = uuid.uuid4().hex[:12]
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("metrics_context", default={})
+_parent: contextvars.ContextVar[str | None] = contextvars.ContextVar("metrics_parent", default=None)
+_counters: dict[str, float] = defaultdict(float)
+
+
+def set_context(**fields) -> None:
+    """
+    Attach fields (e.g. post_id) to every span recorded from this context.
+    """
+    _context.set({**_context.get(), **fields})
+
+
+def _emit(record: dict) -> None:
+    path = settings.metrics_jsonl
+    if not path:
+        return
+    line = json.dumps(record, default=str)
+    with _lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block. The yielded dict can be filled in while the block runs
+    (e.g. rec["bytes"] = n); it is written out when the block exits.
+    """
+    rec = {"span": name, **attrs}
+    parent = _parent.get()
+    token = _parent.set(name)
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield rec
+    except BaseException as e:
+        status = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _parent.reset(token)
+        rec.update({
+            "run_id":     _run_id,
+            "ts":         time.time(),
+            "duration_s": round(time.perf_counter() - t0, 6),
+            "status":     status,
+        })
+        if parent:
+            rec["parent"] = parent
+        rec.update(_context.get())
+        count(name)
+        if "bytes" in rec:
+            count(f"{name}_bytes", rec["bytes"])
+        _emit(rec)
+
+
+def count(name: str, n: float = 1) -> None:
+    with _lock:
+        _counters[name] += n
+
+
+def _recent_spans() -> dict[str, list[float]]:
+    window = settings.metrics_window
+    by_name: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+    path = settings.metrics_jsonl
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("status") == "ok":
+                by_name[rec["span"]].append(rec["duration_s"])
+    return {k: sorted(v) for k, v in by_name.items()}
+
+
+def _quantile(sorted_vals: list[float], q: float) -> float:
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def flush() -> None:
+    """
+    Write the Prometheus textfile (if configured). Written to a temp file
+    and renamed, as the textfile collector requires.
+    """
+    path = settings.metrics_prom_path
+    if not path:
+        return
+    lines = [
+        "# HELP reddit_video_span_seconds Span durations over the recent window.",
+        "# TYPE reddit_video_span_seconds summary",
+    ]
+    for name, vals in sorted(_recent_spans().items()):
+        lbl = _label(name)
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'reddit_video_span_seconds{{span="{lbl}",quantile="{q}"}} {_quantile(vals, q):.6f}')
+        lines.append(f'reddit_video_span_seconds_sum{{span="{lbl}"}} {sum(vals):.6f}')
+        lines.append(f'reddit_video_span_seconds_count{{span="{lbl}"}} {len(vals)}')
+
+    lines += [
+        "# HELP reddit_video_counter Span counts and bytes recorded by the last run.",
+        "# TYPE reddit_video_counter gauge",
+    ]
+    with _lock:
+        counters = dict(_counters)
+    for name, val in sorted(counters.items()):
+        lines.append(f'reddit_video_counter{{name="{_label(name)}"}} {val:g}')
+    lines.append(f"reddit_video_last_run_timestamp_seconds {time.time():.0f}")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
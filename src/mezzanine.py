@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+from .config import settings
+from .ffmpeg_runner import run_ffmpeg
+from .media_probe import probe_duration
+from .keyframes import keyframe_index
+
+# Background clips are reused across hundreds of renders, so each one is
+# transcoded once into a "mezzanine": already 1080x1920, constant frame rate
+# and a short GOP. Renders from a mezzanine skip scale/pad entirely and can
+# seek to any second without decoding a long run of frames.
+
+MEZZ_W, MEZZ_H = 1080, 1920
+
+
+def mezzanine_path(src: str) -> Path:
+    return Path(settings.mezzanine_dir) / f"{Path(src).stem}.mezz.mp4"
+
+
+def find_mezzanine(src: str) -> str | None:
+    """
+    Return the mezzanine for `src` if one exists and is newer than the source.
+    """
+    mezz = mezzanine_path(src)
+    try:
+        if mezz.stat().st_mtime >= os.stat(src).st_mtime:
+            return str(mezz)
+    except OSError:
+        pass
+    return None
+
+
+def build_mezzanine(src: str) -> str:
+    """
+    Transcode `src` into its 1080x1920 mezzanine (video only) and return the path.
+    """
+    dst = mezzanine_path(src)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.stem + ".tmp.mp4")
+    fps = settings.mezzanine_fps
+    gop = max(1, int(round(fps * settings.mezzanine_gop_seconds)))
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", src,
+        "-an",
+        "-vf",
+        f"scale={MEZZ_W}:{MEZZ_H}:force_original_aspect_ratio=decrease,"
+        f"pad={MEZZ_W}:{MEZZ_H}:(ow-iw)/2:(oh-ih)/2:color=black,"
+        f"fps={fps},format=yuv420p",
+        "-c:v", "libx264", "-preset", settings.mezzanine_preset, "-crf", str(settings.mezzanine_crf),
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-movflags", "+faststart",
+        str(tmp),
+    ]
+    print(f"[+] Building mezzanine {dst} from {src}")
+    run_ffmpeg(cmd, "mezzanine", expected_s=probe_duration(src))
+    os.replace(tmp, dst)
+    keyframe_index(str(dst))
+    return str(dst)
+
+
+def ensure_mezzanine(src: str) -> str:
+    return find_mezzanine(src) or build_mezzanine(src)
@@ -1,8 +1,12 @@
 import json
 import os
 import random
-from praw.models import Submission
+from typing import TYPE_CHECKING
 from .config import settings
+from . import metrics
+
+if TYPE_CHECKING:
+    from praw.models import Submission
 
 def _load_used() -> tuple[list[dict], set[str]]:
     path = settings.used_posts_file
@@ -19,13 +23,24 @@ def _save_used(records: list[dict]) -> None:
     with open(settings.used_posts_file, "w") as f:
         json.dump(records, f, indent=2)
 
-def find_next_post(reddit) -> Submission:
+def mark_used(post: "Submission") -> None:
+    """
+    Record a post chosen some other way (e.g. a worker URL job) so later
+    subreddit scans skip it.
+    """
+    records, used_ids = _load_used()
+    if post.id not in used_ids:
+        records.append({"id": post.id, "url": f"https://reddit.com{post.permalink}"})
+        _save_used(records)
+
+def find_next_post(reddit, subreddits: list[str] | None = None) -> "Submission":
     """
     Scan every hot post in each subreddit (up to Reddit's internal cap)
     and return the first one that hasn't been used that meets the criteria.
-    Posts distinguished as moderator will be skipped.
+    Posts distinguished as moderator will be skipped. `subreddits`
+    overrides settings.subreddits.
     """
-    subs = settings.subreddits
+    subs = list(subreddits or settings.subreddits)
     if not subs:
         raise RuntimeError("No subreddits configured in SUBREDDITS")
 
@@ -36,26 +51,9 @@ def find_next_post(reddit) -> Submission:
 
     for subreddit_name in subs:
         print(f"[~] Scanning r/{subreddit_name}…")
-        sub = reddit.subreddit(subreddit_name)
-
-        for post in sub.hot(limit=None):
-            # skip if author deleted
-            if post.author is None:
-                continue
-
-            # skip if post is distinguished as a moderator post
-            if post.distinguished == "moderator":
-                continue
-
-            if post.id in used_ids:
-                continue
-            if post.num_comments < settings.min_comments:
-                continue
-            if len(post.selftext or "") < settings.min_post_length:
-                continue
-            if post.over_18 and not settings.allow_nsfw:
-                continue
-
+        with metrics.span("api.reddit.scan", subreddit=subreddit_name) as rec:
+            post = _scan_subreddit(reddit, subreddit_name, used_ids, rec)
+        if post is not None:
             # Found a valid one. record and return it
             record = {"id": post.id, "url": f"https://reddit.com{post.permalink}"}
             records.append(record)
@@ -65,3 +63,34 @@ def find_next_post(reddit) -> Submission:
             return post
 
     raise RuntimeError(f"No matching posts found in any of: {', '.join(subs)}")
+
+
+def _scan_subreddit(reddit, subreddit_name: str, used_ids: set[str], rec: dict):
+    """
+    Return the first unused hot post in r/subreddit_name meeting the criteria, or None.
+    """
+    sub = reddit.subreddit(subreddit_name)
+    rec["posts_seen"] = 0
+
+    for post in sub.hot(limit=None):
+        rec["posts_seen"] += 1
+        # skip if author deleted
+        if post.author is None:
+            continue
+
+        # skip if post is distinguished as a moderator post
+        if post.distinguished == "moderator":
+            continue
+
+        if post.id in used_ids:
+            continue
+        if post.num_comments < settings.min_comments:
+            continue
+        if len(post.selftext or "") < settings.min_post_length:
+            continue
+        if post.over_18 and not settings.allow_nsfw:
+            continue
+
+        return post
+
+    return None
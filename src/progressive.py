@@ -0,0 +1,112 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .ranged_download import DownloadError, RangedDownload
+
+# Serves a clip that is still downloading to ffmpeg over loopback HTTP.
+# ffmpeg's http protocol seeks with Range requests, so it reads the moov atom
+# wherever it sits and then only the part of the clip it actually plays;
+# every read pulls the ranges it covers (plus a few ahead) through the
+# RangedDownload, so the encode runs while the transfer is still going.
+
+_BLOCK = 256 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    clip: "ProgressiveClip"  # set on the per-server subclass
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        dl = self.clip.download
+        size = dl.size
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        start = int(m.group(1)) if m else 0
+        end = min(int(m.group(2)), size - 1) if m and m.group(2) else size - 1
+        if start >= size and size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(206 if m else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if m:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        pos, ahead = start, None
+        try:
+            while pos <= end:
+                i = pos // dl.part_size
+                if i != ahead:
+                    self.clip.read_ahead(i)
+                    ahead = i
+                data = dl.read(pos, min(_BLOCK, end - pos + 1))
+                self.wfile.write(data)
+                pos += len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg seeks by dropping the connection, or has all it needs
+        except DownloadError as e:
+            print(f"    [!] Progressive read at byte {pos} failed: {e}")
+            self.close_connection = True
+
+
+class ProgressiveClip:
+    """
+    A clip being downloaded, served at `url` for ffmpeg to read while it
+    arrives. Only ranges somebody reads (and `readahead` ranges past each
+    read) are fetched; the rest stays missing in the resumable .part unless
+    a full download picks it up. If everything did arrive, close() moves
+    the clip into place and calls `on_complete(download)`; if it fails
+    verification, close() calls `on_failed(download)` and raises the
+    DownloadError. Use as a context manager or call close().
+    """
+
+    def __init__(self, download: RangedDownload, readahead: int = 2, on_complete=None, on_failed=None):
+        self.download = download
+        self.readahead = readahead
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+        download.open()
+        handler = type("ClipHandler", (_Handler,), {"clip": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}/{download.dest.name}"
+
+    @property
+    def path(self) -> str:
+        """Where the clip ends up in the cache once complete."""
+        return str(self.download.dest)
+
+    def read_ahead(self, i: int) -> None:
+        """Start fetching the ranges after range i in the background."""
+        for j in range(i + 1, i + 1 + self.readahead):
+            self.download.prefetch(j)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self.download.cancel_background()
+        if self.download.complete:
+            try:
+                self.download.finish()
+            except DownloadError:
+                if self.on_failed:
+                    self.on_failed(self.download)
+                raise
+            if self.on_complete:
+                self.on_complete(self.download)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,104 @@
+import importlib
+from .config import settings
+
+# Provider registry. Entries are "module:function" strings that are only
+# imported when resolved, so a run using Edge TTS with uploads disabled never
+# loads torch/whisper, elevenlabs, playwright or the Google client libraries.
+# Every external service has a "live" and a "local" backend (the stand-ins in
+# src/local_services.py), picked by settings.<service>_backend.
+
+TTS_PROVIDERS = {
+    "elevenlabs": ".tts_elevenlabs:synthesize_with_elevenlabs",
+    "whisper":    ".tts_whisper:synthesize_with_whisper",
+    "edge":       ".tts_edge:synthesize_chunks",
+    "local":      ".local_services:synthesize_tones",
+}
+
+UPLOADERS = {
+    "drive": {
+        "live":  ".drive_utils:upload_to_drive",
+        "local": ".local_services:upload_to_local_drive",
+    },
+    "youtube": {
+        "live":  ".youtube_uploader:schedule_upload",
+        "local": ".local_services:upload_to_sink",
+    },
+}
+
+REDDIT_BACKENDS = {
+    "live":  ".reddit_client:init_reddit",
+    "local": ".local_services:init_local_reddit",
+}
+
+LLM_BACKENDS = {
+    "live":  ".ai_utils:generate_with_gemini",
+    "local": ".local_services:rule_based_llm",
+}
+
+BACKGROUND_SOURCES = {
+    "live":  ".asset_manager:choose_and_stream_video",
+    "local": ".local_services:choose_local_background",
+}
+
+
+def resolve(spec: str):
+    module, attr = spec.split(":")
+    return getattr(importlib.import_module(module, __package__), attr)
+
+
+def _backend(registry: dict, service: str, name: str):
+    try:
+        return resolve(registry[name])
+    except KeyError:
+        raise ValueError(f"Unknown {service} backend {name!r} (expected one of: {', '.join(registry)})") from None
+
+
+def get_tts(provider: str | None = None):
+    """
+    Return a callable `(chunks, out_dir, voice) -> (wav_infos, all_words)`
+    for the configured TTS provider, with one wav_info per chunk and words
+    tagged with their sentence id. Unknown names fall back to Edge TTS.
+    """
+    name = (provider or settings.tts_provider).lower()
+    fn = resolve(TTS_PROVIDERS.get(name, TTS_PROVIDERS["edge"]))
+
+    if name == "elevenlabs":
+        return lambda chunks, out_dir, voice: fn(chunks, out_dir=out_dir)
+    if name in ("whisper", "local"):
+        return lambda chunks, out_dir, voice: fn(chunks, out_dir=out_dir, voice=voice)
+    # Edge TTS: returns list of (wav_path, duration_ms), no timings
+    return lambda chunks, out_dir, voice: (fn(chunks, out_dir=out_dir, voice=voice), [])
+
+
+def get_uploader(name: str):
+    """
+    Return the upload function for `name` ("drive" or "youtube"), or None
+    when its UPLOAD_* toggle is off. The live YouTube one returns None when
+    the video was queued for a later day's quota instead.
+    """
+    enabled = {
+        "drive":   (settings.upload_to_drive, settings.drive_backend),
+        "youtube": (settings.upload_to_youtube, settings.youtube_backend),
+    }
+    on, backend = enabled.get(name, (False, None))
+    if not on:
+        return None
+    return _backend(UPLOADERS[name], name, backend)
+
+
+def get_reddit():
+    """The praw.Reddit client, or its local stand-in."""
+    return _backend(REDDIT_BACKENDS, "reddit", settings.reddit_backend)()
+
+
+def get_llm():
+    """A callable `(prompt) -> text` for the configured LLM backend."""
+    return _backend(LLM_BACKENDS, "llm", settings.llm_backend)
+
+
+def get_background_source():
+    """
+    A callable `(progressive=False) -> path or ProgressiveClip` picking the
+    background clip for a render.
+    """
+    return _backend(BACKGROUND_SOURCES, "drive", settings.drive_backend)
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from . import metrics
+
+# Statuses worth retrying: rate limiting and server-side failures
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+class RangedDownload:
+    """
+    Downloads `url` into `dest` as fixed-size byte ranges fetched
+    concurrently over one pooled session. Data goes into <dest>.part at its
+    final offset; the indexes of finished ranges are kept in
+    <dest>.part.ranges.json, so a later process constructing the same
+    download picks up the missing ranges only. The result is checked
+    against the expected size (and md5 when given) before it is renamed
+    into place.
+
+    Bytes can also be read while the download is in progress (read,
+    prefetch), e.g. to serve the clip to ffmpeg as it arrives (see
+    src/progressive.py): a read waits only for the bytes it asks for, and
+    every range is fetched once whoever asks first.
+
+    `session` is any requests-compatible session safe to share across
+    threads; in production that is google.auth's AuthorizedSession.
+    """
+
+    def __init__(
+        self,
+        session,
+        url: str,
+        dest: str,
+        size: int,
+        md5: str | None = None,
+        part_size: int = 32 * 1024 * 1024,
+        workers: int = 4,
+        max_retries: int = 5,
+        timeout: float = 60,
+    ):
+        self.session = session
+        self.url = url
+        self.dest = Path(dest)
+        self.size = size
+        self.md5 = md5
+        self.part_size = max(1, part_size)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.part_path = self.dest.with_name(self.dest.name + ".part")
+        self.state_path = self.dest.with_name(self.dest.name + ".part.ranges.json")
+        self.ranges = [(o, min(o + self.part_size, size) - 1) for o in range(0, size, self.part_size)]
+        self.bytes_fetched = 0
+        self._done: set[int] = set()
+        self._busy: set[int] = set()        # ranges being fetched right now
+        self._filled: dict[int, int] = {}   # busy range -> next byte to write
+        self._errors: dict[int, DownloadError] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._opened = False
+        self._pool: ThreadPoolExecutor | None = None  # background fetches (prefetch/read)
+        self._generation = 0  # bumped by cancel_background()
+
+    # ---- persisted state ----
+
+    def _load_state(self) -> set[int]:
+        """Finished range indexes from an earlier attempt at the same file."""
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            part_size = self.part_path.stat().st_size
+        except (OSError, ValueError):
+            return set()
+        same = (state.get("size"), state.get("md5"), state.get("part_size")) == (self.size, self.md5, self.part_size)
+        if not same or part_size != self.size:
+            return set()
+        return {i for i in state.get("done", []) if 0 <= i < len(self.ranges)}
+
+    def _save_state(self) -> None:
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "url":       self.url,
+            "size":      self.size,
+            "md5":       self.md5,
+            "part_size": self.part_size,
+            "done":      sorted(self._done),
+            "updated":   time.time(),
+        }), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _clear_state(self) -> None:
+        self.state_path.unlink(missing_ok=True)
+
+    # ---- transfer ----
+
+    def _fetch(self, i: int, generation: int | None = None) -> None:
+        start, end = self.ranges[i]
+        with self._lock:
+            self._filled[i] = start  # next byte to write; a retry continues from here
+        failures = 0
+        while True:
+            before = self._filled[i]
+            try:
+                with metrics.span("api.download.range", offset=before, bytes=end - before + 1) as rec:
+                    with self.session.get(
+                        self.url, headers={"Range": f"bytes={before}-{end}"},
+                        stream=True, timeout=self.timeout,
+                    ) as resp:
+                        rec["http_status"] = status = resp.status_code
+                        if status == 206:
+                            self._write(resp, i, end, generation)
+                            break
+                        body = resp.text
+            except (OSError, DownloadError) as e:
+                # dropped connections (requests' errors are OSErrors) and short bodies
+                status, body = None, str(e)
+
+            if generation is not None and generation != self._generation:
+                raise DownloadError(f"range {start}-{end}: cancelled")
+            if status is not None and status not in _RETRY_STATUS:
+                raise DownloadError(f"range {start}-{end}: HTTP {status}: {body[:200]}")
+            if self._filled[i] > before:
+                # cut off after making progress: carry on from there right away
+                failures = 0
+                continue
+            failures += 1
+            if failures > self.max_retries:
+                raise DownloadError(f"range {start}-{end}: too many retries ({body[:200]})")
+            print(f"    Warning: range {start}-{end} failed at byte {before} "
+                  f"(attempt {failures}/{self.max_retries}): {status or body}")
+            time.sleep(min(2 ** failures, 30))
+
+        with self._lock:
+            self._done.add(i)
+            self._save_state()
+
+    def _write(self, resp, i: int, end: int, generation: int | None) -> None:
+        pos = self._filled[i]
+        got = resp.headers.get("Content-Range", "")
+        if not got.startswith(f"bytes {pos}-{end}/"):
+            raise DownloadError(f"server answered {got!r} for bytes {pos}-{end}")
+        with open(self.part_path, "r+b") as fh:
+            fh.seek(pos)
+            for block in resp.iter_content(64 * 1024):
+                if generation is not None and generation != self._generation:
+                    raise DownloadError("cancelled")
+                fh.write(block)
+                fh.flush()  # readers open the file separately
+                pos += len(block)
+                with self._cond:
+                    self._filled[i] = pos
+                    self.bytes_fetched += len(block)
+                    self._cond.notify_all()
+        if pos != end + 1:
+            raise DownloadError(f"range ended at byte {pos}, expected {end + 1}")
+
+    def _verify(self) -> None:
+        size = self.part_path.stat().st_size
+        if size != self.size:
+            raise DownloadError(f"{self.dest.name}: got {size} bytes, expected {self.size}")
+        if not self.md5:
+            return
+        h = hashlib.md5()
+        with open(self.part_path, "rb") as fh:
+            for block in iter(lambda: fh.read(8 * 1024 * 1024), b""):
+                h.update(block)
+        if h.hexdigest() != self.md5.lower():
+            raise DownloadError(f"{self.dest.name}: md5 {h.hexdigest()} does not match {self.md5}")
+
+    # ---- coordination ----
+
+    def open(self) -> None:
+        """Load the finished ranges of an earlier attempt, or start an empty .part."""
+        with self._lock:
+            if self._opened:
+                return
+            self._opened = True
+            if self.dest.exists() and not self.part_path.exists():
+                self._done = set(range(len(self.ranges)))  # finished by another instance
+                return
+            self._done = self._load_state()
+            if self._done:
+                print(f"    Resuming download: {len(self._done)}/{len(self.ranges)} ranges already on disk")
+            else:
+                self.dest.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.part_path, "wb") as fh:
+                    fh.truncate(self.size)
+                self._save_state()
+
+    def _claim(self, i: int) -> None:
+        """Mark range i as being fetched; the caller holds the lock."""
+        self._busy.add(i)
+        self._errors.pop(i, None)
+
+    def _run_claimed(self, i: int, generation: int | None = None) -> None:
+        try:
+            self._fetch(i, generation)
+        except DownloadError as e:
+            with self._lock:
+                self._errors[i] = e
+            raise
+        finally:
+            with self._cond:
+                self._busy.discard(i)
+                self._filled.pop(i, None)
+                self._cond.notify_all()
+
+    def _submit(self, i: int) -> None:
+        """Fetch claimed range i on the background pool; the caller holds the lock."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="range")
+        self._pool.submit(self._run_claimed, i, self._generation)
+
+    def get(self, i: int) -> None:
+        """Make sure range i is on disk, fetching it here unless another thread already is."""
+        with self._cond:
+            while i in self._busy:
+                self._cond.wait()
+            if i in self._done:
+                return
+            self._claim(i)
+        self._run_claimed(i)
+
+    def prefetch(self, i: int) -> None:
+        """Start fetching range i in the background unless it is done or in flight."""
+        with self._lock:
+            if i < len(self.ranges) and i not in self._done and i not in self._busy:
+                self._claim(i)
+                self._submit(i)
+
+    def ensure(self, start: int, end: int) -> None:
+        """
+        Block until bytes start..end (inclusive) are on disk. Missing ranges
+        are fetched in the background, and the wait ends as soon as the
+        requested bytes have been written, not the whole range.
+        """
+        end = min(end, self.size - 1)
+        for i in range(start // self.part_size, end // self.part_size + 1):
+            upto = min(end, self.ranges[i][1])
+            started = False
+            with self._cond:
+                while i not in self._done and self._filled.get(i, -1) <= upto:
+                    if i not in self._busy:
+                        if started and i in self._errors:
+                            raise self._errors[i]
+                        self._claim(i)
+                        self._submit(i)
+                        started = True
+                    self._cond.wait()
+
+    def read(self, start: int, n: int) -> bytes:
+        """n bytes from start, waiting for them to arrive if needed."""
+        n = min(n, self.size - start)
+        if n <= 0:
+            return b""
+        self.ensure(start, start + n - 1)
+        for path in (self.part_path, self.dest):
+            try:
+                with open(path, "rb") as fh:
+                    fh.seek(start)
+                    return fh.read(n)
+            except FileNotFoundError:
+                continue  # renamed into place in between
+        raise DownloadError(f"{self.dest.name}: neither {self.part_path.name} nor the file exists")
+
+    def cancel_background(self) -> None:
+        """
+        Abandon background fetches (prefetch/read); ranges they finished stay
+        recorded, partly fetched ones are fetched again by whoever needs them.
+        """
+        with self._lock:
+            self._generation += 1
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def complete(self) -> bool:
+        with self._lock:
+            return len(self._done) == len(self.ranges)
+
+    def finish(self) -> str:
+        """Verify the finished .part and rename it into place (once)."""
+        with self._lock:
+            if self.dest.exists() and not self.part_path.exists():
+                return str(self.dest)
+            try:
+                self._verify()
+            except DownloadError:
+                # corrupt as a whole: nothing in the partial file can be trusted;
+                # the next open() starts a fresh .part
+                self.part_path.unlink(missing_ok=True)
+                self._clear_state()
+                self._done.clear()
+                self._opened = False
+                raise
+            os.replace(self.part_path, self.dest)
+            self._clear_state()
+        return str(self.dest)
+
+    def run(self, on_progress=None) -> str:
+        """
+        Download (or resume) the file and return dest. `on_progress(done,
+        total)` is called with byte counts after every finished range.
+        """
+        self.open()
+
+        def fetch(i):
+            self.get(i)
+            if on_progress:
+                with self._lock:
+                    done = sum(self.ranges[j][1] - self.ranges[j][0] + 1 for j in self._done)
+                on_progress(done, self.size)
+
+        todo = [i for i in range(len(self.ranges)) if i not in self._done]
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(todo)), thread_name_prefix="range") as pool:
+                # list() re-raises the first failed range; finished ones stay recorded
+                list(pool.map(fetch, todo))
+        return self.finish()
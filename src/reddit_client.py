@@ -1,9 +1,12 @@
+from functools import lru_cache
 from praw import Reddit
 from .config import settings
 
+@lru_cache(maxsize=1)
 def init_reddit() -> Reddit:
+    # one client per process; the worker daemon reuses it for every job
     return Reddit(
         client_id=settings.reddit_client_id,
         client_secret=settings.reddit_client_secret,
         user_agent=settings.reddit_user_agent,
-    )
\ No newline at end of file
+    )
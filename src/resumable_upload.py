@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from . import metrics
+
+# Google requires every non-final chunk to be a multiple of 256 KiB
+CHUNK_ALIGN = 256 * 1024
+
+
+class ResumableUploadError(RuntimeError):
+    def __init__(self, status: int, content: str):
+        super().__init__(f"Resumable upload failed with HTTP {status}: {content}")
+        self.status = status
+        self.content = content
+
+
+def _parse_range(header: str | None) -> int:
+    """
+    Turn a 'Range: bytes=0-N' response header into the next byte to send.
+    A missing header means the server has not persisted anything yet.
+    """
+    if not header:
+        return 0
+    return int(header.rsplit("-", 1)[1]) + 1
+
+
+def _state_key(file_path: str) -> str:
+    st = os.stat(file_path)
+    raw = f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ResumableUpload:
+    """
+    Chunked upload speaking Google's resumable protocol directly, so the
+    session URI and last acknowledged offset can be written to disk after
+    every chunk. A later process constructing the same upload (same file,
+    same state_dir) asks the server where it stopped and continues there.
+
+    `session` is any requests-compatible session; in production that is
+    google.auth.transport.requests.AuthorizedSession.
+    """
+
+    def __init__(
+        self,
+        session,
+        init_url: str,
+        file_path: str,
+        metadata: dict,
+        state_dir: str,
+        mimetype: str = "video/*",
+        chunk_size: int = 8 * 1024 * 1024,
+        max_retries: int = 5,
+        on_start=None,
+    ):
+        self.session = session
+        self.init_url = init_url
+        self.file_path = file_path
+        self.metadata = metadata
+        self.mimetype = mimetype
+        self.chunk_size = max(CHUNK_ALIGN, chunk_size // CHUNK_ALIGN * CHUNK_ALIGN)
+        self.max_retries = max_retries
+        self.on_start = on_start  # called before each new session is requested
+        self.size = os.path.getsize(file_path)
+        self.state_path = Path(state_dir) / f"{_state_key(file_path)}.json"
+        self.bytes_sent = 0
+        self._restarts = 0
+
+    # ---- persisted state ----
+
+    def _load_state(self) -> dict | None:
+        if not self.state_path.exists():
+            return None
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, session_uri: str, offset: int) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "session_uri": session_uri,
+            "file_path":   os.path.abspath(self.file_path),
+            "size":        self.size,
+            "offset":      offset,
+            "init_url":    self.init_url,
+            "metadata":    self.metadata,
+            "mimetype":    self.mimetype,
+            "updated":     time.time(),
+        }), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _clear_state(self) -> None:
+        try:
+            self.state_path.unlink()
+        except OSError:
+            pass
+
+    # ---- protocol ----
+
+    def _start_session(self) -> str:
+        if self.on_start:
+            self.on_start()
+        resp = self.session.post(
+            self.init_url,
+            json=self.metadata,
+            headers={
+                "X-Upload-Content-Length": str(self.size),
+                "X-Upload-Content-Type":   self.mimetype,
+            },
+        )
+        if resp.status_code != 200 or "Location" not in resp.headers:
+            raise ResumableUploadError(resp.status_code, resp.text)
+        uri = resp.headers["Location"]
+        self._save_state(uri, 0)
+        return uri
+
+    def _restart_session(self) -> str:
+        """
+        Replace an expired session. Each one is a new (billed) insert, so a
+        server that keeps expiring them is given up on after max_retries.
+        """
+        self._restarts += 1
+        if self._restarts > self.max_retries:
+            raise ResumableUploadError(0, f"upload session expired {self._restarts} times")
+        print("  [!] Upload session expired, starting over")
+        return self._start_session()
+
+    def _query_offset(self, session_uri: str):
+        """
+        Ask the server how many bytes it holds. Returns (offset, result),
+        where result is the final response body if the upload already
+        completed, and offset is None if the session has expired.
+        """
+        resp = self.session.put(
+            session_uri,
+            headers={"Content-Length": "0", "Content-Range": f"bytes */{self.size}"},
+        )
+        if resp.status_code in (200, 201):
+            return self.size, resp.json()
+        if resp.status_code == 308:
+            return _parse_range(resp.headers.get("Range")), None
+        if resp.status_code in (404, 410):
+            return None, None
+        raise ResumableUploadError(resp.status_code, resp.text)
+
+    def _back_off(self, failures: int, status: int | None) -> int:
+        """Count one more retryable failure and sleep; give up past max_retries."""
+        failures += 1
+        if failures > self.max_retries:
+            raise ResumableUploadError(status or 0, "too many retries")
+        time.sleep(min(2 ** failures, 60))
+        return failures
+
+    def _probe(self, session_uri: str, failures: int = 0):
+        """
+        _query_offset, retrying probes that fail with 5xx, 429 or a dropped
+        connection. Returns (offset, result, failures).
+        """
+        while True:
+            try:
+                offset, result = self._query_offset(session_uri)
+                return offset, result, failures
+            except ResumableUploadError as e:
+                if e.status < 500 and e.status != 429:
+                    raise
+                status, why = e.status, f"HTTP {e.status}"
+            except OSError as e:
+                status, why = None, e
+            print(f"  [!] Upload status probe failed: {why}")
+            failures = self._back_off(failures, status)
+
+    def _send_chunk(self, fh, session_uri: str, offset: int):
+        fh.seek(offset)
+        data = fh.read(self.chunk_size)
+        end = offset + len(data) - 1
+        with metrics.span("api.upload.chunk", offset=offset, bytes=len(data)) as rec:
+            resp = self.session.put(
+                session_uri,
+                data=data,
+                headers={
+                    "Content-Length": str(len(data)),
+                    "Content-Range":  f"bytes {offset}-{end}/{self.size}",
+                },
+            )
+            rec["http_status"] = resp.status_code
+        self.bytes_sent += len(data)
+        return resp
+
+    def run(self, on_progress=None) -> dict:
+        """
+        Upload (or resume) the file and return the server's final JSON body.
+        `on_progress(offset, size)` is called after every acknowledged chunk.
+        """
+        state = self._load_state()
+        session_uri, offset, result = None, 0, None
+        if state and state.get("size") == self.size:
+            session_uri = state["session_uri"]
+            offset, result, _ = self._probe(session_uri)
+            if offset is None:
+                print("  [!] Upload session expired, starting over")
+                session_uri, offset = None, 0
+            elif result is None:
+                print(f"  -> Resuming upload at byte {offset}/{self.size}")
+        if result is not None:
+            self._clear_state()
+            return result
+        if session_uri is None:
+            session_uri = self._start_session()
+
+        failures = 0
+        with open(self.file_path, "rb") as fh:
+            while True:
+                try:
+                    resp = self._send_chunk(fh, session_uri, offset)
+                    status = resp.status_code
+                except OSError as e:
+                    resp, status = None, None
+                    print(f"  [!] Upload chunk failed: {e}")
+
+                if status in (200, 201):
+                    self._clear_state()
+                    return resp.json()
+
+                if status == 308:
+                    failures = 0
+                    offset = _parse_range(resp.headers.get("Range"))
+                    self._save_state(session_uri, offset)
+                    if on_progress:
+                        on_progress(offset, self.size)
+                    continue
+
+                if status in (404, 410):
+                    session_uri, offset = self._restart_session(), 0
+                    continue
+
+                if status is not None and status < 500 and status != 429:
+                    raise ResumableUploadError(status, resp.text)
+
+                # 5xx, 429 or a dropped connection: back off, then ask where we are
+                failures = self._back_off(failures, status)
+                offset, result, failures = self._probe(session_uri, failures)
+                if result is not None:
+                    self._clear_state()
+                    return result
+                if offset is None:
+                    session_uri, offset = self._restart_session(), 0
+                else:
+                    self._save_state(session_uri, offset)
+
+
+def pending_uploads(state_dir: str) -> list[dict]:
+    """
+    Return persisted upload states left behind by interrupted runs.
+    """
+    out = []
+    root = Path(state_dir)
+    if not root.is_dir():
+        return out
+    for p in sorted(root.glob("*.json")):
+        try:
+            state = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        state["state_path"] = str(p)
+        out.append(state)
+    return out
@@ -1,15 +1,14 @@
-import asyncio, base64, tempfile, os
+import asyncio, base64, tempfile, os, threading
 from pathlib import Path
-from playwright.async_api import async_playwright
 from PIL import Image, ImageDraw
+from . import metrics
 
-async def _render_svg_to_png(svg_path: str, out_png: str,
-                             width: int, height: int):
+def _html(svg_path: str, width: int, height: int) -> str:
     raw = Path(svg_path).read_bytes()
     b64 = base64.b64encode(raw).decode("ascii")
     data_uri = f"data:image/svg+xml;base64,{b64}"
 
-    html = f"""
+    return f"""
     <!doctype html>
         <html><body style="margin:0;padding:0;overflow:hidden">
             <img src="{data_uri}"
@@ -17,23 +16,131 @@ async def _render_svg_to_png(svg_path: str, out_png: str,
                 style="display:block;object-fit:none"/>
         </body></html>"""
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page(viewport={"width": width, "height": height})
-        await page.set_content(html)
+async def _screenshot(browser, svg_path: str, out_png: str,
+                      width: int, height: int):
+    page = await browser.new_page(viewport={"width": width, "height": height})
+    try:
+        await page.set_content(_html(svg_path, width, height))
         await page.wait_for_selector("img")
         await page.screenshot(path=out_png, omit_background=False)
+    finally:
+        await page.close()
+
+async def _render_svg_to_png(svg_path: str, out_png: str,
+                             width: int, height: int):
+    # imported lazily: playwright is only needed when a card is rendered
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        await _screenshot(browser, svg_path, out_png, width, height)
         await browser.close()
 
+
+class _WarmBrowser:
+    """
+    One Chromium kept running on its own event-loop thread, so a long-lived
+    process (src.worker) pays the launch once instead of once per card.
+    Renders from any thread are submitted to that loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="chromium", daemon=True).start()
+        self.pw = self.browser = None
+        self._call(self._launch())
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _launch(self):
+        from playwright.async_api import async_playwright
+        if self.pw is None:
+            self.pw = await async_playwright().start()
+        self.browser = await self.pw.chromium.launch()
+
+    async def _render(self, svg_path, out_png, width, height):
+        if not self.browser.is_connected():
+            await self._launch()  # Chromium crashed or was killed
+        await _screenshot(self.browser, svg_path, out_png, width, height)
+
+    def render(self, svg_path: str, out_png: str, width: int, height: int):
+        self._call(self._render(svg_path, out_png, width, height))
+
+    async def _close(self):
+        await self.browser.close()
+        await self.pw.stop()
+
+    def close(self):
+        try:
+            self._call(self._close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_warm: _WarmBrowser | None = None
+_warm_lock = threading.Lock()
+
+def start_browser():
+    """Launch the shared Chromium; later renders reuse it until stop_browser()."""
+    global _warm
+    with _warm_lock:
+        if _warm is None:
+            with metrics.span("chromium.launch"):
+                _warm = _WarmBrowser()
+
+def stop_browser():
+    global _warm
+    with _warm_lock:
+        if _warm is not None:
+            _warm.close()
+            _warm = None
+
 def render_full_svg(svg_path: str, temp_png: str,
                     width: int = 1457, height: int = 820):
-    asyncio.run(_render_svg_to_png(svg_path, temp_png, width, height))
+    if _warm is not None:
+        _warm.render(svg_path, temp_png, width, height)
+    else:
+        asyncio.run(_render_svg_to_png(svg_path, temp_png, width, height))
+
+def finish_card(img: Image.Image, out_png: str,
+                crop_x: int = 13, crop_y: int = 0,
+                crop_w: int = 1444, crop_h: int = 820,
+                target_w: int = 1080,
+                corner_radius: int = 50):
+    """
+    Crop the card out of a full-template render, resize it to target_w,
+    round its corners and save it. Shared by both card renderers.
+    """
+    # 2) crop
+    card = img.convert("RGBA").crop((crop_x, crop_y, crop_x + crop_w, crop_y + crop_h))
+
+    # 3) resize
+    scale = target_w / crop_w
+    new_h = int(crop_h * scale)
+    card = card.resize((target_w, new_h), Image.LANCZOS)
+
+    # 4) rounded mask
+    mask = Image.new("L", card.size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle(
+        [(0, 0), card.size],
+        radius=int(corner_radius * (target_w / crop_w)),
+        fill=255
+    )
+    card.putalpha(mask)
+
+    # 5) save
+    Path(out_png).parent.mkdir(parents=True, exist_ok=True)
+    # fast zlib level: the PNG is an intermediate read back once or twice
+    card.save(out_png, "PNG", compress_level=1)
 
 def svg_to_card_png(svg_path: str, out_png: str,
                     crop_x: int = 13, crop_y: int = 0,
                     crop_w: int = 1444, crop_h: int = 820,
                     target_w: int = 1080,
-                    corner_radius: int = 50):
+                    corner_radius: int = 50,
+                    tmp_dir: str | None = None):
     """
     1) Render full SVG -> temp.png
     2) Crop the card
@@ -42,33 +149,15 @@ def svg_to_card_png(svg_path: str, out_png: str,
     5) Save final PNG
     """
     # 1) temp render
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False, dir=tmp_dir)
     tmp.close()
     try:
-        render_full_svg(svg_path, tmp.name, width=crop_x+crop_w, height=crop_h)
-
-        # 2) crop
-        img = Image.open(tmp.name).convert("RGBA")
-        card = img.crop((crop_x, crop_y, crop_x + crop_w, crop_y + crop_h))
-
-        # 3) resize
-        scale = target_w / crop_w
-        new_h = int(crop_h * scale)
-        card = card.resize((target_w, new_h), Image.LANCZOS)
-
-        # 4) rounded mask
-        mask = Image.new("L", card.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle(
-            [(0, 0), card.size],
-            radius=int(corner_radius * (target_w / crop_w)),
-            fill=255
-        )
-        card.putalpha(mask)
-
-        # 5) save
-        Path(out_png).parent.mkdir(parents=True, exist_ok=True)
-        card.save(out_png, "PNG")
+        with metrics.span("chromium.rasterize"):
+            render_full_svg(svg_path, tmp.name, width=crop_x+crop_w, height=crop_h)
+
+        # 2-5) crop, resize, round corners, save
+        with Image.open(tmp.name) as img:
+            finish_card(img, out_png, crop_x, crop_y, crop_w, crop_h, target_w, corner_radius)
 
     finally:
         try:
@@ -1,8 +1,12 @@
 import re
 import html
+import bisect
+from dataclasses import dataclass, field
+from typing import Callable
+from .config import settings
 
 # regex matching all emoji ranges
-_EMOJI_PATTERN = re.compile(
+_EMOJI_CLASS = (
     r"["
     r"\U0001F600-\U0001F64F"
     r"\U0001F300-\U0001F5FF"
@@ -10,65 +14,288 @@ _EMOJI_PATTERN = re.compile(
     r"\U0001F1E0-\U0001F1FF"
     r"\u2600-\u26FF"
     r"\u2700-\u27BF"
-    r"]+",
-    flags=re.UNICODE
+    r"]+"
 )
+_EMOJI_PATTERN = re.compile(_EMOJI_CLASS, flags=re.UNICODE)
 
+# Matched as whole words, case-insensitively; when two entries differ only
+# in case the first one wins (so "js" reads as "just saying").
 ABBREVIATIONS = {
-    r'\bTIFU\b': 'Today I Effed Up',
-    r'\bTIL\b':  'Today I Learned',
-    r'\bAMA\b':  'Ask Me Anything',
-    r'\bELI5\b': "Explain Like I'm Five",
-    r'\bIDK\b':  "I don't know",
-    r'\bIMO\b':  "in my opinion",
-    r'\bIMHO\b': "in my honest opinion",
-    r'\bFYI\b':  "for your information",
-    r'\bBTW\b':  "by the way",
-    r'\bASAP\b': "as soon as possible",
-    r'\bGTG\b':  "got to go",
-    r'\bICYMI\b': "in case you missed it",
-    r'\bSMH\b':  "shaking my head",
-    r'\bAFAIK\b': "as far as I know",
-    r'\bOP\b':   "original poster",
-    r'\bNSFW\b': "not safe for work",
-    r'\bFOMO\b': "fear of missing out",
-    r'\bYOLO\b': "you only live once",
-    r'\bIRL\b':  "in real life",
-    r'\bJK\b':   "just kidding",
-    r'\bNVM\b':  "never mind",
-    r'\bTBA\b':  "to be announced",
-    r'\bTBD\b':  "to be determined",
-    r'\bRN\b':   "right now",
-    r'\bICYDK\b': "in case you didn't know",
-    r'\bBFF\b':  "best friends forever",
-    r'\bIDC\b':  "I don't care",
-    r'\bIDGAF\b': "I don't give an F",
-    r'\bJS\b':   "just saying",
-    r'\bjs\b':   "just",
-    r'\bbc\b':   "because",
+    'TIFU':  'Today I Effed Up',
+    'TIL':   'Today I Learned',
+    'AMA':   'Ask Me Anything',
+    'ELI5':  "Explain Like I'm Five",
+    'IDK':   "I don't know",
+    'IMO':   "in my opinion",
+    'IMHO':  "in my honest opinion",
+    'FYI':   "for your information",
+    'BTW':   "by the way",
+    'ASAP':  "as soon as possible",
+    'GTG':   "got to go",
+    'ICYMI': "in case you missed it",
+    'SMH':   "shaking my head",
+    'AFAIK': "as far as I know",
+    'OP':    "original poster",
+    'NSFW':  "not safe for work",
+    'FOMO':  "fear of missing out",
+    'YOLO':  "you only live once",
+    'IRL':   "in real life",
+    'JK':    "just kidding",
+    'NVM':   "never mind",
+    'TBA':   "to be announced",
+    'TBD':   "to be determined",
+    'RN':    "right now",
+    'ICYDK': "in case you didn't know",
+    'BFF':   "best friends forever",
+    'IDC':   "I don't care",
+    'IDGAF': "I don't give an F",
+    'JS':    "just saying",
+    'js':    "just",
+    'bc':    "because",
 }
 
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    One normalization rule. `pattern` becomes the named group `name` in the
+    engine's combined regex, so any inner groups must be named with a
+    `name_` prefix to stay unique. `replace(match, engine)` returns the
+    replacement text and may call engine.normalize() on inner text.
+    """
+    name: str
+    pattern: str
+    replace: Callable[[re.Match, "NormalizationEngine"], str]
+
+
+class NormalizationEngine:
+    """
+    Applies a list of rules in a single left-to-right scan: all patterns are
+    joined into one alternation and each match is dispatched on the name of
+    the rule that produced it. Where two rules could match at the same
+    position, the one listed first wins.
+    """
+
+    def __init__(self, rules: list[Rule], abbreviations: dict[str, str] | None = None):
+        self.rules = {r.name: r for r in rules}
+        self.abbreviations: dict[str, str] = {}
+        for key, full in (abbreviations if abbreviations is not None else ABBREVIATIONS).items():
+            self.abbreviations.setdefault(key.lower(), full)
+        self._regex = re.compile("|".join(f"(?P<{r.name}>{r.pattern})" for r in rules))
+
+    def _dispatch(self, m: re.Match) -> str:
+        return self.rules[m.lastgroup].replace(m, self)
+
+    def normalize(self, text: str) -> str:
+        return self._regex.sub(self._dispatch, text)
+
+
+# ---- core rules (the historical translate_phrases + clean_markdown) ----
+
+def _trie_pattern(words: list[str]) -> str:
+    """
+    Alternation of `words` factored by common prefix (a|b(?:c|ff|tw)|...),
+    which re backtracks through far faster than a flat word list.
+    """
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+def _abbreviation_rule(abbreviations: dict[str, str]) -> Rule:
+    words = {k.lower() for k in abbreviations}
+    return Rule(
+        "abbrev",
+        r"(?i:\b" + _trie_pattern(sorted(words)) + r"\b)",
+        lambda m, eng: eng.abbreviations[m.group().lower()],
+    )
+
+def _inner(group: str):
+    # replace the whole match with the normalized text of one of its groups
+    return lambda m, eng: eng.normalize(m.group(group))
+
+MARKDOWN_RULES = [
+    Rule("fence",  r"(?s:```.*?```)",                                   lambda m, eng: ""),
+    Rule("code",   r"`(?P<code_body>[^`]+)`",                           _inner("code_body")),
+    Rule("link",   r"\[(?P<link_text>[^\]]+)\]\([^)]+\)",               _inner("link_text")),
+    Rule("emph",   r"(?P<emph_mark>\*{1,3}|_{1,3})(?P<emph_body>.*?)(?P=emph_mark)", _inner("emph_body")),
+    Rule("quote",  r"(?m:^>\s*)",                                       lambda m, eng: ""),
+]
+
+ENTITY_RULE = Rule(
+    "entity", r"&(?:#[xX]?[0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);?", lambda m, eng: html.unescape(m.group())
+)
+EMOJI_RULE = Rule("emoji", _EMOJI_CLASS, lambda m, eng: "")
+
+# ---- optional rules, enabled by name via settings.text_rules ----
+
+_MAGNITUDE = {"k": "thousand", "m": "million", "b": "billion"}
+_CURRENCY = {"$": "dollar", "£": "pound", "€": "euro"}
+_LATIN = {"e.g.": "for example", "i.e.": "that is", "etc.": "et cetera", "vs.": "versus"}
+
+
+def _say_currency(m: re.Match, eng) -> str:
+    amount = m.group("cur_amount").replace(",", "")
+    mag = (m.group("cur_mag") or "").lower()
+    unit = _CURRENCY[m.group("cur_sym")]
+    plural = "" if amount == "1" and not mag else "s"
+    return " ".join(filter(None, [amount, _MAGNITUDE.get(mag), unit + plural]))
+
+
+def _say_number(m: re.Match, eng) -> str:
+    amount = m.group("num_amount").replace(",", "")
+    mag = (m.group("num_mag") or "").lower()
+    return f"{amount} {_MAGNITUDE[mag]}" if mag else amount
+
+
+def _say_acronym(m: re.Match, eng) -> str:
+    # dotted acronyms would otherwise be split into sentences at every "."
+    word = m.group()
+    return _LATIN.get(word.lower()) or word.replace(".", "").upper()
+
+
+OPTIONAL_RULES = {
+    "urls":       Rule("url", r"\bhttps?://\S+|\bwww\.\S+", lambda m, eng: "a link"),
+    "currencies": Rule(
+        "cur", r"(?P<cur_sym>[$£€])(?P<cur_amount>\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(?P<cur_mag>[kKmMbB]\b)?",
+        _say_currency,
+    ),
+    "numbers":    Rule(
+        "num", r"\b(?P<num_amount>\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(?P<num_mag>[kKmMbB]\b)?",
+        _say_number,
+    ),
+    "acronyms":   Rule(
+        "acro", r"(?<![\w.])(?:e\.g\.|i\.e\.|etc\.|vs\.|(?:[A-Za-z]\.){2,})", _say_acronym
+    ),
+}
+
+
+def build_engine(optional: list[str] | None = None, abbreviations: dict[str, str] | None = None) -> NormalizationEngine:
+    """
+    Engine with the markdown, entity, emoji and abbreviation rules plus the
+    named optional rules (default: settings.text_rules, comma-separated).
+    """
+    if optional is None:
+        optional = [s.strip() for s in settings.text_rules.split(",") if s.strip()]
+    unknown = set(optional) - set(OPTIONAL_RULES)
+    if unknown:
+        raise ValueError(f"Unknown text rules: {', '.join(sorted(unknown))}")
+    abbreviations = abbreviations if abbreviations is not None else ABBREVIATIONS
+    rules = [
+        *MARKDOWN_RULES,
+        *(OPTIONAL_RULES[name] for name in OPTIONAL_RULES if name in optional),
+        ENTITY_RULE,
+        EMOJI_RULE,
+        _abbreviation_rule(abbreviations),
+    ]
+    return NormalizationEngine(rules, abbreviations)
+
+
+_engines: dict[str, NormalizationEngine] = {}
+
+def _engine(key: str, factory) -> NormalizationEngine:
+    if key not in _engines:
+        _engines[key] = factory()
+    return _engines[key]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Expand abbreviations, strip markdown, entities and emojis (plus any
+    optional rules) in one pass over the text.
+    """
+    return _engine("full", build_engine).normalize(text).strip()
+
+
 def remove_emojis(text: str) -> str:
     return _EMOJI_PATTERN.sub("", text)
 
 
 def translate_phrases(text: str) -> str:
-    for pat, full in ABBREVIATIONS.items():
-        text = re.sub(pat, full, text, flags=re.IGNORECASE)
-    return text
+    return _engine("abbrev", lambda: NormalizationEngine([_abbreviation_rule(ABBREVIATIONS)])).normalize(text)
 
 
 def clean_markdown(text: str) -> str:
-    text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
-    text = re.sub(r'(\*{1,3}|_{1,3})(.*?)\1', r'\2', text)
-    text = re.sub(r'(?m)^>\s*', '', text)
-    text = html.unescape(text).strip()
-    # remove emojis after markdown clean
-    return remove_emojis(text)
+    return _engine("markdown", lambda: NormalizationEngine([*MARKDOWN_RULES, ENTITY_RULE, EMOJI_RULE], {})).normalize(text).strip()
 
 
 def split_sentences(text: str) -> list[str]:
     parts = re.split(r'(?:(?<=[\.!?])|(?<=  ))\s+', text.replace('\n','  ').strip())
     return [p for p in parts if re.search(r'\w', p)]
+
+
+@dataclass
+class Chunk:
+    """
+    One TTS request: one or more whole sentences joined by spaces, or a
+    piece of one long sentence. `spans[i]` is the (start, end) character
+    range of sentence `sids[i]` within `text`.
+    """
+    text: str
+    sids: list[int] = field(default_factory=list)
+    spans: list[tuple[int, int]] = field(default_factory=list)
+
+    def sid_at(self, pos: int) -> int:
+        """Sentence id of the character at `pos` in `text`."""
+        i = bisect.bisect_right([start for start, _ in self.spans], pos) - 1
+        return self.sids[max(0, i)]
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    # cut at the last clause boundary in the second half of the budget,
+    # else at the last space
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = max(sentence.rfind(sep, max_chars // 2, max_chars) for sep in (", ", "; ", ": ", " - "))
+        cut = cut + 1 if cut > 0 else sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def plan_chunks(
+    sentences: list[str],
+    target_chars: int | None = None,
+    max_chars: int | None = None
+) -> list[Chunk]:
+    """
+    Group sentences into TTS requests of up to `target_chars`, splitting any
+    sentence longer than `max_chars` at clause or word boundaries. Sentence 0
+    (the title) is always a chunk of its own, so the first chunk's audio
+    length is the duration the card stays on screen.
+    """
+    target_chars = target_chars or settings.tts_chunk_target_chars
+    max_chars = max(target_chars, max_chars or settings.tts_chunk_max_chars)
+
+    chunks: list[Chunk] = []
+    cur: Chunk | None = None
+    for sid, sent in enumerate(sentences):
+        if sid == 0:
+            chunks.append(Chunk(sent, [0], [(0, len(sent))]))
+            continue
+        for piece in _split_long(sent, max_chars):
+            if cur is not None and len(cur.text) + 1 + len(piece) <= target_chars:
+                start = len(cur.text) + 1
+                cur.text += " " + piece
+            else:
+                cur = Chunk(piece)
+                chunks.append(cur)
+                start = 0
+            cur.sids.append(sid)
+            cur.spans.append((start, start + len(piece)))
+    return chunks
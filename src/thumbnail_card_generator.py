@@ -2,6 +2,7 @@
 import os
 import base64
 import xml.etree.ElementTree as ET
+from functools import lru_cache
 from PIL import ImageFont, ImageDraw, Image
 
 SVG_NS = "http://www.w3.org/2000/svg"
@@ -9,6 +10,78 @@ ET.register_namespace("", SVG_NS)
 ns = {"svg": SVG_NS}
 
 
+# Template bytes, the embedded font CSS and PIL fonts are loaded once per
+# process; every card still gets its own parsed tree to modify.
+@lru_cache(maxsize=8)
+def _template_bytes(template_svg: str) -> bytes:
+    with open(template_svg, "rb") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=8)
+def _font_face_css(font_path: str) -> str:
+    font_data = base64.b64encode(open(font_path, "rb").read()).decode("ascii")
+    fam = os.path.splitext(os.path.basename(font_path))[0]
+    return (
+        f"@font-face{{"
+        f"  font-family:'{fam}';"
+        f"  src:url('data:font/truetype;base64,{font_data}') format('truetype');"
+        f"}}"
+    )
+
+
+@lru_cache(maxsize=16)
+def _font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size)
+
+
+# Text shown on the subreddit line (the channel name)
+SUBREDDIT_LABEL = "Redditourium"
+# Title line height relative to the font size
+LINE_HEIGHT = 1.2
+# Titles longer than this grow the card by a line per extra THRESHOLD chars
+GROW_THRESHOLD = 120
+
+
+def wrap_title(title: str, font_path: str, font_size: int, max_w: float) -> list[str]:
+    """Greedy word wrap of the title to max_w pixels using the font's metrics."""
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    font = _font(font_path, font_size)
+    words, line, lines = title.split(), "", []
+    for w in words:
+        test = (line + " " + w) if line else w
+        bb   = draw.textbbox((0,0), test, font=font)
+        if bb[2] - bb[0] <= max_w:
+            line = test
+        else:
+            if line:
+                lines.append(line)
+            line = w
+    if line:
+        lines.append(line)
+    return lines
+
+
+def text_width(text: str, font_path: str, font_size: int) -> float:
+    bb = ImageDraw.Draw(Image.new("RGB", (1, 1))).textbbox((0, 0), text, font=_font(font_path, font_size))
+    return bb[2] - bb[0]
+
+
+def card_growth(title: str, title_font_size: int) -> float:
+    """Extra card height (px) for long titles."""
+    if len(title) <= GROW_THRESHOLD:
+        return 0.0
+    return (len(title) - 1) // GROW_THRESHOLD * title_font_size * LINE_HEIGHT
+
+
+def warm_caches(template_svg: str, font_path: str, *font_sizes: int) -> None:
+    """Load the template and fonts ahead of the first card (worker mode)."""
+    _template_bytes(template_svg)
+    _font_face_css(font_path)
+    for size in font_sizes:
+        _font(font_path, size)
+
+
 def generate_svg(
     template_svg: str,
     output_svg: str,
@@ -21,18 +94,12 @@ def generate_svg(
     padding_px: int = 32
 ):
     # 1) parse the SVG
-    tree = ET.parse(template_svg)
-    root = tree.getroot()
+    root = ET.fromstring(_template_bytes(template_svg))
+    tree = ET.ElementTree(root)
 
     # 2) embed the font via base64 @font-face so viewers will render it
-    font_data = base64.b64encode(open(font_path, "rb").read()).decode("ascii")
     fam = os.path.splitext(os.path.basename(font_path))[0]
-    css = (
-        f"@font-face{{"
-        f"  font-family:'{fam}';"
-        f"  src:url('data:font/truetype;base64,{font_data}') format('truetype');"
-        f"}}"
-    )
+    css = _font_face_css(font_path)
     defs = root.find("svg:defs", ns)
     if defs is None:
         defs = ET.SubElement(root, "defs")
@@ -61,7 +128,7 @@ def generate_svg(
         "font-family": fam,
         "font-size":   str(sub_font_size),
     })
-    new_sub.text = f"Redditourium"
+    new_sub.text = SUBREDDIT_LABEL
 
     # 6) wrap & write post title tspans
     orig = title_el.find("svg:tspan", ns)
@@ -70,24 +137,9 @@ def generate_svg(
         title_el.remove(c)
 
     max_w = card_end - tx - padding_px
-    dummy = Image.new("RGB", (1,1))
-    draw = ImageDraw.Draw(dummy)
-    ftitle = ImageFont.truetype(font_path, title_font_size)
+    lines = wrap_title(title, font_path, title_font_size, max_w)
 
-    words, line, lines = title.split(), "", []
-    for w in words:
-        test = (line + " " + w) if line else w
-        bb   = draw.textbbox((0,0), test, font=ftitle)
-        if bb[2] - bb[0] <= max_w:
-            line = test
-        else:
-            if line:
-                lines.append(line)
-            line = w
-    if line:
-        lines.append(line)
-
-    line_h = title_font_size * 1.2
+    line_h = title_font_size * LINE_HEIGHT
     for i, ln in enumerate(lines):
         y = ty + i * line_h
         ET.SubElement(title_el, "tspan", {
@@ -98,9 +150,7 @@ def generate_svg(
         }).text = ln
 
     # 7) reposition checkmark horizontally
-    fsub = ImageFont.truetype(font_path, sub_font_size)
-    bsub = draw.textbbox((0,0), new_sub.text, font=fsub)
-    wsub = bsub[2] - bsub[0]
+    wsub = text_width(new_sub.text, font_path, sub_font_size)
     if chk_el is not None:
         if verified:
             chk_el.set("x", str(sx + wsub + padding_px))
@@ -110,11 +160,8 @@ def generate_svg(
                 grp.remove(chk_el)
 
     # 8) dynamically grow card and shift footer if title is long
-    THRESHOLD = 120
-    if len(title) > THRESHOLD:
-        extra_lines = (len(title) - 1) // THRESHOLD
-        extra_h = extra_lines * line_h
-
+    extra_h = card_growth(title, title_font_size)
+    if extra_h:
         # a) grow SVG canvas
         svg_w = float(root.get("width"))
         svg_h = float(root.get("height"))
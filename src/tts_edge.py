@@ -4,6 +4,8 @@ import asyncio
 import edge_tts
 from pydub import AudioSegment, silence
 from .config import settings
+from .text_processing import Chunk
+from . import metrics
 
 # Read desired speaking rate from env (e.g. "+50%", "-20%", "1.2")
 EDGE_TTS_RATE = settings.edge_tts_rate
@@ -39,13 +41,13 @@ def _trim_and_pad(
     pad = AudioSegment.silent(duration=pad_ms, frame_rate=audio.frame_rate)
     return pad + core + pad
 
-def synthesize_sentences(
-    sentences: list[str],
+def synthesize_chunks(
+    chunks: list[Chunk],
     out_dir: str,
     voice: str
 ) -> list[tuple[str,int]]:
     """
-    Generate per-sentence WAVs:
+    Generate one WAV per chunk (see text_processing.plan_chunks):
      1. Synthesize to MP3 with edge-tts at EDGE_TTS_RATE and chosen voice
      2. Convert to WAV, trim/pad
     Returns list of (wav_path, duration_ms).
@@ -53,10 +55,13 @@ def synthesize_sentences(
     os.makedirs(out_dir, exist_ok=True)
     results: list[tuple[str,int]] = []
 
-    for i, sent in enumerate(sentences):
+    for i, chunk in enumerate(chunks):
+        sent = chunk.text
         mp3_path = os.path.join(out_dir, f"{i:03d}.mp3")
         # 1) raw TTS with rate & voice control
-        asyncio.run(_synthesize_raw(sent, mp3_path, voice))
+        with metrics.span("tts.edge", chars=len(sent)) as rec:
+            asyncio.run(_synthesize_raw(sent, mp3_path, voice))
+            rec["bytes"] = os.path.getsize(mp3_path)
 
         # 2) load, trim silence, pad ends
         audio = AudioSegment.from_file(mp3_path)
@@ -1,99 +1,202 @@
+import bisect
 import os
+import re
 import base64
+import random
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 from elevenlabs import ElevenLabs, VoiceSettings
+from elevenlabs.core import ApiError
 from pydub import AudioSegment
 from .config import settings
+from .text_processing import Chunk
+from . import metrics
 
-def synthesize_with_elevenlabs(sentences: list[str], out_dir: str = "audio_chunks") -> tuple[list[tuple[str,int]], list[dict]]:
+_WORD = re.compile(r"\S+")
+
+_client_lock = threading.Lock()
+_client: ElevenLabs | None = None
+
+
+def get_client() -> ElevenLabs:
     """
-    Generates speech via ElevenLabs (with timestamps), saves MP3/WAV,
-    and returns both a list of (wav_path, duration_ms) tuples and word-level timing data.
+    Process-wide ElevenLabs client, so its HTTP connection pool is reused
+    across requests and runs.
     """
-    client = ElevenLabs(api_key=settings.elevenlabs_api_key)
-    os.makedirs(out_dir, exist_ok=True)
+    global _client
+    with _client_lock:
+        if _client is None:
+            kwargs = {"api_key": settings.elevenlabs_api_key}
+            if settings.elevenlabs_base_url:
+                kwargs["base_url"] = settings.elevenlabs_base_url
+            _client = ElevenLabs(**kwargs)
+        return _client
+
+
+def _payload(text: str) -> str:
+    # Build SSML-wrapped text if SSML usage is enabled
+    if not settings.elevenlabs_use_ssml:
+        return text
+    # Wrap each chunk with prosody rate and automatic pause
+    return (
+        f"<speak>"
+        f"<prosody rate=\"{settings.elevenlabs_prosody_rate}\">{text}</prosody>"
+        f"<break time=\"100ms\"/>"
+        f"</speak>"
+    )
+
+
+def _retry_after(e: ApiError, attempt: int) -> float:
+    headers = getattr(e, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 30) * (0.5 + random.random() / 2)
 
-    wav_infos = []
-    all_words = []
-    offset = 0
 
-    for sid, sent in enumerate(sentences):
-        # Build SSML-wrapped text if SSML usage is enabled
-        if settings.elevenlabs_use_ssml:
-            # Wrap each sentence with prosody rate and automatic pause
-            text_payload = (
-                f"<speak>"
-                f"<prosody rate=\"{settings.elevenlabs_prosody_rate}\">{sent}</prosody>"
-                f"<break time=\"100ms\"/>"
-                f"</speak>"
+def _convert(text_payload: str, output_format: str):
+    """
+    One convert_with_timestamps call; 429 (rate or concurrency limit) and 5xx
+    responses are retried with backoff.
+    """
+    vs = VoiceSettings(
+        stability=settings.elevenlabs_stability,
+        similarity_boost=settings.elevenlabs_similarity_boost
+    )
+    for attempt in range(settings.elevenlabs_max_retries + 1):
+        try:
+            return get_client().text_to_speech.convert_with_timestamps(
+                voice_id=settings.elevenlabs_voice_id,
+                text=text_payload,
+                voice_settings=vs,
+                output_format=output_format
             )
-        else:
-            text_payload = sent
-
-        # Prepare voice settings
-        vs = VoiceSettings(
-            stability=settings.elevenlabs_stability,
-            similarity_boost=settings.elevenlabs_similarity_boost
-        )
-
-        # Generate audio with timestamps (SSML auto-detected)
-        resp = client.text_to_speech.convert_with_timestamps(
-            voice_id=settings.elevenlabs_voice_id,
-            text=text_payload,
-            voice_settings=vs
-        )
-
-        # Decode base64-encoded MP3
+        except ApiError as e:
+            status = e.status_code or 0
+            if (status != 429 and status < 500) or attempt == settings.elevenlabs_max_retries:
+                raise
+            delay = _retry_after(e, attempt)
+            metrics.count("tts.elevenlabs.retries")
+            print(f"  [!] ElevenLabs HTTP {status}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _words(chunk: Chunk, chars: list[str], starts: list[float], ends: list[float], sid_at_time) -> list[dict]:
+    """
+    Group the character alignment into words with chunk-relative ms times.
+    Words are found with one regex pass over the joined characters; each
+    word's sentence id is that of the original text spoken at its midpoint
+    (`sid_at_time(seconds)`).
+    """
+    text = "".join(chars)
+    # offset in `text` where each alignment entry begins
+    offsets = list(accumulate(map(len, chars), initial=0))
+
+    def owner(k: int) -> int:
+        return bisect.bisect_right(offsets, k) - 1
+
+    words = []
+    for m in _WORD.finditer(text):
+        start, end = starts[owner(m.start())], ends[owner(m.end() - 1)]
+        words.append({
+            "word":  m.group(),
+            "start": start * 1000,
+            "end":   end * 1000,
+            "sid":   sid_at_time((start + end) / 2),
+        })
+    return words
+
+
+def _sid_lookup(chunk: Chunk, payload: str, alignment):
+    """
+    Map a time (s) to the sentence id of the chunk character being spoken
+    then, from the alignment of the original payload characters. The
+    normalized alignment ("$5" read as "five dollars") expands unevenly, so
+    its positions cannot index chunk.text; times are shared by both.
+    """
+    if not alignment or not alignment.characters:
+        return lambda t: chunk.sid_at(0)
+    prefix = max(0, payload.find(chunk.text))  # SSML wrapper before the text
+    offsets = list(accumulate(map(len, alignment.characters), initial=0))
+    starts = alignment.character_start_times_seconds
+    last = len(chunk.text) - 1
+
+    def sid_at_time(t: float) -> int:
+        i = max(0, bisect.bisect_right(starts, t) - 1)
+        return chunk.sid_at(min(max(0, offsets[i] - prefix), last))
+    return sid_at_time
+
+
+def _write_pcm_wav(wav_path: str, pcm: bytes, rate: int) -> int:
+    """
+    Wrap raw 16-bit mono PCM in a WAV header; returns the duration in ms
+    computed from the sample count.
+    """
+    with wave.open(wav_path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return round(len(pcm) // 2 * 1000 / rate)
+
+
+def _synthesize_chunk(cid: int, chunk: Chunk, out_dir: str) -> tuple[str, int, list[dict]]:
+    text_payload = _payload(chunk.text)
+    output_format = settings.elevenlabs_output_format
+
+    # Generate audio with timestamps (SSML auto-detected)
+    with metrics.span("tts.elevenlabs", chars=len(text_payload), chunk=cid, format=output_format) as rec:
+        resp = _convert(text_payload, output_format)
+
+        # Decode base64-encoded audio (raw PCM or MP3, per output_format)
         audio_bytes = base64.b64decode(resp.audio_base_64)
-        mp3_path = os.path.join(out_dir, f"{sid:03d}.mp3")
+        rec["bytes"] = len(audio_bytes)
+
+    wav_path = os.path.join(out_dir, f"{cid:03d}.wav")
+    if output_format.startswith("pcm_"):
+        # pcm_<rate>: 16-bit little-endian mono, no decode needed
+        dur = _write_pcm_wav(wav_path, audio_bytes, int(output_format.split("_")[1]))
+    else:
+        mp3_path = os.path.join(out_dir, f"{cid:03d}.mp3")
         with open(mp3_path, "wb") as f:
             f.write(audio_bytes)
 
         # Convert MP3 to WAV and measure duration
-        wav_path = os.path.join(out_dir, f"{sid:03d}.wav")
-        AudioSegment.from_file(mp3_path).export(wav_path, format="wav")
-        dur = len(AudioSegment.from_file(wav_path))
-
-        # Character-level alignment
-        na = resp.normalized_alignment
-        chars = na.characters
-        starts = na.character_start_times_seconds
-        ends = na.character_end_times_seconds
-
-        # Group characters into word timestamps
-        word_chars = []
-        word_start = None
-        for ch, st, et in zip(chars, starts, ends):
-            if ch.isspace():
-                if word_chars:
-                    word = "".join(word_chars)
-                    start_ms = word_start * 1000
-                    end_ms = prev_end * 1000
-                    all_words.append({
-                        "word": word,
-                        "start": start_ms + offset,
-                        "end": end_ms + offset,
-                        "sid": sid
-                    })
-                    word_chars = []
-                    word_start = None
-                continue
-            if word_start is None:
-                word_start = st
-            word_chars.append(ch)
-            prev_end = et
-
-        # Append final word of the sentence
-        if word_chars:
-            word = "".join(word_chars)
-            start_ms = word_start * 1000
-            end_ms = prev_end * 1000
-            all_words.append({
-                "word": word,
-                "start": start_ms + offset,
-                "end": end_ms + offset,
-                "sid": sid
-            })
+        seg = AudioSegment.from_file(mp3_path)
+        seg.export(wav_path, format="wav")
+        dur = len(seg)
 
+    # timings from what was spoken, sentence ids from the text we sent
+    na = resp.normalized_alignment or resp.alignment
+    sid_at_time = _sid_lookup(chunk, text_payload, resp.alignment)
+    words = _words(chunk, na.characters, na.character_start_times_seconds, na.character_end_times_seconds, sid_at_time)
+    return wav_path, dur, words
+
+
+def synthesize_with_elevenlabs(chunks: list[Chunk], out_dir: str = "audio_chunks") -> tuple[list[tuple[str,int]], list[dict]]:
+    """
+    Generates speech via ElevenLabs (with timestamps), one request per chunk,
+    up to settings.elevenlabs_concurrency at a time. Returns a list of
+    (wav_path, duration_ms) tuples and word-level timing data tagged with
+    each word's sentence id; offsets are applied once all chunks are back.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    workers = max(1, min(settings.elevenlabs_concurrency, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: _synthesize_chunk(*job, out_dir), enumerate(chunks)))
+
+    wav_infos = []
+    all_words = []
+    offset = 0
+    for wav_path, dur, words in results:
+        for w in words:
+            w["start"] += offset
+            w["end"] += offset
+        all_words.extend(words)
         wav_infos.append((wav_path, dur))
         offset += dur
 
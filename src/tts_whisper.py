@@ -1,48 +1,162 @@
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import whisper
 from .config import settings
-from .audio import combine_wavs
-from .tts_edge import synthesize_sentences
+from .tts_edge import synthesize_chunks
+from .text_processing import Chunk
+from . import metrics
+
+# how far ahead the matcher looks for a matching word after a mismatch
+RESYNC_WINDOW = 4
+
+_local = threading.local()
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _model():
+    # one model per worker thread; whisper models are not safe to share
+    if getattr(_local, "model", None) is None:
+        with metrics.span("tts.whisper.load_model", model=settings.whisper_model):
+            _local.model = whisper.load_model(settings.whisper_model)
+    return _local.model
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    # kept for the life of the process so each thread's model stays loaded
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, settings.whisper_workers),
+                                       thread_name_prefix="whisper")
+        return _pool
+
+
+def preload() -> None:
+    """
+    Load a model on every transcription thread ahead of the first job.
+    The barrier makes each task wait until all threads hold one.
+    """
+    n = max(1, settings.whisper_workers)
+    barrier = threading.Barrier(n)
+
+    def load(_):
+        _model()
+        barrier.wait()
+
+    list(_get_pool().map(load, range(n)))
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _fill(tokens: list[tuple[str, int]], start: float, end: float) -> list[dict]:
+    """
+    Spread unmatched tokens evenly over [start, end], weighted by length.
+    """
+    total = sum(len(w) for w, _ in tokens) or 1
+    out, t = [], start
+    for w, sid in tokens:
+        step = (end - start) * len(w) / total
+        out.append({"word": w, "start": t, "end": t + step, "sid": sid})
+        t += step
+    return out
+
+
+def align_words(tokens: list[tuple[str, int]], recognized: list[dict], duration_ms: float) -> list[dict]:
+    """
+    Map recognized words ({word, start, end} in ms) onto our own tokens
+    ((word, sid) in text order), keeping our spelling and sentence ids.
+
+    Linear anchored walk: equal words are paired; on a mismatch the next
+    RESYNC_WINDOW positions on both sides are searched for the nearest
+    common word. Our tokens skipped to reach it are spread over the gap,
+    extra recognized words are dropped, and if nothing matches the pair is
+    treated as a substitution.
+    """
+    out: list[dict] = []
+    i = j = 0
+    last_end = 0.0
+    ours = [_norm(w) for w, _ in tokens]
+    theirs = [_norm(r["word"]) for r in recognized]
+
+    while i < len(tokens) and j < len(recognized):
+        if ours[i] != theirs[j]:
+            best = None
+            for a in range(RESYNC_WINDOW + 1):
+                for b in range(RESYNC_WINDOW + 1):
+                    if (a or b) and i + a < len(ours) and j + b < len(theirs) and ours[i + a] == theirs[j + b]:
+                        if best is None or a + b < sum(best):
+                            best = (a, b)
+            if best is None:
+                best = (0, 0)  # substitution: take the recognized timing as-is
+            a, b = best
+            if a:
+                gap_end = recognized[j + b]["start"]
+                out += _fill(tokens[i:i + a], last_end, max(last_end, gap_end))
+                i += a
+            j += b
+        r = recognized[j]
+        start = max(last_end, r["start"])
+        end = max(start, r["end"])
+        out.append({"word": tokens[i][0], "start": start, "end": end, "sid": tokens[i][1]})
+        last_end = end
+        i += 1
+        j += 1
+
+    if i < len(tokens):
+        out += _fill(tokens[i:], last_end, max(last_end, duration_ms))
+    return out
+
+
+def _transcribe(path: str) -> list[dict]:
+    result = _model().transcribe(path, word_timestamps=True, verbose=False, language="en")
+    return [
+        {"word": w["word"].strip(), "start": w["start"] * 1000, "end": w["end"] * 1000}
+        for seg in result["segments"] for w in seg["words"]
+    ]
 
 
 def synthesize_with_whisper(
-    sentences: list[str],
+    chunks: list[Chunk],
     out_dir: str,
     voice: str
 ) -> tuple[list[tuple[str, int]], list[dict]]:
     """
-    Generate per-sentence wavs via edge_tts (reuse your tts_edge module)
-    combine_wavs into settings.audio_wav
-    run whisper tiny.en with word_timestamps
-    return (wav_infos, all_words) where all_words is same format as ElevenLabs
+    Generate per-chunk wavs via edge_tts (reuse your tts_edge module),
+    transcribe each chunk's wav with word timestamps (settings.whisper_workers
+    at a time), map the recognized words back onto the chunk's own text and
+    shift them by the chunk's offset.
+    Returns (wav_infos, all_words) where all_words is same format as ElevenLabs.
     """
     os.makedirs(out_dir, exist_ok=True)
 
     # 1) Make the chunks using Edge TTS with the chosen voice
-    wav_infos = synthesize_sentences(sentences, out_dir, voice)
+    wav_infos = synthesize_chunks(chunks, out_dir, voice)
 
-    # 2) Merge into single WAV
-    combine_wavs(wav_infos, settings.audio_mp3, settings.audio_wav)
+    # 2) Transcribe each chunk on its own
+    def transcribe(cid: int) -> list[dict]:
+        with metrics.span("tts.whisper.transcribe", chunk=cid):
+            return _transcribe(wav_infos[cid][0])
 
-    # 3) Transcribe + align
-    model = whisper.load_model("tiny.en")
-    result = model.transcribe(
-        settings.audio_wav,
-        word_timestamps=True,
-        verbose=False
-    )
+    recognized = list(_get_pool().map(transcribe, range(len(chunks))))
 
-    # 4) Flatten to [{word, start (ms), end (ms), sid}, …]
+    # 3) Align onto our tokens and flatten to [{word, start (ms), end (ms), sid}, …]
     all_words = []
-    for seg in result["segments"]:
-        sid = seg["id"]
-        for w in seg["words"]:
+    offset = 0
+    for chunk, (_, dur), rec in zip(chunks, wav_infos, recognized):
+        tokens = [(m.group(), chunk.sid_at(m.start())) for m in re.finditer(r"\S+", chunk.text)]
+        for w in align_words(tokens, rec, dur):
             all_words.append({
-                "word": w["word"].strip(),
-                "start": int(w["start"] * 1000),
-                "end":   int(w["end"]   * 1000),
-                "sid":   sid
+                "word":  w["word"],
+                "start": int(w["start"] + offset),
+                "end":   int(w["end"] + offset),
+                "sid":   w["sid"],
             })
+        offset += dur
 
     # return both audio file info and word timestamps
     return wav_infos, all_words
@@ -1,114 +1,459 @@
+import math
 import os
-import subprocess
+import shutil
 import tempfile
-from .asset_manager import choose_and_stream_video
-from .drive_utils import upload_to_drive
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from PIL import Image
 from .config import settings
+from .providers import get_uploader
+from .mezzanine import find_mezzanine, build_mezzanine
+from .media_probe import wav_duration
+from .keyframes import KeyframeIndex, keyframe_index
+from .progressive import ProgressiveClip
+from .ass_builder import slice_ass
+from .ffmpeg_runner import FFmpegError, run_ffmpeg
+from .workspace import touch_atime
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    One encoded output. Sizes other than the 1080x1920 master are scaled to
+    cover and center-cropped, so a square variant keeps the middle of the
+    frame (card and captions).
+    """
+    name: str
+    width: int = 1080
+    height: int = 1920
+    crf: int = 23
+    preset: str = "ultrafast"
+    audio_bitrate: str = "128k"
+    container: str = "mp4"
+
+    @property
+    def native(self) -> bool:
+        return (self.width, self.height) == (1080, 1920)
+
+    def video_filter(self) -> str:
+        return (
+            f"scale={self.width}:{self.height}:force_original_aspect_ratio=increase,"
+            f"crop={self.width}:{self.height}"
+        )
+
+    def encode_args(self, threads: int | None = None) -> list[str]:
+        args = ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf)]
+        if threads:
+            args += ["-threads", str(threads)]
+        return args
+
+PROFILES = {
+    "short":   OutputProfile("short"),
+    "preview": OutputProfile("preview", 540, 960, crf=30, audio_bitrate="64k"),
+    "square":  OutputProfile("square", 1080, 1080),
+}
+
+def parse_profiles(spec: str) -> list[OutputProfile]:
+    """
+    Parse a comma-separated OUTPUT_PROFILES value. Each entry is a name from
+    PROFILES or name:WxH[:crf[:preset[:audio_bitrate[:container]]]].
+    """
+    profiles = []
+    for entry in (e.strip() for e in spec.split(",")):
+        if not entry:
+            continue
+        name, *fields = entry.split(":")
+        if not fields:
+            if name not in PROFILES:
+                raise ValueError(f"Unknown output profile {name!r}; known: {', '.join(PROFILES)}")
+            profiles.append(PROFILES[name])
+            continue
+        w, h = (int(v) for v in fields[0].lower().split("x"))
+        kw = dict(zip(("crf", "preset", "audio_bitrate", "container"), fields[1:]))
+        if "crf" in kw:
+            kw["crf"] = int(kw["crf"])
+        profiles.append(OutputProfile(name, w, h, **kw))
+    if len({p.name for p in profiles}) != len(profiles):
+        raise ValueError(f"Duplicate output profile names in {spec!r}")
+    return profiles or [PROFILES["short"]]
+
+def _music_mix(narration: str, music: str, out: str) -> str:
+    # narration at full volume, music at 30%, cut to the narration's length
+    return (
+        f"[{narration}]volume=1.0[aud0];"
+        f"[{music}]volume=0.3[aud1];"
+        f"[aud0][aud1]amix=inputs=2:duration=first:dropout_transition=3[{out}]"
+    )
+
+def _fan_out(
+    profiles: list[OutputProfile],
+    video: str,
+    audio: str,
+    paths: list[str],
+    copy_first: bool = False,
+    threads: int | None = None
+) -> tuple[list[str], list[str]]:
+    """
+    Filter chains and output args that send one video and one audio source
+    to every profile from a single decode. Sources are filtergraph labels
+    ("outv") or input streams ("0:v"); labels are split/asplit into one
+    branch per output. With copy_first, profile 0 stream-copies `video`,
+    which must already be encoded at that profile's size and settings.
+    """
+    chains: list[str] = []
+
+    def branches(src: str, k: int, kind: str) -> list[str]:
+        # streams can be mapped any number of times; labels only once
+        if k == 0:
+            return []
+        if ":" in src:
+            return [src] * k
+        if k == 1:
+            return [f"[{src}]"]
+        outs = [f"[{kind}{i}]" for i in range(k)]
+        chains.append(f"[{src}]{'a' if kind == 'a' else ''}split={k}{''.join(outs)}")
+        return outs
+
+    encoded = [i for i in range(len(profiles)) if not (copy_first and i == 0)]
+    vsrc = dict(zip(encoded, branches(video, len(encoded), "v")))
+    asrc = branches(audio, len(profiles), "a")
+
+    args: list[str] = []
+    for i, (p, path) in enumerate(zip(profiles, paths)):
+        if i not in vsrc:
+            vmap, vcodec = video, ["-c:v", "copy"]
+        else:
+            vmap, vcodec = vsrc[i], p.encode_args(threads)
+            if not p.native:
+                pad = vmap if vmap.startswith("[") else f"[{vmap}]"
+                chains.append(f"{pad}{p.video_filter()}[out{i}]")
+                vmap = f"[out{i}]"
+        args += [
+            "-map", vmap, "-map", asrc[i],
+            *vcodec,
+            "-c:a", "aac", "-b:a", p.audio_bitrate,
+            "-shortest",
+        ]
+        if p.container in ("mp4", "mov"):
+            args += ["-movflags", "+faststart"]
+        args.append(path)
+    return chains, args
+
+def _bg_chain(normalized: bool, fps: int | None = None) -> str:
+    """
+    Filter chain turning input 0 into the 1080x1920 [bg] stream. Mezzanines
+    are already normalized; raw clips get scale/pad. `fps` forces a constant
+    frame rate (needed when frame counts must line up across segments).
+    """
+    rate = f",fps={fps}" if fps else ""
+    if normalized:
+        return f"[0:v]null{rate}[bg];"
+    return (
+        "[0:v]"
+        "scale=1080:1920:force_original_aspect_ratio=decrease,"  # fit video
+        f"pad=1080:1920:(ow-iw)/2:(oh-ih)/2:color=black{rate}[bg];"
+    )
+
+# Width of the card overlay on the 1080-wide frame (40px margin each side)
+CARD_W = 1000
+
+def _prescaled_card(card_png: str) -> str:
+    """
+    Return card_png resized to CARD_W, written once next to the original,
+    so ffmpeg never has to scale the card per frame.
+    """
+    with Image.open(card_png) as img:
+        if img.width == CARD_W:
+            return card_png
+        h = round(img.height * CARD_W / img.width)
+        out = Path(card_png).with_suffix(f".{CARD_W}.png")
+        img.convert("RGBA").resize((CARD_W, h), Image.LANCZOS).save(out, "PNG")
+    return str(out)
+
+def _card_input(card_png: str, duration: float, fps: int) -> list[str]:
+    """
+    Input args for the card: a still looped only for `duration` seconds, so
+    the stream ends with the intro and the overlay passes frames through.
+    """
+    return ["-loop", "1", "-framerate", str(fps), "-t", f"{duration:.3f}", "-i", card_png]
+
+def _card_overlay(main: str, card: str, out: str) -> str:
+    # eof_action=pass: once the card stream ends, frames go through untouched
+    return f"[{main}][{card}]overlay=40:(H-h)/2:eof_action=pass[{out}]"
+
+def plan_segments(total_s: float, n: int, fps: int, snap=None) -> list[tuple[float, int]]:
+    """
+    Split [0, total_s] into at most n frame-aligned (start_s, frame_count)
+    segments. `snap` maps each inner boundary (in seconds) to a nearby
+    preferred one, e.g. a time at which the background is on a keyframe.
+    """
+    total_frames = math.ceil(total_s * fps)
+    per = math.ceil(total_frames / max(1, n))
+    bounds = list(range(0, total_frames, per))
+    if snap:
+        moved = {round(snap(b / fps) * fps) for b in bounds[1:]}
+        bounds = [0] + sorted(b for b in moved if 0 < b < total_frames)
+    return [(b / fps, e - b) for b, e in zip(bounds, bounds[1:] + [total_frames])]
+
+def _seek_args(index: KeyframeIndex, pos: float, fps: int) -> list[str]:
+    """
+    Input seek to `pos`, moved onto the keyframe when it is within half a
+    frame of one, so rounding never lands just before it (which would
+    decode the whole preceding GOP).
+    """
+    k = index.nearest(pos)
+    if abs(k - pos) < 0.5 / fps:
+        pos = k
+    return ["-ss", f"{pos:.6f}"] if pos > 0 else []
+
+def _render_segmented(
+    bg_path: str,
+    normalized: bool,
+    index: KeyframeIndex,
+    offset: float,
+    ass_path: str,
+    card_png: str,
+    first_dur: float,
+    audio_mp3: str,
+    audio_wav: str,
+    profiles: list[OutputProfile],
+    out_paths: list[str],
+    n_segments: int,
+    bg_music: str | None = None,
+    cancel: threading.Event | None = None
+):
+    """
+    Render the 1080x1920 video track as independent segments in parallel
+    ffmpeg processes (each starts on its own IDR frame, encoded with the
+    first profile's settings), join them with the concat demuxer, then mux
+    the narration (and music) once. The first profile is stream-copied when
+    it is 1080x1920; other profiles are encoded from the joined track in
+    the same process. If one segment fails, the others are cancelled
+    rather than left to finish. The background starts at `offset`, and
+    segment boundaries are moved to where it is on a keyframe.
+    """
+    fps      = settings.mezzanine_fps
+    total    = wav_duration(audio_wav)
+    card_png = _prescaled_card(card_png)
+    clip_dur = index.duration
+
+    def on_keyframe(t: float) -> float:
+        pos = (offset + t) % clip_dur
+        return t + index.nearest(pos) - pos
+
+    plan     = plan_segments(total, n_segments, fps, snap=on_keyframe)
+    threads  = max(1, (os.cpu_count() or 1) // len(plan))
+    work     = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(out_paths[0]) or ".")
+    print(f"[+] Rendering {len(plan)} segments in parallel ({threads} threads each)")
+
+    failed = threading.Event()
+
+    class _Stop:
+        # cancelled by the caller or by a sibling segment failing
+        @staticmethod
+        def is_set() -> bool:
+            return failed.is_set() or (cancel is not None and cancel.is_set())
+
+    def render(i: int, start: float, frames: int) -> str:
+        end = start + frames / fps
+        seg_ass = os.path.join(work, f"{i:03d}.ass")
+        seg_out = os.path.join(work, f"{i:03d}.mp4")
+        slice_ass(ass_path, seg_ass, start * 1000, end * 1000)
+
+        # the background loops, so start inside the clip at (offset + start) mod clip length
+        inputs = ["-stream_loop", "-1", *_seek_args(index, (offset + start) % clip_dur, fps), "-i", bg_path]
+        graph = _bg_chain(normalized, fps) + f"[bg]subtitles={seg_ass}:fontsdir={settings.fonts_dir}[sub];"
+        if start < first_dur:
+            inputs += _card_input(card_png, first_dur - start, fps)
+            graph += _card_overlay("sub", "1:v", "outv")
+        else:
+            graph += "[sub]null[outv]"
+
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            *inputs,
+            "-filter_complex", graph,
+            "-map", "[outv]",
+            "-frames:v", str(frames),
+            "-an",
+            *profiles[0].encode_args(threads),
+            seg_out
+        ]
+        try:
+            run_ffmpeg(cmd, f"segment{i:03d}", expected_s=frames / fps, cancel=_Stop)
+        except FFmpegError:
+            failed.set()
+            raise
+        return seg_out
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(plan)) as pool:
+            outs = list(pool.map(lambda p: render(*p), [(i, s, f) for i, (s, f) in enumerate(plan)]))
+
+        list_path = os.path.join(work, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for seg in outs:
+                f.write(f"file '{os.path.abspath(seg)}'\n")
+
+        inputs, chains, audio = ["-f", "concat", "-safe", "0", "-i", list_path, "-i", audio_mp3], [], "1:a"
+        if bg_music:
+            inputs += ["-stream_loop", "-1", "-i", bg_music]
+            chains.append(_music_mix("1:a", "2:a", "aout"))
+            audio = "aout"
+        fan, out_args = _fan_out(profiles, "0:v", audio, out_paths, copy_first=profiles[0].native)
+        chains += fan
+
+        concat_cmd = [
+            "ffmpeg", "-y",
+            *inputs,
+            *(["-filter_complex", ";".join(chains)] if chains else []),
+            *out_args
+        ]
+        print(f"[+] Running FFmpeg concat + audio mux: {' '.join(concat_cmd)}")
+        run_ffmpeg(concat_cmd, "concat", expected_s=total, cancel=cancel)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
 
 def burn_and_mux(
     card_png: str,
     ass_path: str,
     first_dur: float,
-    bg_video: str | None = None,
-    bg_music: str | None = None
+    audio_mp3: str,
+    audio_wav: str,
+    out_dir: str,
+    bg_video: str | ProgressiveClip | None = None,
+    bg_music: str | None = None,
+    cancel: threading.Event | None = None,
+    on_progress=None,
+    profiles: list[OutputProfile] | None = None
 ):
     """
     Stream background clip (or use bg_video if provided), loop it if needed,
-    scale/pad to 1080x1920, burn subtitles, overlay card,
-    optionally mix in background music, and either upload to Drive or save locally under output/.
+    scale/pad to 1080x1920 (skipped when a pre-normalized mezzanine exists),
+    burn subtitles, overlay card,
+    optionally mix in background music, and either upload to Drive or save locally under out_dir.
+    Every profile (default: settings.output_profiles) is encoded by the same
+    ffmpeg process from one decode and one subtitle pass. With
+    settings.background_random_offset the background starts at a random
+    keyframe (see src/keyframes.py) instead of its first frame. A
+    ProgressiveClip as bg_video is read over HTTP while it downloads: from
+    its first frame, unnormalized, in a single ffmpeg process.
+    Returns (drive_id, main_path, {profile name: path} for the other profiles).
+    Setting `cancel` kills the running ffmpeg; `on_progress` receives its
+    progress events (see ffmpeg_runner.run_ffmpeg).
     """
+    profiles = profiles or parse_profiles(settings.output_profiles)
+    if bg_music and not os.path.isfile(bg_music):
+        raise FileNotFoundError(f"Background music not found: {bg_music}")
+
     # Determine background source and looping
-    if bg_video:
+    progressive = isinstance(bg_video, ProgressiveClip)
+    if progressive:
+        bg_path = bg_video.url
+        loop_args = ["-stream_loop", "-1"]
+        print(f"[+] Using background asset while it downloads (looped): {bg_video.path}")
+    elif bg_video:
         bg_path = bg_video
         loop_args = ["-stream_loop", "-1"]
         print(f"[+] Using background asset (looped): {bg_path}")
     else:
-        tmp_bg = choose_and_stream_video()
-        bg_path = tmp_bg.name
+        from .providers import get_background_source
+        bg_path = get_background_source()()
         loop_args = ["-stream_loop", "-1"]
         print(f"[+] Using streamed background asset (looped): {bg_path}")
 
-    # Ensure output/ exists
-    os.makedirs("output", exist_ok=True)
+    mezz, index, offset = None, None, 0.0
+    if not progressive:
+        # keep the clips we render from at the back of the disk-budget eviction queue
+        touch_atime(bg_path)
+
+        # Prefer the 1080x1920 mezzanine of this clip; it needs no scale/pad
+        mezz = find_mezzanine(bg_path)
+        if not mezz and settings.mezzanine_on_demand:
+            mezz = build_mezzanine(bg_path)
+        if mezz:
+            bg_path = mezz
+            print(f"[+] Using mezzanine: {bg_path}")
+            touch_atime(bg_path)
 
-    # Create a temp output file inside output/
+        # Start on a keyframe so the first frame costs one decode, wherever it is
+        index = keyframe_index(bg_path)
+        offset = index.random_start(wav_duration(audio_wav)) if settings.background_random_offset else 0.0
+        if offset:
+            print(f"[+] Background starts at keyframe {offset:.3f}s of {index.duration:.1f}s")
+
+    # Ensure out_dir exists
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Create a temp output file inside out_dir
     out_tmp = tempfile.NamedTemporaryFile(
         prefix="out_",
-        suffix=".mp4",
+        suffix=f".{profiles[0].container}",
         delete=False,
-        dir="output"
+        dir=out_dir
     )
     out_tmp.close()
-
-    # Build FFmpeg filter graph for burning subtitles and overlay
-    vf = (
-        "[0:v]"
-        "scale=1080:1920:force_original_aspect_ratio=decrease,"  # fit video
-        "pad=1080:1920:(ow-iw)/2:(oh-ih)/2:color=black[bg];"
-        f"[bg]subtitles={ass_path}:fontsdir={settings.fonts_dir}[sub];"
-        f"[2:v]scale=1000:-1[card];"
-        f"[sub][card]overlay=40:(H-h)/2:enable='lte(t,{first_dur})'[outv]"
-    )
-
-    # First stage: burn subtitles and overlay card on looping background
-    cmd = [
-        "ffmpeg", "-y",
-        *loop_args,
-        "-i", bg_path,
-        "-i", settings.audio_mp3,
-        "-i", card_png,
-        "-filter_complex", vf,
-        "-map", "[outv]",
-        "-map", "1:a",
-        "-c:v", "libx264", "-preset", "ultrafast",
-        "-c:a", "aac", "-shortest", "-movflags", "+faststart",
-        out_tmp.name
-    ]
-
-    print(f"[+] Running FFmpeg stage1 (burn & mux): {' '.join(cmd)}")
-    subprocess.run(cmd, check=True)
-
     final_path = out_tmp.name
+    stem = os.path.splitext(final_path)[0]
+    out_paths = [final_path] + [f"{stem}.{p.name}.{p.container}" for p in profiles[1:]]
 
-    # Second stage: optionally mix background music
-    if bg_music:
-        if not os.path.isfile(bg_music):
-            raise FileNotFoundError(f"Background music not found: {bg_music}")
-
-        mixed_out = tempfile.NamedTemporaryFile(
-            prefix="out_music_", suffix=".mp4", delete=False, dir="output"
+    if settings.render_segments > 1 and progressive:
+        print("[*] Background is still downloading; rendering in one process instead of segments")
+    if settings.render_segments > 1 and not progressive:
+        # Segment-parallel mode: N ffmpeg processes, lossless concat, one audio mux
+        _render_segmented(
+            bg_path, bool(mezz), index, offset, ass_path, card_png, first_dur,
+            audio_mp3, audio_wav, profiles, out_paths, settings.render_segments,
+            bg_music, cancel
         )
-        mixed_out.close()
+    else:
+        # Build FFmpeg filter graph for burning subtitles and overlay;
+        # the card is pre-scaled and its input ends after the first sentence
+        chains = [
+            _bg_chain(bool(mezz)) +
+            f"[bg]subtitles={ass_path}:fontsdir={settings.fonts_dir}[sub];" +
+            _card_overlay("sub", "2:v", "outv")
+        ]
+        inputs = [
+            *loop_args,
+            *(_seek_args(index, offset, settings.mezzanine_fps) if offset else []),
+            "-i", bg_path,
+            "-i", audio_mp3,
+            *_card_input(_prescaled_card(card_png), first_dur, settings.mezzanine_fps),
+        ]
+
+        # Music is mixed in the same graph instead of a second remux pass
+        audio = "1:a"
+        if bg_music:
+            inputs += ["-stream_loop", "-1", "-i", bg_music]
+            chains.append(_music_mix("1:a", "3:a", "aout"))
+            audio = "aout"
 
-        mix_cmd = [
+        # One decode and subtitle pass, split into a branch per output profile
+        fan, out_args = _fan_out(profiles, "outv", audio, out_paths)
+        cmd = [
             "ffmpeg", "-y",
-            "-i", final_path,     # narration track
-            "-stream_loop", "-1",
-            "-i", bg_music,       # background music
-            "-filter_complex",
-            # keep narration at full volume [0:a]
-            # drop music to 30% [1:a]volume=0.3
-            # mix them together
-            "[0:a]volume=1.0[aud0];"
-            "[1:a]volume=0.3[aud1];"
-            "[aud0][aud1]amix=inputs=2:duration=first:dropout_transition=3[aout]",
-            "-map", "0:v",
-            "-map", "[aout]",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-shortest",
-            mixed_out.name
+            *inputs,
+            "-filter_complex", ";".join(chains + fan),
+            *out_args
         ]
-        print(f"[+] Running FFmpeg stage2 (add bg music): {' '.join(mix_cmd)}")
-        subprocess.run(mix_cmd, check=True)
 
-        # use mixed output as final
-        final_path = mixed_out.name
+        print(f"[+] Running FFmpeg (burn & mux → {', '.join(p.name for p in profiles)}): {' '.join(cmd)}")
+        run_ffmpeg(cmd, "burn_and_mux", expected_s=wav_duration(audio_wav),
+                   on_progress=on_progress, cancel=cancel)
+
+    variants = {p.name: path for p, path in zip(profiles[1:], out_paths[1:])}
 
     # Upload or return local path
-    if settings.upload_to_drive:
+    upload_to_drive = get_uploader("drive")
+    if upload_to_drive:
         drive_id = upload_to_drive(final_path)
-        return drive_id, final_path
+        for name, path in variants.items():
+            print(f"[+] Drive ({name}): {upload_to_drive(path)}")
+        return drive_id, final_path, variants
     else:
         print(f"[+] Saved video locally to {final_path} (DRIVE upload disabled)")
-        return None, final_path
+        for name, path in variants.items():
+            print(f"[+] Saved {name} variant to {path}")
+        return None, final_path, variants
@@ -0,0 +1,401 @@
+import argparse
+import contextvars
+import json
+import os
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .main import Job, run_job, resume_uploads, drain_uploads, upload_slots
+from .post_finder import find_next_post, mark_used
+from .providers import get_reddit
+from .config import settings
+from . import memory, metrics
+
+# Long-running daemon: `python -m src.worker`. Models, the Chromium used for
+# cards, API clients and font/template caches are loaded once, then jobs are
+# taken from a JSON-lines file (tailed like a log) or a spool directory:
+#
+#   {"id": "a1", "type": "url",       "url": "https://www.reddit.com/r/tifu/comments/…"}
+#   {"id": "a2", "type": "subreddit", "subreddit": "AmItheAsshole"}
+#   {"id": "a3", "type": "rerender",  "post_id": "1abcde"}
+#
+# Every job ends up as one line in <worker_state_dir>/results.jsonl.
+
+JOB_TYPES = ("url", "subreddit", "rerender")
+
+
+@dataclass
+class WorkItem:
+    id: str
+    spec: dict
+    ref: object  # byte offset (JsonlSource) or claimed file (SpoolSource)
+
+
+class JsonlSource:
+    """
+    Tails a JSON-lines file. The offset up to which every job has finished
+    is kept in <state_dir>/offset.json, so a restart picks up the first
+    unfinished line; a truncated or replaced file is read from the start.
+    """
+
+    def __init__(self, path: str, state_dir: str):
+        self.path = path
+        self.state_path = os.path.join(state_dir, "offset.json")
+        self.committed = self._load_offset()
+        self.pos = self.committed
+        # start offset -> [end offset, finished], in file order
+        self.pending: dict[int, list] = {}
+        self._lock = threading.Lock()
+
+    def _load_offset(self) -> int:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return state.get("offset", 0) if state.get("path") == os.path.abspath(self.path) else 0
+
+    def _save_offset(self) -> None:
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"path": os.path.abspath(self.path), "offset": self.committed}, f)
+        os.replace(tmp, self.state_path)
+
+    def next_item(self) -> WorkItem | None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if size < self.pos:
+            print(f"[!] {self.path} shrank; reading it from the start")
+            with self._lock:
+                self.pos = self.committed = 0
+                self.pending.clear()
+
+        with open(self.path, "rb") as f:
+            f.seek(self.pos)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    return None  # nothing new, or a line still being written
+                start, self.pos = self.pos, self.pos + len(line)
+                text = line.decode("utf-8", "replace").strip()
+                with self._lock:
+                    self.pending[start] = [self.pos, not text]
+                if not text:
+                    continue
+                try:
+                    spec = json.loads(text)
+                except ValueError as e:
+                    spec = {"error": f"invalid JSON: {e}"}
+                if not isinstance(spec, dict):
+                    spec = {"error": "job is not a JSON object"}
+                job_id = str(spec.get("id") or f"{os.path.basename(self.path)}:{start}")
+                return WorkItem(job_id, spec, start)
+
+    def done(self, item: WorkItem, ok: bool) -> None:
+        with self._lock:
+            self.pending[item.ref][1] = True
+            advanced = False
+            while self.pending:
+                start = next(iter(self.pending))
+                end, finished = self.pending[start]
+                if not finished:
+                    break
+                del self.pending[start]
+                self.committed = end
+                advanced = True
+            if advanced:
+                self._save_offset()
+
+
+class SpoolSource:
+    """
+    One JSON job per `*.json` file in spool_dir (write to a temporary name
+    and rename it in). Jobs are claimed by moving them to processing/ and
+    end up in done/ or failed/. Files left in processing/ by a worker that
+    died are queued again on start.
+    """
+
+    def __init__(self, spool_dir: str):
+        self.dir = Path(spool_dir)
+        for sub in ("processing", "done", "failed"):
+            (self.dir / sub).mkdir(parents=True, exist_ok=True)
+        for f in (self.dir / "processing").glob("*.json"):
+            f.rename(self.dir / f.name)
+
+    def next_item(self) -> WorkItem | None:
+        files = []
+        for f in self.dir.glob("*.json"):
+            try:
+                files.append((f.stat().st_mtime, f))
+            except OSError:
+                pass
+        for _, f in sorted(files):
+            claimed = self.dir / "processing" / f.name
+            try:
+                f.rename(claimed)
+            except OSError:
+                continue  # taken by another worker
+            try:
+                spec = json.loads(claimed.read_text(encoding="utf-8"))
+            except ValueError as e:
+                spec = {"error": f"invalid JSON: {e}"}
+            if not isinstance(spec, dict):
+                spec = {"error": "job is not a JSON object"}
+            return WorkItem(str(spec.get("id") or f.stem), spec, claimed)
+        return None
+
+    def done(self, item: WorkItem, ok: bool) -> None:
+        try:
+            item.ref.rename(self.dir / ("done" if ok else "failed") / item.ref.name)
+        except OSError:
+            pass
+
+
+def warm_up() -> None:
+    """
+    Load everything jobs would otherwise load on first use. A failure here
+    is only reported; the job that needs the resource will raise it again.
+    """
+    def step(name, fn):
+        try:
+            with metrics.span("worker.warm_up", resource=name):
+                fn()
+            print(f"[+] Warm: {name}")
+        except Exception as e:
+            print(f"[!] Could not warm {name}: {e}")
+
+    step("reddit", get_reddit)
+
+    provider = settings.tts_provider.lower()
+    if provider == "whisper":
+        from .tts_whisper import preload
+        step(f"whisper {settings.whisper_model} x{settings.whisper_workers}", preload)
+    elif provider == "elevenlabs":
+        from .tts_elevenlabs import get_client
+        step("elevenlabs", get_client)
+
+    if settings.card_renderer == "playwright":
+        from .svg_raster import start_browser
+        step("chromium", start_browser)
+
+    from .thumbnail_card_generator import warm_caches
+    step("fonts", lambda: warm_caches(
+        settings.thumbnail_template_svg, settings.thumbnail_font_path,
+        settings.thumbnail_sub_font_size, settings.thumbnail_title_font_size,
+    ))
+
+    if settings.upload_to_drive and settings.drive_backend == "live":
+        from .drive_utils import get_drive_service
+        step("drive", get_drive_service)
+    if settings.upload_to_youtube and settings.youtube_backend == "live":
+        from .youtube_uploader import get_youtube_service
+        step("youtube", get_youtube_service)
+
+
+class Worker:
+    def __init__(self, source, concurrency: int | None = None, state_dir: str | None = None):
+        self.source = source
+        self.concurrency = max(1, concurrency or settings.worker_concurrency)
+        self.state_dir = state_dir or settings.worker_state_dir
+        self.results_path = os.path.join(self.state_dir, "results.jsonl")
+        self.finished = self._load_finished()
+        self.stop = threading.Event()
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self.inflight = 0           # jobs rendering that will still want an upload
+        self._quota_waiting = False
+
+    def _load_finished(self) -> set[str]:
+        # ids that already completed, so a re-queued job with an explicit id is not redone
+        done = set()
+        try:
+            with open(self.results_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("status") == "ok":
+                        done.add(rec["id"])
+        except OSError:
+            pass
+        return done
+
+    def _record(self, item: WorkItem, status: str, **fields) -> None:
+        rec = {"id": item.id, "type": item.spec.get("type"), "status": status,
+               **fields, "finished_at": time.time()}
+        with self._lock:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, default=str) + "\n")
+            if status == "ok":
+                self.finished.add(item.id)
+        mark = {"ok": "+", "failed": "!"}.get(status, "*")
+        print(f"[{mark}] Job {item.id}: {status}" + (f" ({fields['error']})" if "error" in fields else ""))
+
+    def _resolve(self, spec: dict):
+        """
+        Turn a job into a fully loaded Submission. Runs on the dispatch
+        thread only, so PRAW and used_posts.json are never used concurrently.
+        """
+        reddit = get_reddit()
+        kind = spec["type"]
+        with metrics.span("api.reddit.resolve", job_type=kind):
+            if kind == "subreddit":
+                subs = spec.get("subreddits") or [spec["subreddit"]]
+                return find_next_post(reddit, subs)
+            if kind == "url":
+                submission = reddit.submission(url=spec["url"])
+            elif spec.get("post_id"):
+                submission = reddit.submission(id=spec["post_id"])
+            else:
+                submission = reddit.submission(url=spec["url"])
+            submission.title  # fetch now rather than lazily on a job thread
+            if kind == "url":
+                mark_used(submission)
+            return submission
+
+    def _process(self, item: WorkItem, submission) -> None:
+        job = Job(submission=submission)
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            metrics.set_context(worker_job=item.id)
+            run_job(job)
+            ok = True
+            self._record(
+                item, "ok",
+                post_id=submission.id,
+                video=job.final_video if os.path.exists(job.final_video) else None,
+                variants=job.variants,
+                drive_id=job.drive_id,
+                yt_pending=job.yt_pending,
+                duration_s=round(time.perf_counter() - t0, 3),
+            )
+        except Exception as e:
+            if job.ws is not None:
+                # keep the files for inspection, but let the disk budget reclaim them
+                job.ws.mark_complete()
+            self._record(
+                item, "failed",
+                post_id=submission.id,
+                error=f"{type(e).__name__}: {e}",
+                trace=traceback.format_exc(limit=-3),
+                duration_s=round(time.perf_counter() - t0, 3),
+            )
+        finally:
+            metrics.flush()
+            with self._lock:
+                self.inflight -= 1
+            self.source.done(item, ok)
+            self.slots.release()
+
+    def _dispatch(self, item: WorkItem) -> None:
+        spec = item.spec
+        ok = False
+        if "error" in spec:
+            self._record(item, "failed", error=spec["error"])
+        elif spec.get("type") not in JOB_TYPES:
+            self._record(item, "skipped", error=f"unknown job type {spec.get('type')!r}")
+            ok = True
+        elif spec.get("id") and item.id in self.finished:
+            self._record(item, "skipped", error="already done")
+            ok = True
+        else:
+            try:
+                submission = self._resolve(spec)
+            except Exception as e:
+                self._record(item, "failed", error=f"{type(e).__name__}: {e}")
+            else:
+                print(f"[*] Job {item.id}: {spec['type']} → {submission.id}")
+                with self._lock:
+                    self.inflight += 1
+                # fresh metrics context per job; pool threads are reused
+                self.pool.submit(contextvars.Context().run, self._process, item, submission)
+                return
+        self.source.done(item, ok)
+        self.slots.release()
+
+    def _quota_full(self) -> bool:
+        """
+        True while today's YouTube quota is taken by queued uploads and the
+        jobs already rendering, so another render could only be queued.
+        """
+        slots = upload_slots()
+        with self._lock:
+            full = slots is not None and slots - self.inflight <= 0
+        if full != self._quota_waiting:
+            self._quota_waiting = full
+            if full:
+                from .youtube_quota import describe_reset
+                print(f"[*] Today's YouTube quota is spoken for; holding new jobs ({describe_reset()})")
+            else:
+                print("[*] YouTube quota available again; taking jobs")
+        return full
+
+    def run(self, once: bool = False) -> None:
+        """
+        Process jobs until stopped (SIGINT/SIGTERM), or with `once` until
+        the source has nothing queued (or the YouTube quota holds the rest
+        back). In-flight jobs are always finished.
+        """
+        while not self.stop.is_set():
+            if not self.slots.acquire(timeout=settings.worker_poll_seconds):
+                continue
+            item = None if self._quota_full() else self.source.next_item()
+            if item is None:
+                self.slots.release()
+                if once:
+                    break
+                if settings.upload_to_youtube and settings.youtube_backend == "live":
+                    drain_uploads()  # queued videos go out once the quota resets
+                self.stop.wait(settings.worker_poll_seconds)
+                continue
+            self._dispatch(item)
+        self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render videos for queued jobs with warm resources.")
+    parser.add_argument("--jobs", default=settings.worker_jobs_file, help="JSON-lines file to tail")
+    parser.add_argument("--spool", default=settings.worker_spool_dir, help="directory of *.json jobs (overrides --jobs)")
+    parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+    parser.add_argument("--once", action="store_true", help="exit once the queue is empty")
+    args = parser.parse_args()
+
+    os.makedirs(settings.worker_state_dir, exist_ok=True)
+    source = SpoolSource(args.spool) if args.spool else JsonlSource(args.jobs, settings.worker_state_dir)
+    concurrency = args.concurrency
+    fit = memory.jobs_that_fit()
+    if fit is not None and fit < concurrency:
+        print(f"[*] Stage memory budgets fit {fit} concurrent job(s) in "
+              f"{memory.available_mb():.0f} MB available; asked for {concurrency}")
+        concurrency = fit
+    worker = Worker(source, concurrency)
+
+    def request_stop(signum, frame):
+        print("\n[*] Stopping after in-flight jobs…")
+        worker.stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    resume_uploads()
+    warm_up()
+    print(f"[+] Worker ready: {args.spool or args.jobs}, {worker.concurrency} at a time")
+    try:
+        worker.run(once=args.once)
+    finally:
+        from .svg_raster import stop_browser
+        stop_browser()
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
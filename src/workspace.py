@@ -0,0 +1,211 @@
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from .config import settings
+from .keyframes import KEYFRAMES_SUFFIX
+
+# Every job works inside workspaces/<post_id>/, so concurrent jobs never
+# share (or clean up) each other's intermediate files. A workspace is
+# "complete" once its job has finished; only complete workspaces and the
+# clip caches are ever evicted by DiskBudget.
+
+_DONE = ".done"
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name) or "job"
+
+
+@dataclass(frozen=True)
+class Workspace:
+    root: Path
+
+    @classmethod
+    def for_post(cls, post_id: str, base: str | None = None) -> "Workspace":
+        root = Path(base or settings.workspace_dir) / _safe_name(post_id)
+        for sub in ("audio_chunks", "output", "tmp"):
+            (root / sub).mkdir(parents=True, exist_ok=True)
+        # re-running a post makes its workspace active again
+        (root / _DONE).unlink(missing_ok=True)
+        return cls(root)
+
+    # ---- paths ----
+
+    @property
+    def chunks_dir(self) -> str:
+        return str(self.root / "audio_chunks")
+
+    @property
+    def output_dir(self) -> str:
+        return str(self.root / "output")
+
+    @property
+    def tmp_dir(self) -> str:
+        return str(self.root / "tmp")
+
+    @property
+    def audio_mp3(self) -> str:
+        return str(self.root / "combined.mp3")
+
+    @property
+    def audio_wav(self) -> str:
+        return str(self.root / "combined.wav")
+
+    @property
+    def ass(self) -> str:
+        return str(self.root / "captions_karaoke.ass")
+
+    @property
+    def svg(self) -> str:
+        return str(self.root / "populated.svg")
+
+    @property
+    def card_png(self) -> str:
+        return str(self.root / "thumbnail.png")
+
+    @property
+    def thumb_frame(self) -> str:
+        return str(self.root / "youtube_thumbnail.jpg")
+
+    # ---- lifecycle ----
+
+    def clean_intermediates(self, keep: list[str] = ()) -> None:
+        """
+        Delete everything in the workspace except the files in `keep`.
+        """
+        keep_abs = {os.path.abspath(k) for k in keep if k}
+        for p in sorted(self.root.rglob("*"), reverse=True):
+            if os.path.abspath(p) in keep_abs or p.name == _DONE:
+                continue
+            try:
+                if p.is_dir():
+                    if not any(p.iterdir()):
+                        p.rmdir()
+                else:
+                    p.unlink()
+            except OSError:
+                pass
+
+    def mark_complete(self) -> None:
+        (self.root / _DONE).write_text(str(time.time()), encoding="utf-8")
+
+    @property
+    def complete(self) -> bool:
+        return (self.root / _DONE).exists()
+
+
+def touch_atime(path: str) -> None:
+    """
+    Mark a cache file as used without changing its mtime (mezzanine freshness
+    is decided by mtime). DiskBudget evicts by this access time.
+    """
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+class DiskBudget:
+    """
+    Keeps workspaces and the background/mezzanine caches (including stale
+    .part/.tmp leftovers) under settings.disk_budget_gb (0 = unlimited).
+    When over budget, the least recently used evictable item goes first:
+    complete workspaces (by completion time) and cache files (by access
+    time). Active workspaces,
+    files touched within settings.disk_protect_minutes and videos with a
+    pending resumable upload are never removed.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, limit_bytes: int | None = None):
+        self.limit = int(settings.disk_budget_gb * 1024 ** 3) if limit_bytes is None else limit_bytes
+        self.roots = {
+            "workspace": Path(settings.workspace_dir),
+            "cache":     Path(settings.background_cache_dir),
+            "mezzanine": Path(settings.mezzanine_dir),
+        }
+
+    def usage(self) -> dict[str, int]:
+        return {name: _tree_size(root) if root.exists() else 0 for name, root in self.roots.items()}
+
+    def _protected(self) -> set[str]:
+        from .resumable_upload import pending_uploads
+        from .youtube_quota import UploadQueue
+        paths = [s.get("file_path") for s in pending_uploads(settings.upload_state_dir)]
+        paths += [item.get("file_path") for item in UploadQueue().items()]
+        return {os.path.abspath(p) for p in paths if p}
+
+    def _candidates(self) -> list[tuple[float, Path, int]]:
+        """(last_used, path, size) for everything that may be evicted."""
+        cutoff = time.time() - settings.disk_protect_minutes * 60
+        protected = self._protected()
+        out = []
+
+        ws_root = self.roots["workspace"]
+        if ws_root.exists():
+            for d in ws_root.iterdir():
+                done = d / _DONE
+                if not d.is_dir() or not done.exists():
+                    continue
+                if any(p.startswith(os.path.abspath(d) + os.sep) for p in protected):
+                    continue
+                out.append((done.stat().st_mtime, d, _tree_size(d)))
+
+        for name in ("cache", "mezzanine"):
+            root = self.roots[name]
+            if not root.exists():
+                continue
+            for f in root.iterdir():
+                # keyframe indexes go with their clip
+                if not f.is_file() or f.name.endswith(KEYFRAMES_SUFFIX):
+                    continue
+                st = f.stat()
+                used = max(st.st_atime, st.st_mtime)
+                # half-written downloads/transcodes are fair game once stale
+                if used > cutoff or os.path.abspath(f) in protected:
+                    continue
+                out.append((used, f, st.st_size))
+        return sorted(out, key=lambda c: c[0])
+
+    def enforce(self, reserve_bytes: int = 0) -> int:
+        """
+        Evict until usage + reserve_bytes fits the budget. Returns bytes freed.
+        """
+        if self.limit <= 0:
+            return 0
+        with self._lock:
+            used = sum(self.usage().values())
+            freed = 0
+            for _, path, size in self._candidates():
+                if used + reserve_bytes - freed <= self.limit:
+                    break
+                print(f"[*] Disk budget: evicting {path} ({size / 1024 ** 2:.0f} MiB)")
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+                    Path(f"{path}{KEYFRAMES_SUFFIX}").unlink(missing_ok=True)
+                freed += size
+            if used + reserve_bytes - freed > self.limit:
+                print(f"[!] Disk budget: {(used - freed) / 1024 ** 3:.2f} GiB still in use "
+                      f"after eviction (limit {self.limit / 1024 ** 3:.2f} GiB)")
+            return freed
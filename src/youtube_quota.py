@@ -0,0 +1,200 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from .config import settings
+
+# The YouTube Data API gives each Google Cloud project a daily budget of
+# units (10,000 by default) that resets at midnight Pacific time; a
+# videos.insert costs 1,600 of them, so only about six uploads fit in a day.
+# The ledger records what this host has spent per project and Pacific day,
+# so uploads past the budget are queued for a later day instead of failing
+# with quotaExceeded, and callers can see how many more renders today's
+# quota can still publish.
+
+COSTS = {
+    "videos.insert":  1600,
+    "thumbnails.set": 50,
+}
+# Planned cost of publishing one video (the thumbnail may or may not be set)
+UPLOAD_COST = COSTS["videos.insert"] + COSTS["thumbnails.set"]
+
+PACIFIC = ZoneInfo("America/Los_Angeles")
+
+# Error reasons meaning "no more uploads today", whatever the ledger says
+QUOTA_REASONS = ("quotaExceeded", "dailyLimitExceeded", "uploadLimitExceeded")
+
+_lock = threading.Lock()
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+def pacific_day(now: float | None = None) -> str:
+    """The Pacific-time date (YYYY-MM-DD) the API bills `now` to."""
+    return datetime.fromtimestamp(now if now is not None else time.time(), PACIFIC).date().isoformat()
+
+
+def seconds_until_reset(now: float | None = None) -> float:
+    """Seconds until the next Pacific midnight, when every project's quota resets."""
+    t = datetime.fromtimestamp(now if now is not None else time.time(), PACIFIC)
+    midnight = datetime.combine(t.date() + timedelta(days=1), datetime.min.time(), PACIFIC)
+    return max(0.0, midnight.timestamp() - t.timestamp())
+
+
+def is_quota_error(content: str) -> bool:
+    return any(reason in (content or "") for reason in QUOTA_REASONS)
+
+
+class QuotaLedger:
+    """
+    Units spent per project per Pacific day, in one JSON file shared by
+    every run on this host. Each change re-reads and replaces the file
+    under an exclusive flock on <ledger>.lock, so concurrent processes
+    (the worker and a cron run) never lose each other's charges; only the
+    last `keep_days` days are kept.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        project: str | None = None,
+        daily_limit: int | None = None,
+        reserve: int | None = None,
+        keep_days: int = 7,
+    ):
+        self.path = Path(path or settings.youtube_quota_ledger)
+        self.project = project or settings.youtube_quota_project
+        self.daily_limit = settings.youtube_daily_quota if daily_limit is None else daily_limit
+        self.reserve = settings.youtube_quota_reserve if reserve is None else reserve
+        self.keep_days = keep_days
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus an exclusive flock held across load-modify-save."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _lock, open(self.path.with_name(self.path.name + ".lock"), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _day(self, data: dict, day: str) -> dict:
+        days = data.setdefault(self.project, {})
+        for old in sorted(days)[:-self.keep_days]:
+            if old != day:
+                del days[old]
+        return days.setdefault(day, {"units": 0, "calls": {}})
+
+    def spent(self, day: str | None = None) -> int:
+        with _lock:
+            return self._load().get(self.project, {}).get(day or pacific_day(), {}).get("units", 0)
+
+    def remaining(self) -> int:
+        """Units still available today, after the configured reserve."""
+        return max(0, self.daily_limit - self.reserve - self.spent())
+
+    def charge(self, call: str, units: int | None = None) -> int:
+        """Record one API call against today's budget; returns the day's total."""
+        units = COSTS[call] if units is None else units
+        with self._locked():
+            data = self._load()
+            rec = self._day(data, pacific_day())
+            rec["units"] += units
+            rec["calls"][call] = rec["calls"].get(call, 0) + 1
+            self._save(data)
+            return rec["units"]
+
+    def exhaust(self, reason: str = "quotaExceeded") -> None:
+        """
+        The API refused a call for quota: treat today as spent, whatever
+        the ledger thought (other hosts or tools share the project).
+        """
+        with self._locked():
+            data = self._load()
+            rec = self._day(data, pacific_day())
+            rec["units"] = max(rec["units"], self.daily_limit)
+            rec["exhausted"] = reason
+            self._save(data)
+
+    def affordable(self, units: int = UPLOAD_COST) -> int:
+        """How many calls of `units` each today's remaining budget covers."""
+        return self.remaining() // units if units > 0 else 0
+
+
+class UploadQueue:
+    """
+    Videos waiting for quota, one JSON file each in `queue_dir`, taken in
+    the order they were queued.
+    """
+
+    def __init__(self, queue_dir: str | None = None):
+        self.dir = Path(queue_dir or settings.youtube_upload_queue_dir)
+
+    def put(self, file_path: str, title: str, description: str, thumbnail_path: str | None = None) -> str:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        path = self.dir / f"{now:.6f}-{Path(file_path).stem}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "file_path":      os.path.abspath(file_path),
+            "title":          title,
+            "description":    description,
+            "thumbnail_path": os.path.abspath(thumbnail_path) if thumbnail_path else None,
+            "queued_at":      now,
+        }), encoding="utf-8")
+        os.replace(tmp, path)
+        return str(path)
+
+    def items(self) -> list[dict]:
+        out = []
+        if not self.dir.is_dir():
+            return out
+        for p in sorted(self.dir.glob("*.json")):
+            try:
+                item = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            item["queue_path"] = str(p)
+            out.append(item)
+        return out
+
+    def remove(self, item: dict) -> None:
+        Path(item["queue_path"]).unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.items())
+
+
+def upload_capacity(ledger: QuotaLedger | None = None, queue: UploadQueue | None = None) -> int:
+    """
+    How many more videos today's quota can publish once the queued ones
+    are out. Zero or less means a render started now would only be queued.
+    """
+    ledger = ledger or QuotaLedger()
+    queue = queue or UploadQueue()
+    return ledger.affordable() - len(queue)
+
+
+def describe_reset() -> str:
+    hours = seconds_until_reset() / 3600
+    return f"quota resets at midnight Pacific, in {hours:.1f}h"
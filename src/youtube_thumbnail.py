@@ -0,0 +1,58 @@
+import os
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+from .ffmpeg_runner import run_ffmpeg
+from .keyframes import keyframe_index
+from .mezzanine import find_mezzanine
+from . import metrics
+
+# YouTube's recommended thumbnail size (16:9)
+THUMB_SIZE = (1280, 720)
+
+def grab_frame(clip: str, out_png: str, at_s: float = 1.0) -> str:
+    """
+    Decode a single frame of the background clip (its mezzanine if there is
+    one), at the keyframe nearest before at_s so nothing else is decoded.
+    `clip` may also be the URL of a clip still downloading (ProgressiveClip).
+    """
+    src = find_mezzanine(clip) or clip
+    at = at_s
+    if os.path.isfile(src):
+        index = keyframe_index(src)
+        at = index.floor(min(at_s, index.duration / 2))
+    run_ffmpeg([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-ss", f"{at:.6f}",
+        "-i", src,
+        "-frames:v", "1",
+        out_png
+    ], "thumbnail_frame", expected_s=0.04)
+    return out_png
+
+def compose_thumbnail(card_png: str, bg_frame: str, out_path: str,
+                      size: tuple[int, int] = THUMB_SIZE) -> str:
+    """
+    Background frame cropped to fill `size`, blurred and dimmed, with the
+    card centered on top. The format follows out_path's extension.
+    """
+    with Image.open(bg_frame) as img:
+        bg = ImageOps.fit(img.convert("RGB"), size, Image.LANCZOS)
+    bg = ImageEnhance.Brightness(bg.filter(ImageFilter.GaussianBlur(8))).enhance(0.6)
+
+    with Image.open(card_png) as img:
+        card = img.convert("RGBA")
+    scale = min(size[0] * 0.9 / card.width, size[1] * 0.85 / card.height)
+    card = card.resize((round(card.width * scale), round(card.height * scale)), Image.LANCZOS)
+    bg.paste(card, ((size[0] - card.width) // 2, (size[1] - card.height) // 2), card)
+
+    bg.save(out_path, quality=90)
+    return out_path
+
+def build_thumbnail(card_png: str, clip: str, out_path: str, frame_png: str) -> str:
+    """
+    Grab one frame of `clip` into frame_png and compose the thumbnail.
+    Needs only the card and the source clip, so it can run while the
+    video is still rendering.
+    """
+    with metrics.span("thumbnail.compose"):
+        grab_frame(clip, frame_png)
+        return compose_thumbnail(card_png, frame_png, out_path)
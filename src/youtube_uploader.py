@@ -1,15 +1,18 @@
+import mimetypes
 import os
-import json
+import threading
 from dataclasses import dataclass, field
 from dotenv import load_dotenv
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 
 from src.ai_utils import suggest_hashtags
+from src.config import settings
+from src.google_services import get_authorized_session, get_credentials, get_service
+from src.resumable_upload import ResumableUpload, ResumableUploadError, pending_uploads
+from src.youtube_quota import QuotaExceeded, QuotaLedger, UploadQueue, describe_reset, is_quota_error
+from src import metrics
 
 load_dotenv()
 
@@ -18,31 +21,28 @@ SCOPES = [
   "https://www.googleapis.com/auth/youtube.force-ssl"
 ]
 
-def get_youtube_service() -> build:
-    creds = None
-    token_json = os.getenv("TOKEN_JSON")
-    if token_json:
-        info = json.loads(token_json)
-        creds = Credentials.from_authorized_user_info(info, SCOPES)
+def get_youtube_credentials() -> Credentials:
+    # shared with Drive; falls back to the console consent flow via CREDS_JSON
+    return get_credentials(SCOPES, interactive=True)
 
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
+def get_youtube_service():
+    return get_service("youtube", "v3", SCOPES, interactive=True)
 
-    if not creds or not creds.valid:
-        creds_json = os.getenv("CREDS_JSON")
-        if not creds_json:
-            raise RuntimeError("CREDS_JSON not set in .env")
-        client_cfg = json.loads(creds_json)
-        flow = InstalledAppFlow.from_client_config(client_cfg, SCOPES)
-        creds = flow.run_console()
+def _upload_session():
+    return get_authorized_session(SCOPES, interactive=True)
 
-    return build("youtube", "v3", credentials=creds)
+def _print_progress(offset: int, size: int) -> None:
+    print(f"  -> YouTube upload {int(offset * 100 / size)}%")
+
+# one queue drain per process at a time, so no queued video is uploaded twice
+_drain_lock = threading.Lock()
 
 @dataclass
 class YouTubeUploader:
     default_tags: list[str] = field(default_factory=lambda: [
         "#shorts", "#reddit", "#redditstories"
     ])
+    ledger: QuotaLedger = field(default_factory=QuotaLedger)
 
     def upload(
         self,
@@ -57,7 +57,6 @@ class YouTubeUploader:
         all_tags = self.default_tags
 
         # Build request
-        youtube = get_youtube_service()
         body = {
             "snippet": {
                 "title": title,
@@ -71,36 +70,50 @@ class YouTubeUploader:
             }
         }
 
-        media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
-        # make sure to request both snippet and status
-        req = youtube.videos().insert(
-            part="snippet,status",
-            body=body,
-            media_body=media
+        # Chunked resumable upload (snippet + status parts); the session URI and
+        # offset persist in upload_state_dir so a crashed run can resume later
+        upload = ResumableUpload(
+            session=_upload_session(),
+            init_url=f"{settings.youtube_upload_url}?uploadType=resumable&part=snippet,status",
+            file_path=file_path,
+            metadata=body,
+            state_dir=settings.upload_state_dir,
+            chunk_size=settings.youtube_upload_chunk_mb * 1024 * 1024,
+            # every new session is a videos.insert call billed against the quota
+            on_start=lambda: self.ledger.charge("videos.insert"),
         )
-
-        res = None
-        while res is None:
-            status, res = req.next_chunk()
-            if status:
-                print(f"  -> YouTube upload {int(status.progress() * 100)}%")
+        with metrics.span("api.youtube.upload") as rec:
+            try:
+                res = upload.run(on_progress=_print_progress)
+            except ResumableUploadError as e:
+                if is_quota_error(e.content):
+                    self.ledger.exhaust()
+                    raise QuotaExceeded(str(e)) from e
+                raise
+            rec["bytes"] = upload.bytes_sent
 
         vid = res.get("id")
         print(f"[+] YouTube video ID: {vid}")
 
         if thumbnail_path:
             try:
-                youtube.thumbnails().set(
-                    videoId=vid,
-                    media_body=MediaFileUpload(
-                        thumbnail_path,
-                        mimetype="image/png",
-                        resumable=False
-                    )
-                ).execute()
+                youtube = get_youtube_service()
+                self.ledger.charge("thumbnails.set")
+                with metrics.span("api.youtube.thumbnail"):
+                    youtube.thumbnails().set(
+                        videoId=vid,
+                        media_body=MediaFileUpload(
+                            thumbnail_path,
+                            mimetype=mimetypes.guess_type(thumbnail_path)[0] or "image/png",
+                            resumable=False
+                        )
+                    ).execute()
                 print("  -> Thumbnail set")
             except HttpError as e:
-                if e.resp.status == 403:
+                if e.resp.status == 403 and is_quota_error(e.content.decode(errors="replace")):
+                    self.ledger.exhaust()
+                    print("  [!] Skipped thumbnail: quota exceeded")
+                elif e.resp.status == 403:
                     print("  [!] Skipped thumbnail: no permission")
                 else:
                     # log the full error body so we can debug silent failures
@@ -119,4 +132,101 @@ def upload_to_youtube(
     thumbnail_path: str | None = None
 ) -> str:
     uploader = YouTubeUploader()
-    return uploader.upload(file_path, title, description, thumbnail_path)
\ No newline at end of file
+    return uploader.upload(file_path, title, description, thumbnail_path)
+
+def schedule_upload(
+    file_path: str,
+    title: str,
+    description: str,
+    thumbnail_path: str | None = None
+) -> str | None:
+    """
+    Upload now if today's quota covers it, after any videos queued before
+    it; otherwise (or if the API says the quota is gone) queue it for
+    drain_upload_queue(). Returns the video id, or None when queued.
+    """
+    drain_upload_queue()
+    uploader = YouTubeUploader()
+    queue = UploadQueue()
+    if uploader.ledger.affordable() > 0 and not len(queue):
+        try:
+            return uploader.upload(file_path, title, description, thumbnail_path)
+        except QuotaExceeded as e:
+            print(f"[!] YouTube quota exceeded: {e}")
+    queue.put(file_path, title, description, thumbnail_path)
+    print(f"[*] YouTube upload queued ({len(queue)} waiting); {describe_reset()}")
+    return None
+
+def drain_upload_queue() -> list[str]:
+    """
+    Upload queued videos, oldest first, while today's quota lasts. Queued
+    videos whose file is gone are dropped.
+    """
+    ids = []
+    if not _drain_lock.acquire(blocking=False):
+        return ids  # another thread is draining
+    try:
+        uploader = YouTubeUploader()
+        queue = UploadQueue()
+        for item in queue.items():
+            path = item["file_path"]
+            if not os.path.exists(path):
+                print(f"  [!] Dropping queued upload of missing {path}")
+                queue.remove(item)
+                continue
+            if uploader.ledger.affordable() < 1:
+                break
+            print(f"[+] Uploading queued video {path}")
+            try:
+                vid = uploader.upload(path, item["title"], item["description"], item.get("thumbnail_path"))
+            except QuotaExceeded as e:
+                print(f"[!] YouTube quota exceeded: {e}")
+                break
+            queue.remove(item)
+            ids.append(vid)
+            print(f"[+] YouTube URL: https://youtu.be/{vid}")
+    finally:
+        _drain_lock.release()
+    return ids
+
+def resume_pending_uploads() -> list[str]:
+    """
+    Finish uploads interrupted by a previous crash. States whose video file
+    no longer exists are dropped, since there is nothing left to resume.
+    Videos still in the upload queue are left to drain_upload_queue().
+    """
+    ids = []
+    ledger = QuotaLedger()
+    queued = {item["file_path"] for item in UploadQueue().items()}
+    for state in pending_uploads(settings.upload_state_dir):
+        path = state.get("file_path")
+        if path in queued:
+            continue
+        if not path or not os.path.exists(path) or os.path.getsize(path) != state.get("size"):
+            print(f"  [!] Dropping stale upload state {state['state_path']}")
+            os.remove(state["state_path"])
+            continue
+        print(f"[+] Resuming interrupted YouTube upload of {path}")
+        upload = ResumableUpload(
+            session=_upload_session(),
+            init_url=state["init_url"],
+            file_path=path,
+            metadata=state["metadata"],
+            state_dir=settings.upload_state_dir,
+            mimetype=state.get("mimetype", "video/*"),
+            chunk_size=settings.youtube_upload_chunk_mb * 1024 * 1024,
+            # an expired session is replaced by a new, billed videos.insert
+            on_start=lambda: ledger.charge("videos.insert"),
+        )
+        try:
+            res = upload.run(on_progress=_print_progress)
+        except ResumableUploadError as e:
+            if not is_quota_error(e.content):
+                raise
+            # the state is kept; the next run resumes it
+            ledger.exhaust()
+            print(f"[!] YouTube quota exceeded, resuming later; {describe_reset()}")
+            break
+        ids.append(res.get("id"))
+        print(f"[+] YouTube URL: https://youtu.be/{res.get('id')}")
+    return ids